@@ -4,7 +4,7 @@ import numpy as np
 import ultralytics
 import torch
 
-def quad_masked_image(pickle_path: str, thermal_img_path: str, visual_img_path: str, save_dir: str):
+def quad_masked_image(pickle_path: str, thermal_img_path: str, visual_img_path: str, save_dir: str, registration=None):
     """
     Generates a 2x2 image grid with original, annotated, and contoured images.
 
@@ -13,6 +13,9 @@ def quad_masked_image(pickle_path: str, thermal_img_path: str, visual_img_path:
         thermal_img_path (str): Path to the source thermal image.
         visual_img_path (str): Path to the source visual image.
         save_dir (str): Directory where the output image will be saved.
+        registration (RigRegistration): Optional calibrated thermal -> visual
+            registration (see registration.py); without it the thermal image is
+            only stretched to the target size.
 
     Returns:
         str: The path to the generated image.
@@ -37,7 +40,10 @@ def quad_masked_image(pickle_path: str, thermal_img_path: str, visual_img_path:
 
     # Redimensionar imagens térmica e visual para o mesmo tamanho da imagem com máscara
     target_shape = image_with_masks.shape[:2]
-    thermal_img_resized = cv2.resize(thermal_img, (target_shape[1], target_shape[0]))
+    if registration is not None:
+        thermal_img_resized = registration.warp(thermal_img, (target_shape[1], target_shape[0]))
+    else:
+        thermal_img_resized = cv2.resize(thermal_img, (target_shape[1], target_shape[0]))
     visual_img_resized = cv2.resize(visual_img, (target_shape[1], target_shape[0]))
 
     # Criar imagem térmica com contornos das máscaras
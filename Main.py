@@ -1,29 +1,17 @@
-import tempfile
-import pickle
 import os
 
-from reportlab.platypus import SimpleDocTemplate, PageBreak, Image, Paragraph, Spacer
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from ultralytics import YOLO
-
 # --- Local Imports ---
-from report_generator import ReportGenerator
-from part_analysis import ComponentAnalyzer
-from inference_engine import InferenceEngine
+# O pipeline (OpenCV, ReportLab, NumPy) é importado apenas em render_report,
+# para que importar este módulo continue barato (ver check_startup.py).
 from get_utils import *
 
 
 
-def run():
+def build_report_data():
     """
-    Função principal (Controlador) que orquestra a coleta de dados,
-    o carregamento dos resultados da inferência e a geração do relatório.
+    Monta o dicionário de dados principal a partir das fontes de dados.
     """
-    output_pdf_path = "Final_Inspection_Report.pdf"
-    
-    # 1. Montar o dicionário de dados principal a partir das fontes de dados
-    report_data = {
+    return {
         'logo_path': get_logo_path(), 'report_code': get_report_code(),
         'reg_code': get_reg_code(), 'pbo_code': get_pbo_code(),
         'info_title': get_info_title(), 'inspector': get_inspector(),
@@ -41,50 +29,307 @@ def run():
         'visual_image_path': get_visual_image_path(),
         'thermal_image_path': get_thermal_image_path(),
         'pickle_path': get_pickle_path(),
+        'image_pairs': get_image_pairs(),
+        'pair_workers': get_pair_workers(),
+        'component_workers': get_component_workers(),
         'gps': get_gps(),
         'environmental_conditions': get_environmental_conditions(),
+        'thermal_calibration': get_thermal_calibration(),
+        'thermal_registration': get_thermal_registration(),
+        'registration_cache_dir': get_registration_cache_dir(),
+        'streaming_build': get_streaming_build(),
+        'image_encoding': get_image_encoding(),
+        'print_dpi': get_print_dpi(),
+        'max_pdf_size_mb': get_max_pdf_size_mb(),
+        'report_cache_dir': get_report_cache_dir(),
+        'report_cache_max_mb': get_report_cache_max_mb(),
+        'report_cache_max_entries': get_report_cache_max_entries(),
+        'results_db_path': get_results_db_path(),
+        'metrics_json_path': get_metrics_json_path(),
+        'metrics_prometheus_path': get_metrics_prometheus_path(),
         'label_translation': get_label_translation(),
         'diagnosis_function': get_diagnosis_by_component,
     }
 
+
+# Campos em que uma sobreposição parcial completa o dicionário padrão em vez de substituí-lo
+MERGED_REPORT_DATA_KEYS = ('environmental_conditions',)
+
+
+def apply_overrides(report_data, overrides):
+    """Retorna uma cópia de `report_data` com os campos de `overrides` (ex.: de um lote ou de metadados)."""
+    merged = dict(report_data)
+    for key, value in overrides.items():
+        if key in MERGED_REPORT_DATA_KEYS and isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = {**merged[key], **value}
+        merged[key] = value
+    return merged
+
+
+def render_report(report_data, output_pdf_path, metrics=None):
+    """
+    Executa o pipeline completo (carregamento, anotação, resumo, análise
+    dos componentes e construção do PDF) para uma inspeção.
+
+    `metrics` (StageMetrics) recebe os tempos de cada etapa; por padrão é
+    criado um para o relatório. Erros são propagados para o chamador.
+    """
+    from inference_engine import InferenceEngine
+    from inspection_pairs import resolve_image_pairs, load_pair_results
+    from image_utils import SIZE_BUDGET_LADDER, budget_image_encoding
+    from metrics import StageMetrics
+    from report_cache import (
+        ReportCache, component_section_key, extract_pdf_pages, pdf_splicing_available, report_key,
+    )
+
+    # Métricas de tempo (parede e CPU) e pico de memória de cada etapa
+    if metrics is None:
+        metrics = StageMetrics(report_id=f"{report_data['form_number']} | {output_pdf_path}")
+
+    # Relatório idêntico (mesmas entradas e mesma versão do código) já gerado: apenas copia o PDF
+    cache = ReportCache.from_report_data(report_data)
+    component_key = None
+    if cache is not None:
+        with metrics.stage('cache_lookup'):
+            cache_key = report_key(report_data)
+            component_key = component_section_key(report_data)
+            cache_hit = cache.fetch(cache_key, output_pdf_path)
+        metrics.info['cache_hit'] = cache_hit
+        if cache_hit:
+            print(f"Relatório recuperado do cache ({cache_key[:12]}): {output_pdf_path}")
+            _store_results(report_data, output_pdf_path, metrics, component_key)
+            _write_metrics(report_data, metrics)
+            return output_pdf_path
+    original_report_data = report_data
+
+    # Pares de imagens visual/térmica da inspeção (um único par por padrão)
+    pairs = resolve_image_pairs(report_data)
+    if report_data.get('image_pairs'):
+        # A página de resumo mostra o primeiro par
+        report_data = dict(report_data, visual_image_path=pairs[0]['visual_image_path'],
+                           thermal_image_path=pairs[0]['thermal_image_path'])
+
+    # Páginas de componentes em cache (só campos do resumo mudaram): renderiza
+    # apenas o resumo e anexa as páginas guardadas. O modo de tamanho máximo
+    # recodifica tudo e por isso sempre faz a construção completa.
+    section_key = None
+    if cache is not None and pdf_splicing_available() and not report_data.get('max_pdf_size_mb'):
+        section_key = component_key
+        section_path = cache.get(section_key)
+        metrics.info['component_cache_hit'] = section_path is not None and _splice_cached_components(
+            report_data, output_pdf_path, section_path, metrics)
+        if metrics.info['component_cache_hit']:
+            cache.put(cache_key, output_pdf_path)
+            _store_results(original_report_data, output_pdf_path, metrics, component_key)
+            _write_metrics(report_data, metrics)
+            return output_pdf_path
+
+    # --- ETAPA DE CARREGAMENTO DOS RESULTADOS (modificado) ---
+    print("Step 1: Inicializando o motor e carregando resultados...")
+    with metrics.stage('load'):
+        engine = InferenceEngine()
+
+        # Carrega os resultados (pickle ou formato compacto .cdet) em vez de executar a inferência
+        loaded_results = load_pair_results(engine, pairs)
+
+    # --- ETAPA DE GERAÇÃO DO RELATÓRIO ---
+    # Com 'max_pdf_size_mb', o documento é refeito com codificações de imagem cada
+    # vez mais compactas (SIZE_BUDGET_LADDER) até caber no limite
+    max_pdf_size_mb = report_data.get('max_pdf_size_mb')
+    raw_pairs = None
+    if max_pdf_size_mb:
+        # Anotação, registro, temperaturas e recortes uma única vez, sem codificação:
+        # cada tentativa apenas recodifica as imagens e monta o PDF
+        from part_analysis import ComponentAnalyzer
+        from inspection_pairs import iter_prepared_pairs
+
+        with metrics.stage('scene'):
+            raw_pairs = list(iter_prepared_pairs(engine, ComponentAnalyzer(report_data), pairs, loaded_results,
+                                                 workers=report_data.get('pair_workers'), metrics=metrics,
+                                                 encode=False))
+    attempt_data = report_data
+    for attempt in range(len(SIZE_BUDGET_LADDER) + 1):
+        components_start, component_records = _build_document(attempt_data, output_pdf_path, engine, pairs,
+                                                              loaded_results, metrics, raw_pairs)
+        pdf_size = os.path.getsize(output_pdf_path)
+        if not max_pdf_size_mb or pdf_size <= max_pdf_size_mb * 1024 * 1024:
+            break
+        if attempt == len(SIZE_BUDGET_LADDER):
+            print(f"AVISO: o PDF ficou com {pdf_size / 2**20:.1f} MB, acima do limite de {max_pdf_size_mb} MB, "
+                  f"mesmo com a codificação mais compacta.")
+            break
+        print(f"\nPDF com {pdf_size / 2**20:.1f} MB, acima do limite de {max_pdf_size_mb} MB: "
+              f"refazendo com imagens mais compactas (nível {attempt + 1} de {len(SIZE_BUDGET_LADDER)})...")
+        attempt_data = dict(report_data, image_encoding=budget_image_encoding(attempt, report_data.get('image_encoding')))
+    metrics.info.update(pdf_bytes=pdf_size, encoding_attempts=attempt + 1)
+
+    if cache is not None:
+        cache.put(cache_key, output_pdf_path)
+        if section_key is not None:
+            # Guarda as páginas de componentes como uma entrada própria do cache
+            with metrics.stage('cache_store'):
+                section_tmp = output_pdf_path + '.components.tmp'
+                try:
+                    extract_pdf_pages(output_pdf_path, section_tmp, components_start)
+                    cache.put(section_key, section_tmp)
+                finally:
+                    if os.path.exists(section_tmp):
+                        os.remove(section_tmp)
+    _store_results(original_report_data, output_pdf_path, metrics, component_key, component_records)
+    _write_metrics(report_data, metrics)
+    return output_pdf_path
+
+
+def _store_results(report_data, output_pdf_path, metrics, component_key, component_records=None):
+    """
+    Grava o relatório e os seus componentes no banco de resultados
+    ('results_db_path'). Sem `component_records` (páginas de componentes vindas
+    do cache), os componentes são copiados do relatório gravado com a mesma chave.
+    """
+    if not report_data.get('results_db_path'):
+        return
+    from results_store import ResultsStore
+
+    with metrics.stage('results_store'), ResultsStore(report_data['results_db_path']) as store:
+        if component_records is not None:
+            store.add_report(report_data, output_pdf_path, component_records, component_key)
+        elif not store.copy_report_components(report_data, output_pdf_path, component_key):
+            print("AVISO: componentes do relatório em cache não encontrados no banco de resultados.")
+
+
+def _write_metrics(report_data, metrics):
+    if report_data.get('metrics_json_path'):
+        metrics.write_json(report_data['metrics_json_path'])
+    if report_data.get('metrics_prometheus_path'):
+        metrics.write_prometheus(report_data['metrics_prometheus_path'])
+
+
+def _summary_story(report_data, metrics):
+    """Story da página de resumo (etapa 2)."""
+    from report_generator import ReportGenerator
+
+    print("\nStep 2: Gerando a página de resumo...")
+    with metrics.stage('summary'):
+        report_generator = ReportGenerator(report_data)
+        story = report_generator.generate_summary_story()
+        print("Página de resumo criada.")
+    return story
+
+
+def _splice_cached_components(report_data, output_pdf_path, section_path, metrics):
+    """
+    Renderiza apenas o resumo e anexa as páginas de componentes em cache.
+    Retorna False se a entrada do cache sumiu antes de ser lida.
+    """
+    from reportlab.lib.pagesizes import A4
+
+    from streaming_doc import StreamingDocTemplate
+    from report_cache import concatenate_pdfs
+
+    print("Páginas de componentes recuperadas do cache; gerando apenas o resumo.")
+    story = _summary_story(report_data, metrics)
+    summary_tmp = output_pdf_path + '.summary.tmp'
+    try:
+        with metrics.stage('pdf_build'):
+            StreamingDocTemplate(summary_tmp, pagesize=A4).build(story)
+            try:
+                concatenate_pdfs([summary_tmp, section_path], output_pdf_path)
+            except FileNotFoundError:
+                return False  # descartada por outro processo: construção completa
+    finally:
+        if os.path.exists(summary_tmp):
+            os.remove(summary_tmp)
+    print(f"Relatório criado com sucesso: {output_pdf_path}")
+    return True
+
+
+def _build_document(report_data, output_pdf_path, engine, pairs, loaded_results, metrics, raw_pairs=None):
+    """
+    Monta o 'story' (resumo + componentes) e grava o PDF. Com `raw_pairs`
+    (pares preparados sem codificação), os pares não são preparados de novo:
+    só as imagens são codificadas com o 'image_encoding' de `report_data`.
+
+    Returns:
+        tuple: Índice (base 0) da primeira página de componentes e os
+        registros dos componentes (ver results_store.py).
+    """
+    from reportlab.lib.pagesizes import A4
+
+    from streaming_doc import SectionBreak, StreamingDocTemplate
+    from part_analysis import ComponentAnalyzer
+    from inspection_pairs import encode_prepared_pair, iter_prepared_pairs
+
+    # 2. Gerar a primeira parte do relatório (página de resumo)
+    story = _summary_story(report_data, metrics)
+    story.append(SectionBreak('components'))
+
+    # 3. Gerar e adicionar a segunda parte (análise detalhada)
+    # Os próximos pares são preparados em paralelo (imagem anotada, registro e
+    # temperaturas) e montados na ordem de 'image_pairs'; os recortes são feitos
+    # ao montar cada página. Em modo streaming isso acontece durante o doc.build,
+    # uma página de cada vez.
+    print(f"\nStep 3: Gerando a análise detalhada dos componentes ({len(pairs)} par(es) de imagens)...")
+    # O tempo de cada par, recorte e página entra em 'annotate', 'scene', 'crops', 'pages'
+    # e 'pair_wait' mesmo quando é gasto dentro do doc.build; 'pdf_build' mede só o layout.
+    with metrics.stage('pages'):
+        analyzer = ComponentAnalyzer(report_data)
+        if raw_pairs is not None:
+            prepared_pairs = (encode_prepared_pair(prepared, analyzer) for prepared in raw_pairs)
+        else:
+            prepared_pairs = iter_prepared_pairs(engine, analyzer, pairs, loaded_results,
+                                                 workers=report_data.get('pair_workers'), metrics=metrics)
+        analyzer.add_prepared_pairs_to_story(
+            story, prepared_pairs, streaming=report_data.get('streaming_build', False), metrics=metrics
+        )
+        print("Análise detalhada adicionada ao relatório.")
+
+    # 4. Construir o PDF final a partir do 'story' combinado
+    print("\nStep 4: Construindo o PDF final...")
+    with metrics.stage('pdf_build'):
+        doc = StreamingDocTemplate(output_pdf_path, pagesize=A4)
+        doc.build(story)
+    print(f"Relatório criado com sucesso: {output_pdf_path}")
+    return doc.section_starts['components'], analyzer.component_records
+
+
+def warm_up(report_data=None):
+    """
+    Carrega antecipadamente o pipeline e o estado reaproveitável entre relatórios
+    (módulos, folhas de estilo, logotipo, tabela de calibração térmica e
+    tabelas de remapeamento do registro térmico).
+
+    Usado por processos de longa duração, como o render_service.py.
+    """
+    import report_generator
+    import part_analysis
+    import inference_engine  # noqa: F401 -- só pré-importa o módulo (e o OpenCV) antes do primeiro relatório
+    from image_utils import file_image_reader
+    from thermal_analysis import ThermalCalibration
+    from registration import RigRegistration
+
+    report_data = report_data or build_report_data()
+    report_generator._get_styles()
+    part_analysis._get_styles()
+    file_image_reader(report_data['logo_path']).getRGBData()
+    ThermalCalibration.from_config(report_data['thermal_calibration']).lut
+    registration = RigRegistration.from_config(report_data['thermal_registration'],
+                                               cache_dir=report_data['registration_cache_dir'])
+    if registration.is_calibrated:
+        registration.coverage(registration.thermal_size, registration.visual_size)
+
+
+def run():
+    """
+    Função principal (Controlador) que orquestra a coleta de dados,
+    o carregamento dos resultados da inferência e a geração do relatório.
+    """
+    output_pdf_path = "Final_Inspection_Report.pdf"
+    
+    # 1. Montar o dicionário de dados principal a partir das fontes de dados
+    report_data = build_report_data()
+
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # --- ETAPA DE CARREGAMENTO DOS RESULTADOS (modificado) ---
-            print("Step 1: Inicializando o motor e carregando resultados...")
-            engine = InferenceEngine()
-            
-            # Carrega os resultados do arquivo pickle em vez de executar a inferência
-            results = engine.load_inference_from_pickle(pickle_path=report_data['pickle_path'])
-            
-            # Gera a imagem anotada usando o motor
-            annotated_image_path = engine.generate_annotated_image(results, temp_dir)
-
-            # --- ETAPA DE GERAÇÃO DO RELATÓRIO ---
-            # 2. Gerar a primeira parte do relatório (página de resumo)
-            print("\nStep 2: Gerando a página de resumo...")
-            report_generator = ReportGenerator(report_data)
-            story = report_generator.generate_summary_story()
-            print("Página de resumo criada.")
-            story.append(PageBreak())
-
-            # 3. Gerar e adicionar a segunda parte (análise detalhada)
-            print("\nStep 3: Gerando a análise detalhada dos componentes...")
-            analyzer = ComponentAnalyzer(report_data)
-            analyzer.add_analysis_to_story(
-                story,
-                results=results,
-                visual_img_path=report_data['visual_image_path'],
-                thermal_img_path=report_data['thermal_image_path'],
-                annotated_visual_image_path=annotated_image_path,
-                temp_dir=temp_dir
-            )
-            print("Análise detalhada adicionada ao relatório.")
-
-            # 4. Construir o PDF final a partir do 'story' combinado
-            print("\nStep 4: Construindo o PDF final...")
-            doc = SimpleDocTemplate(output_pdf_path, pagesize=A4)
-            doc.build(story)
-            print(f"Relatório criado com sucesso: {output_pdf_path}")
+        render_report(report_data, output_pdf_path)
 
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}")
@@ -0,0 +1,244 @@
+# batch_report.py
+"""
+Geração de relatórios em lote.
+
+Renderiza muitas inspeções em paralelo, uma por processo de trabalho, usando o
+mesmo pipeline do Main.py (InferenceEngine / ReportGenerator / ComponentAnalyzer).
+
+As inspeções podem vir de:
+  * um manifesto JSON Lines, em que cada linha sobrescreve campos do report_data
+    (no mínimo 'pickle_path', 'visual_image_path' e 'thermal_image_path', ou uma
+    lista 'image_pairs' com esses campos em cada par);
+  * um diretório em que cada subdiretório é uma inspeção contendo um arquivo
+    de resultados (.pkl ou .cdet), uma imagem visual (*visual*) e uma imagem
+    térmica (*termica* / *thermal*);
+  * um arquivo de metadados (CSV, JSON Lines ou SQLite, ver metadata_provider.py)
+    com uma inspeção por registro. Junto com --manifest ou --inspections-dir,
+    os metadados completam cada job, localizado pela nota ('form_number') ou,
+    sem ela, pelo nome do job (ex.: o subdiretório 'NOTA_1' para a nota 'NOTA 1').
+
+Exemplo:
+    python batch_report.py --inspections-dir campanha/ --output-dir relatorios/ --workers 8
+    python batch_report.py --metadata inspecoes.csv --output-dir relatorios/
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from parallel_utils import nested_workers
+
+REQUIRED_KEYS = ('pickle_path', 'visual_image_path', 'thermal_image_path')
+RESULTS_EXTENSIONS = ('.pkl', '.cdet')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+
+
+def _check_required_keys(overrides, where):
+    """Verifica os campos obrigatórios de uma inspeção (ou de cada par de 'image_pairs')."""
+    # Inspeções com vários pares trazem 'image_pairs' no lugar dos campos do par único
+    pairs = overrides.get('image_pairs') or [overrides]
+    for pair_number, pair in enumerate(pairs, start=1):
+        missing = [key for key in REQUIRED_KEYS if key not in pair]
+        if missing:
+            pair_info = f" (par {pair_number})" if 'image_pairs' in overrides else ""
+            raise ValueError(f"{where}{pair_info} sem os campos: {', '.join(missing)}")
+
+
+def load_manifest(manifest_path):
+    """
+    Lê um manifesto JSON Lines e retorna a lista de jobs.
+
+    Cada job é um dicionário com 'job_id' e 'overrides' (campos do report_data).
+    """
+    jobs = []
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            overrides = json.loads(line)
+            _check_required_keys(overrides, f"Linha {line_number} do manifesto")
+            for pair in overrides.get('image_pairs') or [overrides]:
+                # Caminhos relativos são resolvidos a partir do diretório do manifesto
+                for key in REQUIRED_KEYS:
+                    if not os.path.isabs(pair[key]):
+                        pair[key] = os.path.join(base_dir, pair[key])
+            job_id = str(overrides.pop('job_id', f"inspecao_{line_number:05d}"))
+            jobs.append({'job_id': job_id, 'overrides': overrides})
+    return jobs
+
+
+def load_metadata_jobs(provider):
+    """Um job por registro de um `MetadataProvider` (os registros devem trazer os caminhos da inspeção)."""
+    jobs = provider.jobs()
+    for job in jobs:
+        _check_required_keys(job['overrides'], f"Nota {job['overrides']['form_number']} de {provider.source}")
+    return jobs
+
+
+def apply_metadata(jobs, provider):
+    """
+    Completa cada job com o registro de mesma nota ('form_number' do job) ou,
+    sem ela, de mesmo nome de job. Os campos do próprio job têm precedência.
+    """
+    for job in jobs:
+        form_number = job['overrides'].get('form_number')
+        record = provider.by_form_number(form_number) if form_number in provider else provider.by_job_id(job['job_id'])
+        if record is None:
+            print(f"AVISO: sem metadados para {job['job_id']}; usando os valores padrão.")
+            continue
+        job['overrides'] = {**{k: v for k, v in record.items() if k != 'job_id'}, **job['overrides']}
+    return jobs
+
+
+def _find_single(files, keywords, description, folder):
+    matches = [f for f in files if any(k in os.path.basename(f).lower() for k in keywords)]
+    if len(matches) != 1:
+        raise ValueError(f"Esperada exatamente uma {description} em {folder}, encontradas {len(matches)}")
+    return matches[0]
+
+
+def discover_inspections(inspections_dir):
+    """
+    Procura inspeções nos subdiretórios de `inspections_dir`.
+
+    Subdiretórios incompletos ou ambíguos são ignorados com um aviso.
+    """
+    jobs = []
+    for folder in sorted(glob.glob(os.path.join(inspections_dir, '*'))):
+        if not os.path.isdir(folder):
+            continue
+        try:
+            results_files = [f for f in glob.glob(os.path.join(folder, '*'))
+                       if os.path.splitext(f)[1].lower() in RESULTS_EXTENSIONS]
+            if len(results_files) != 1:
+                raise ValueError(f"Esperado exatamente um arquivo de resultados em {folder}, encontrados {len(results_files)}")
+            images = [f for f in glob.glob(os.path.join(folder, '*'))
+                      if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS]
+            overrides = {
+                'pickle_path': results_files[0],
+                'visual_image_path': _find_single(images, ('visual',), "imagem visual", folder),
+                'thermal_image_path': _find_single(images, ('termica', 'thermal', 'térmica'), "imagem térmica", folder),
+            }
+        except ValueError as e:
+            print(f"AVISO: {e}. Inspeção ignorada.")
+            continue
+        jobs.append({'job_id': os.path.basename(folder), 'overrides': overrides})
+    return jobs
+
+
+def _render_job(job, output_dir, verbose=False, threads=None):
+    """
+    Executa o pipeline de uma inspeção dentro de um processo de trabalho, com
+    no máximo `threads` threads de preparação dos componentes (se a inspeção
+    não definir as suas).
+    """
+    # Importado aqui para que cada processo carregue o pipeline apenas uma vez
+    from Main import apply_overrides, build_report_data, render_report
+
+    output_pdf_path = os.path.join(output_dir, f"{job['job_id']}.pdf")
+    start = time.perf_counter()
+    try:
+        overrides = dict(job['overrides'])
+        if isinstance(overrides.get('timestamp'), str):
+            overrides['timestamp'] = datetime.fromisoformat(overrides['timestamp'])
+        output_pdf_path = overrides.pop('output_pdf_path', output_pdf_path)
+        report_data = apply_overrides(build_report_data(), overrides)
+        if threads and not report_data.get('component_workers'):
+            report_data['component_workers'] = threads
+
+        if verbose:
+            render_report(report_data, output_pdf_path)
+        else:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                render_report(report_data, output_pdf_path)
+        return {'job_id': job['job_id'], 'ok': True, 'output': output_pdf_path,
+                'seconds': time.perf_counter() - start, 'error': None}
+    except Exception as e:
+        return {'job_id': job['job_id'], 'ok': False, 'output': None,
+                'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_batch(jobs, output_dir, workers=None, verbose=False):
+    """
+    Renderiza todos os jobs em um pool de processos.
+
+    Returns:
+        list: Um dicionário de resultado por job, na ordem de conclusão.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outcomes = []
+    start = time.perf_counter()
+    print(f"Renderizando {len(jobs)} inspeções com {workers or os.cpu_count()} processos...")
+    # As CPUs são divididas entre os processos: cada um usa CPUs / processos threads
+    threads = nested_workers(workers or os.cpu_count())
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_render_job, job, output_dir, verbose, threads): job for job in jobs}
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes.append(outcome)
+            if outcome['ok']:
+                print(f"[OK]    {outcome['job_id']} ({outcome['seconds']:.1f}s) -> {outcome['output']}")
+            else:
+                print(f"[FALHA] {outcome['job_id']} ({outcome['seconds']:.1f}s): {outcome['error']}")
+
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for o in outcomes if o['ok'])
+    throughput = succeeded / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"\nConcluído: {succeeded} sucesso(s), {len(outcomes) - succeeded} falha(s) "
+          f"em {elapsed:.1f}s ({throughput:.1f} relatórios/min)")
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geração de relatórios de inspeção em lote.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--manifest', help="Manifesto JSON Lines com uma inspeção por linha.")
+    source.add_argument('--inspections-dir', help="Diretório com um subdiretório por inspeção.")
+    parser.add_argument('--metadata', help="Metadados das inspeções (CSV, JSON Lines ou SQLite).")
+    parser.add_argument('--metadata-table', default='inspections', help="Tabela dos metadados em SQLite.")
+    parser.add_argument('--output-dir', default='relatorios', help="Diretório de saída dos PDFs.")
+    parser.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: nº de CPUs).")
+    parser.add_argument('--verbose', action='store_true', help="Mostra a saída do pipeline de cada inspeção.")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Cache de relatórios: inspeções inalteradas são copiadas sem renderizar.")
+    parser.add_argument('--cache-max-mb', type=float, default=None, help="Tamanho máximo do cache (MB).")
+    args = parser.parse_args(argv)
+    if not (args.manifest or args.inspections_dir or args.metadata):
+        parser.error("informe --manifest, --inspections-dir e/ou --metadata")
+
+    provider = None
+    if args.metadata:
+        from metadata_provider import MetadataProvider
+        provider = MetadataProvider.from_file(args.metadata, table=args.metadata_table)
+
+    if args.manifest:
+        jobs = load_manifest(args.manifest)
+    elif args.inspections_dir:
+        jobs = discover_inspections(args.inspections_dir)
+    else:
+        jobs = load_metadata_jobs(provider)
+    if provider is not None and (args.manifest or args.inspections_dir):
+        jobs = apply_metadata(jobs, provider)
+    if not jobs:
+        print("Nenhuma inspeção encontrada.")
+        return 1
+
+    cache_overrides = {key: value for key, value in (('report_cache_dir', args.cache_dir),
+                                                     ('report_cache_max_mb', args.cache_max_mb)) if value is not None}
+    for job in jobs:
+        job['overrides'] = dict(cache_overrides, **job['overrides'])
+
+    outcomes = run_batch(jobs, args.output_dir, workers=args.workers, verbose=args.verbose)
+    return 0 if all(o['ok'] for o in outcomes) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
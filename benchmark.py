@@ -0,0 +1,234 @@
+# benchmark.py
+"""
+Benchmark do pipeline com cenas sintéticas.
+
+Gera resultados de detecção sintéticos (formato .cdet) com número de
+componentes, resolução e densidade de máscara configuráveis e gera o relatório
+com Main.render_report (o mesmo caminho da produção, com cache, banco de
+resultados e arquivos de métricas desativados). Os tempos são as etapas de
+metrics.StageMetrics: load, annotate, summary, scene (leitura das imagens e
+registro), temperatures (estatísticas por componente), crops (recortes e sua codificação), pages (páginas
+dos componentes), pair_wait, pdf_build e total.
+
+Os resultados (mediana de --repeat execuções, em ms) são gravados em JSON. Com
+--baseline, cada etapa é comparada à linha de base e a execução falha (código 1)
+se alguma ficar mais lenta que o limite configurado.
+
+Os casos com 500 componentes acompanham o custo por máscara das etapas
+'temperatures' e 'crops'.
+
+Exemplos:
+    python benchmark.py --components 0 1 10 100 500 --resolutions vga 12mp --save-baseline benchmark_baseline.json
+    python benchmark.py --components 0 1 10 100 500 --resolutions vga 12mp --baseline benchmark_baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    'vga': (640, 480),
+    '2mp': (1920, 1080),
+    '12mp': (4000, 3000),
+    '48mp': (8000, 6000),
+}
+# Lado maior da entrada do modelo; as máscaras sintéticas ficam nessa resolução
+MODEL_IMGSZ = 640
+STAGES = ('load', 'annotate', 'summary', 'scene', 'temperatures', 'crops', 'pages', 'pair_wait', 'pdf_build',
+          'total')
+CLASS_NAMES = {0: 'connector', 1: 'vertical-insulator', 2: 'horizontal-insulator',
+               3: 'fuse-cutout', 4: 'overhead-switch', 5: 'transformer'}
+
+
+def model_mask_shape(resolution, imgsz=MODEL_IMGSZ, stride=32):
+    """Mask shape (H, W) of a letterboxed model input (long side `imgsz`, padded to `stride`)."""
+    width, height = resolution
+    gain = imgsz / max(width, height)
+    return (int(np.ceil(height * gain / stride) * stride), int(np.ceil(width * gain / stride) * stride))
+
+
+def make_synthetic_scene(n_components, resolution, mask_density, seed=0):
+    """
+    Cria uma cena sintética.
+
+    As máscaras ficam na resolução da entrada do modelo (lado maior de
+    MODEL_IMGSZ pixels, com letterbox), como as do Ultralytics.
+
+    Args:
+        n_components (int): Número de componentes detectados.
+        resolution (tuple): (largura, altura) das imagens.
+        mask_density (float): Fração (0-1] da caixa coberta pela máscara elíptica.
+        seed (int): Semente do gerador aleatório.
+
+    Returns:
+        tuple: (visual_img, thermal_img, detections)
+    """
+    from detection_format import Detections
+
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    visual = cv2.resize(rng.integers(0, 256, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8),
+                        (width, height), interpolation=cv2.INTER_LINEAR)
+    gray = cv2.resize(rng.integers(0, 256, (height // 16 + 1, width // 16 + 1), dtype=np.uint8),
+                      (width, height), interpolation=cv2.INTER_CUBIC)
+    thermal = cv2.applyColorMap(gray, cv2.COLORMAP_JET)
+
+    max_side = max(16, min(width, height) // 4)
+    sides = rng.integers(16, max_side + 1, size=(n_components, 2))
+    x1 = rng.integers(0, np.maximum(1, width - sides[:, 0]))
+    y1 = rng.integers(0, np.maximum(1, height - sides[:, 1]))
+    boxes = np.stack([x1, y1, x1 + sides[:, 0], y1 + sides[:, 1]], axis=1).astype(np.float32)
+
+    # Elipses desenhadas diretamente no espaço da máscara (letterbox centralizado)
+    mask_h, mask_w = model_mask_shape(resolution)
+    gain = min(mask_h / height, mask_w / width)
+    pad_x, pad_y = (mask_w - width * gain) / 2, (mask_h - height * gain) / 2
+    packed = np.zeros((n_components, mask_h, -(-mask_w // 8)), dtype=np.uint8)
+    axis_scale = np.sqrt(mask_density)
+    mask = np.zeros((mask_h, mask_w), dtype=np.uint8)
+    for i, (bx1, by1, bx2, by2) in enumerate(boxes):
+        mask[:] = 0
+        center = (int((bx1 + bx2) / 2 * gain + pad_x), int((by1 + by2) / 2 * gain + pad_y))
+        axes = (max(1, int((bx2 - bx1) / 2 * gain * axis_scale)), max(1, int((by2 - by1) / 2 * gain * axis_scale)))
+        cv2.ellipse(mask, center, axes, 0, 0, 360, 1, -1)
+        packed[i] = np.packbits(mask, axis=-1)
+
+    detections = Detections(boxes, rng.integers(0, len(CLASS_NAMES), n_components),
+                            rng.random(n_components), CLASS_NAMES, (mask_h, mask_w), (height, width),
+                            packed_masks=packed)
+    return visual, thermal, detections
+
+
+def run_case(n_components, resolution, mask_density, work_dir, seed=0):
+    """Gera o relatório de uma cena sintética e retorna o tempo de parede (ms) de cada etapa."""
+    from Main import build_report_data, render_report
+    from metrics import StageMetrics
+
+    visual, thermal, detections = make_synthetic_scene(n_components, resolution, mask_density, seed)
+    report_data = build_report_data()
+    report_data.update({
+        'visual_image_path': os.path.join(work_dir, 'visual.jpg'),
+        'thermal_image_path': os.path.join(work_dir, 'thermal.jpg'),
+        'pickle_path': os.path.join(work_dir, 'scene.cdet'),
+        'report_cache_dir': None,
+        'results_db_path': None,
+        'metrics_json_path': None,
+        'metrics_prometheus_path': None,
+    })
+    cv2.imwrite(report_data['visual_image_path'], visual)
+    cv2.imwrite(report_data['thermal_image_path'], thermal)
+    detections.save(report_data['pickle_path'])
+    del visual, thermal, detections
+
+    metrics = StageMetrics(report_id='benchmark')
+    render_report(report_data, os.path.join(work_dir, 'report.pdf'), metrics=metrics)
+
+    timings = {stage: values['wall_s'] for stage, values in metrics.stages.items()}
+    timings['total'] = metrics.as_record()['total_wall_s']
+    return {stage: timings.get(stage, 0.0) * 1000.0 for stage in STAGES}
+
+
+def case_name(n_components, resolution_name, mask_density):
+    return f"c{n_components}_{resolution_name}_d{mask_density:g}"
+
+
+def run_benchmarks(components, resolutions, densities, repeat=3):
+    """Roda a matriz de casos e retorna {nome_do_caso: {etapa: mediana_ms}}."""
+    from Main import warm_up
+
+    # Importações e estado compartilhado carregados antes, fora do tempo do primeiro caso
+    warm_up()
+    cases = {}
+    for resolution_name in resolutions:
+        for n_components in components:
+            for density in densities:
+                name = case_name(n_components, resolution_name, density)
+                runs = []
+                for run_index in range(repeat):
+                    with tempfile.TemporaryDirectory() as work_dir, \
+                            contextlib.redirect_stdout(io.StringIO()):
+                        runs.append(run_case(n_components, RESOLUTIONS[resolution_name], density,
+                                             work_dir, seed=run_index))
+                cases[name] = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+                print(f"{name:<22} " + "  ".join(f"{stage} {cases[name][stage]:9.1f}" for stage in STAGES))
+    return cases
+
+
+def compare_to_baseline(cases, baseline, threshold, min_delta_ms):
+    """
+    Compara os casos com a linha de base.
+
+    Uma etapa é uma regressão se ficou mais de `threshold` (fração) mais lenta
+    E a diferença absoluta passa de `min_delta_ms` (evita ruído em etapas rápidas).
+    """
+    regressions = []
+    for name, stages in cases.items():
+        base_stages = baseline.get('cases', {}).get(name)
+        if base_stages is None:
+            print(f"AVISO: caso {name} ausente da linha de base.")
+            continue
+        for stage, value in stages.items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            if value - base > min_delta_ms and value > base * (1 + threshold):
+                regressions.append(f"{name}/{stage}: {base:.1f} ms -> {value:.1f} ms (+{(value / base - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com cenas sintéticas.")
+    parser.add_argument('--components', type=int, nargs='+', default=[0, 1, 10, 100, 500])
+    parser.add_argument('--resolutions', nargs='+', default=['vga', '12mp'], choices=sorted(RESOLUTIONS))
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.6],
+                        help="Fração da caixa coberta pela máscara de cada componente.")
+    parser.add_argument('--repeat', type=int, default=3, help="Execuções por caso (usa a mediana).")
+    parser.add_argument('--output', default='benchmark_results.json', help="Arquivo JSON com os resultados.")
+    parser.add_argument('--save-baseline', metavar='ARQUIVO', help="Grava os resultados como nova linha de base.")
+    parser.add_argument('--baseline', metavar='ARQUIVO', help="Linha de base para detectar regressões.")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Regressão relativa tolerada (0.25 = 25%%).")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help="Diferença absoluta mínima para acusar regressão.")
+    args = parser.parse_args(argv)
+
+    cases = run_benchmarks(args.components, args.resolutions, args.densities, args.repeat)
+    record = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'unit': 'ms',
+        },
+        'cases': cases,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    print(f"\nResultados gravados em {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+        print(f"Linha de base gravada em {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(cases, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRegressões em relação à linha de base:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nNenhuma regressão em relação à linha de base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
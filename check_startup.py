@@ -0,0 +1,109 @@
+# check_startup.py
+"""
+Verificação do custo de importação (tempo de inicialização) dos módulos.
+
+Cada módulo é importado em um interpretador novo com `python -X importtime`.
+O script falha (código de saída 1) se algum módulo ultrapassar o seu orçamento
+em milissegundos ou se carregar uma dependência pesada proibida (torch,
+ultralytics) no momento da importação.
+
+Exemplo:
+    python check_startup.py
+    python check_startup.py --budget Main=50 --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Orçamento de importação (ms) por módulo de entrada
+DEFAULT_BUDGETS_MS = {
+    'Main': 60,
+    'batch_report': 120,
+    'fleet_report': 250,
+    'get_utils': 30,
+    'detection_format': 400,
+    'inference_engine': 400,
+    'part_analysis': 800,
+    'report_generator': 500,
+}
+
+# Dependências que nunca devem ser carregadas só por importar o código
+FORBIDDEN_MODULES = ('torch', 'ultralytics')
+
+
+def measure_import(module_name, repo_dir):
+    """
+    Importa `module_name` em um processo novo e retorna (tempo_total_ms, tempos_por_modulo).
+
+    `tempos_por_modulo` mapeia o nome de cada módulo carregado ao seu tempo
+    cumulativo em ms, conforme relatado por `-X importtime`.
+    """
+    env = dict(os.environ, PYTHONPATH=repo_dir + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=repo_dir, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module_name}:\n{completed.stderr}")
+
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            _, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+            cumulative[name] = int(cumulative_us) / 1000.0
+        except ValueError:
+            continue  # linha de cabeçalho
+    return cumulative.get(module_name, 0.0), cumulative
+
+
+def check(budgets, repo_dir, repeat=3, top=5):
+    """Mede cada módulo (melhor de `repeat` execuções) e retorna a lista de falhas."""
+    failures = []
+    for module_name, budget_ms in budgets.items():
+        runs = [measure_import(module_name, repo_dir) for _ in range(repeat)]
+        total_ms, cumulative = min(runs, key=lambda run: run[0])
+
+        status = "OK" if total_ms <= budget_ms else "ACIMA DO ORÇAMENTO"
+        print(f"{module_name:<20} {total_ms:8.1f} ms  (orçamento {budget_ms} ms)  {status}")
+        # Maiores contribuintes de primeiro nível (nomes sem ponto), exceto o próprio módulo
+        heaviest = sorted(((ms, name) for name, ms in cumulative.items()
+                           if name != module_name and '.' not in name), reverse=True)[:top]
+        for ms, name in heaviest:
+            print(f"    {name:<28} {ms:8.1f} ms")
+
+        if total_ms > budget_ms:
+            failures.append(f"{module_name}: {total_ms:.1f} ms > {budget_ms} ms")
+        loaded_forbidden = [name for name in FORBIDDEN_MODULES if name in cumulative]
+        if loaded_forbidden:
+            failures.append(f"{module_name}: importa {', '.join(loaded_forbidden)} na inicialização")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica o tempo de importação dos módulos.")
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULO=MS',
+                        help="Sobrescreve (ou adiciona) o orçamento de um módulo. Pode ser repetido.")
+    parser.add_argument('--repeat', type=int, default=3, help="Execuções por módulo (usa a mais rápida).")
+    args = parser.parse_args(argv)
+
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget:
+        module_name, _, value = item.partition('=')
+        budgets[module_name] = float(value)
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    failures = check(budgets, repo_dir, repeat=args.repeat)
+    if failures:
+        print("\nFalhas:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\nTodos os módulos dentro do orçamento de importação.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+# detection_format.py
+"""
+Compact, torch-free file format for segmentation results.
+
+A ``.cdet`` file stores, for a single frame, the boxes (xyxy), class ids,
+confidences, class names and bit-packed masks produced by the model. Arrays are
+written raw and 64-byte aligned after a small JSON header, so they can be
+memory-mapped and only the mask rows that are actually needed get read.
+
+Layout:
+    MAGIC | uint64 header length | JSON header | padding | arrays...
+
+Converting an existing Ultralytics pickle:
+    python detection_format.py pickle_resultado_inferencia.pkl resultado.cdet
+"""
+import json
+import os
+import struct
+import sys
+
+import cv2
+import numpy as np
+
+MAGIC = b"CDET\x00\x01\r\n"
+DETECTIONS_EXTENSION = ".cdet"
+_ALIGNMENT = 64
+
+
+class Detections:
+    """
+    Detections of a single frame, independent of torch and Ultralytics.
+
+    Masks are kept either dense, shape (n, H, W), or bit-packed along the last
+    axis, shape (n, H, ceil(W / 8)), at the model's mask resolution. Both are
+    accessed through `mask_crop` (mask space) or `mask_roi` (image space).
+    """
+    def __init__(self, boxes, class_ids, confidences, names, mask_shape, orig_shape,
+                 masks=None, packed_masks=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.names = {int(k): v for k, v in dict(names).items()}
+        self.mask_shape = tuple(int(v) for v in mask_shape) if mask_shape is not None else None
+        self.orig_shape = tuple(int(v) for v in orig_shape)
+        self._masks = masks
+        self._packed_masks = packed_masks
+
+    def __len__(self):
+        return len(self.class_ids)
+
+    @property
+    def has_masks(self):
+        return self._masks is not None or self._packed_masks is not None
+
+    @classmethod
+    def from_ultralytics(cls, result, pack_masks=True):
+        """
+        Builds a Detections object from an Ultralytics `Results` object.
+
+        Args:
+            result: A single Ultralytics `Results` object.
+            pack_masks (bool): Bit-pack the masks (for storage) or keep them dense.
+        """
+        boxes = result.boxes.xyxy.cpu().numpy()
+        class_ids = result.boxes.cls.cpu().numpy()
+        confidences = result.boxes.conf.cpu().numpy()
+        masks = packed_masks = mask_shape = None
+        if result.masks is not None:
+            masks = result.masks.data.cpu().numpy()
+            mask_shape = masks.shape[1:]
+            if pack_masks:
+                packed_masks = np.packbits(masks > 0, axis=-1)
+                masks = None
+        return cls(boxes, class_ids, confidences, result.names, mask_shape,
+                   result.orig_shape, masks=masks, packed_masks=packed_masks)
+
+    def mask_crop(self, index, x1, y1, x2, y2):
+        """
+        Returns the region [y1:y2, x1:x2] of mask `index`.
+
+        For packed masks only the bytes covering the region are unpacked.
+        """
+        if self._masks is not None:
+            return self._masks[index, y1:y2, x1:x2]
+        x2 = min(x2, self.mask_shape[1])
+        byte_start, byte_end = x1 // 8, -(-x2 // 8)
+        rows = np.unpackbits(self._packed_masks[index, y1:y2, byte_start:byte_end], axis=-1)
+        offset = x1 - byte_start * 8
+        return rows[:, offset:offset + (x2 - x1)]
+
+    def scaled_boxes(self, image_shape):
+        """Boxes (xyxy, float) in the pixel coordinates of an image of shape `image_shape` (H, W[, C])."""
+        orig_h, orig_w = self.orig_shape[:2]
+        image_h, image_w = image_shape[:2]
+        if (image_h, image_w) == (orig_h, orig_w):
+            return self.boxes
+        return self.boxes * np.array([image_w / orig_w, image_h / orig_h] * 2, dtype=np.float32)
+
+    def _mask_transform(self, image_shape):
+        """
+        Returns (offset_x, offset_y, scale_x, scale_y) mapping pixel edges of an
+        image of shape `image_shape` to mask space, undoing the letterbox the
+        model input was built with (same convention as Ultralytics' scale_masks).
+        """
+        mask_h, mask_w = self.mask_shape
+        orig_h, orig_w = self.orig_shape[:2]
+        gain = min(mask_h / orig_h, mask_w / orig_w)
+        pad_w, pad_h = (mask_w - orig_w * gain) / 2, (mask_h - orig_h * gain) / 2
+        top, left = int(round(pad_h - 0.1)), int(round(pad_w - 0.1))
+        bottom, right = mask_h - int(round(pad_h + 0.1)), mask_w - int(round(pad_w + 0.1))
+        image_h, image_w = image_shape[:2]
+        return left, top, (right - left) / image_w, (bottom - top) / image_h
+
+    def mask_roi(self, index, x1, y1, x2, y2, output_size, image_shape=None):
+        """
+        Returns mask `index` over the box [x1:x2, y1:y2] (pixels of an image of
+        shape `image_shape`, default `orig_shape`) resampled to `output_size`
+        (width, height).
+
+        When the masks are at a different resolution than the image (model input
+        size, possibly letterboxed), the box is mapped into mask space and only
+        that window is read and upsampled straight to `output_size`, bilinearly
+        and thresholded at 0.5 as Ultralytics does, so memory depends on the
+        crop size and not on the frame size.
+        """
+        image_shape = self.orig_shape if image_shape is None else image_shape
+        output_size = tuple(int(v) for v in output_size)
+        if tuple(image_shape[:2]) == self.mask_shape:
+            return cv2.resize(self.mask_crop(index, x1, y1, x2, y2), output_size, interpolation=cv2.INTER_NEAREST)
+
+        offset_x, offset_y, scale_x, scale_y = self._mask_transform(image_shape)
+        mx1, mx2 = offset_x + x1 * scale_x, offset_x + x2 * scale_x
+        my1, my2 = offset_y + y1 * scale_y, offset_y + y2 * scale_y
+        if mx2 <= mx1 or my2 <= my1:
+            return np.zeros(output_size[::-1], dtype=np.uint8)
+
+        # Janela da máscara que cobre a caixa, com 1 pixel de margem para a interpolação
+        mask_h, mask_w = self.mask_shape
+        wx1, wy1 = max(int(np.floor(mx1)) - 1, 0), max(int(np.floor(my1)) - 1, 0)
+        wx2, wy2 = min(int(np.ceil(mx2)) + 1, mask_w), min(int(np.ceil(my2)) + 1, mask_h)
+        window = np.ascontiguousarray(self.mask_crop(index, wx1, wy1, wx2, wy2), dtype=np.float32)
+
+        # Centro de cada pixel de saída -> coordenada na janela da máscara
+        step_x, step_y = (mx2 - mx1) / output_size[0], (my2 - my1) / output_size[1]
+        matrix = np.array([[step_x, 0, mx1 - wx1 + 0.5 * step_x - 0.5],
+                           [0, step_y, my1 - wy1 + 0.5 * step_y - 0.5]], dtype=np.float64)
+        upsampled = cv2.warpAffine(window, matrix, output_size, flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return (upsampled > 0.5).astype(np.uint8)
+
+    def dense_mask(self, index):
+        """Returns the full mask `index` as a (H, W) uint8/float array."""
+        return self.mask_crop(index, 0, 0, self.mask_shape[1], self.mask_shape[0])
+
+    def plot(self, image, alpha=0.5):
+        """
+        Draws masks, boxes and labels on a copy of `image` (BGR), similar to
+        the Ultralytics `Results.plot()`.
+        """
+        annotated = image.copy()
+        h, w = annotated.shape[:2]
+        line_width = max(round((h + w) / 2 * 0.003), 2)
+
+        boxes = self.scaled_boxes(annotated.shape)
+        if self.has_masks:
+            overlay = annotated.copy()
+            if self.mask_shape == (h, w):
+                for i in range(len(self)):
+                    overlay[self.dense_mask(i) > 0] = _class_color(self.class_ids[i])
+            else:
+                # Máscaras em outra resolução: só a região de cada caixa é ampliada
+                for i, (bx1, by1, bx2, by2) in enumerate(boxes):
+                    bx1, by1 = max(int(np.floor(bx1)), 0), max(int(np.floor(by1)), 0)
+                    bx2, by2 = min(int(np.ceil(bx2)), w), min(int(np.ceil(by2)), h)
+                    if bx2 <= bx1 or by2 <= by1:
+                        continue
+                    roi = self.mask_roi(i, bx1, by1, bx2, by2, (bx2 - bx1, by2 - by1), image_shape=(h, w))
+                    overlay[by1:by2, bx1:bx2][roi > 0] = _class_color(self.class_ids[i])
+            annotated = cv2.addWeighted(overlay, alpha, annotated, 1 - alpha, 0)
+
+        for (x1, y1, x2, y2), class_id, conf in zip(boxes.astype(int), self.class_ids, self.confidences):
+            color = _class_color(class_id)
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, line_width)
+            text = f"{self.names.get(int(class_id), int(class_id))} {conf:.2f}"
+            font_scale, thickness = line_width / 3, max(line_width - 1, 1)
+            (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            # Rótulo acima da caixa quando houver espaço, senão dentro dela
+            y_text = y1 - 3 if y1 - th - 3 >= 0 else y1 + th + 3
+            cv2.rectangle(annotated, (x1, y_text - th - 3), (x1 + tw, y_text + 3), color, -1)
+            cv2.putText(annotated, text, (x1, y_text), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+        return annotated
+
+    def save(self, path):
+        """Writes the detections to `path` in the compact `.cdet` format."""
+        packed = self._packed_masks
+        if packed is None and self._masks is not None:
+            packed = np.packbits(self._masks > 0, axis=-1)
+        arrays = {
+            'boxes': self.boxes,
+            'class_ids': self.class_ids,
+            'confidences': self.confidences,
+        }
+        if packed is not None:
+            arrays['masks'] = np.ascontiguousarray(packed, dtype=np.uint8)
+
+        header = {
+            'names': {str(k): v for k, v in self.names.items()},
+            'mask_shape': list(self.mask_shape) if self.mask_shape is not None else None,
+            'orig_shape': list(self.orig_shape),
+            'arrays': {},
+        }
+        # Offsets são relativos ao início da área de dados, que vem logo após o cabeçalho
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode('utf-8')
+        data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.seek(data_start + header['arrays'][name]['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Reads a `.cdet` file. With `mmap=True` the arrays are memory-mapped and
+        masks are only read from disk when accessed.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Arquivo não está no formato {DETECTIONS_EXTENSION}: {path}")
+            (header_length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        data_start = _align(len(MAGIC) + 8 + header_length)
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if mmap and int(np.prod(shape)) > 0:
+                arrays[name] = np.memmap(path, dtype=np.dtype(spec['dtype']), mode='r',
+                                         offset=data_start + spec['offset'], shape=shape)
+            else:
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(path, dtype=np.dtype(spec['dtype']), count=count,
+                                           offset=data_start + spec['offset']).reshape(shape)
+
+        return cls(arrays['boxes'], arrays['class_ids'], arrays['confidences'], header['names'],
+                   header['mask_shape'], header['orig_shape'], packed_masks=arrays.get('masks'))
+
+
+def as_detections(results):
+    """
+    Normalizes inference results to a `Detections` object.
+
+    Accepts a `Detections`, an Ultralytics `Results`, or a list of either (only
+    the first frame is used). Ultralytics masks are kept dense.
+    """
+    result = results[0] if isinstance(results, (list, tuple)) else results
+    if isinstance(result, Detections):
+        return result
+    return Detections.from_ultralytics(result, pack_masks=False)
+
+
+def convert_pickle(pickle_path, output_path):
+    """
+    Converts a pickle with Ultralytics results under the key 'resultado' into a
+    `.cdet` file. Requires torch/ultralytics to be installed to unpickle.
+    """
+    import pickle
+    with open(pickle_path, 'rb') as f:
+        results = pickle.load(f)['resultado']
+    Detections.from_ultralytics(results[0], pack_masks=True).save(output_path)
+    return output_path
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _class_color(class_id):
+    # Paleta fixa e determinística por classe (BGR)
+    palette = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+               (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0)]
+    return palette[int(class_id) % len(palette)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Uso: python {os.path.basename(sys.argv[0])} entrada.pkl saida{DETECTIONS_EXTENSION}")
+        sys.exit(1)
+    print(f"Convertido: {convert_pickle(sys.argv[1], sys.argv[2])}")
@@ -0,0 +1,103 @@
+# diagnosis.py
+"""
+Diagnóstico preliminar por faixa de ΔT, orientado a tabelas.
+
+Os limites de ΔT (°C) de cada classe de componente vêm de um arquivo JSON
+(diagnosis_thresholds.json), lido uma única vez por processo e compilado em
+uma matriz de limites, de modo que arrays inteiros de (rótulo, ΔT) são
+classificados em uma única chamada vetorizada.
+
+Formato do arquivo:
+    {
+      "levels": [{"name": "Sem Manutenção", "color": "lightgreen"}, ...],
+      "thresholds": {"connector": [20, 40, 60], ..., "default": [10, 30, 60]}
+    }
+
+'levels' vai do menos ao mais grave; cada classe tem um limite (crescente)
+para cada nível acima do primeiro. 'color' é o nome de uma cor do ReportLab
+ou uma tripla RGB (0-1). Classes ausentes usam 'default'.
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_LABEL = 'default'
+
+
+class DiagnosisEngine:
+    """
+    Classifies components into maintenance levels from their label and ΔT.
+    """
+    def __init__(self, levels, thresholds):
+        self.level_names = [level['name'] for level in levels]
+        self._level_colors = [level['color'] for level in levels]
+        if DEFAULT_LABEL not in thresholds:
+            raise ValueError(f"Configuração de diagnóstico sem a classe '{DEFAULT_LABEL}'.")
+
+        # Linha 0 é a classe padrão; as demais seguem a ordem do arquivo
+        labels = [DEFAULT_LABEL] + [label for label in thresholds if label != DEFAULT_LABEL]
+        self._label_rows = {label: row for row, label in enumerate(labels)}
+        self._thresholds = np.array([thresholds[label] for label in labels], dtype=np.float64)
+        if self._thresholds.shape[1] != len(levels) - 1:
+            raise ValueError("Cada classe precisa de um limite para cada nível acima do primeiro.")
+        if np.any(np.diff(self._thresholds, axis=1) < 0):
+            raise ValueError("Os limites de ΔT de cada classe devem ser crescentes.")
+        self._colors = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['levels'], config['thresholds'])
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def from_file(path):
+        """Loads and compiles a thresholds file; cached per path for the life of the process."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return DiagnosisEngine.from_config(json.load(f))
+
+    def label_rows(self, labels):
+        """Row of the thresholds matrix for each label (unknown labels use 'default')."""
+        labels = np.asarray(labels)
+        rows = np.zeros(labels.shape, dtype=np.intp)
+        # Uma comparação vetorizada por classe configurada (são poucas), em vez de
+        # ordenar ou consultar um dicionário para cada leitura
+        for label, row in self._label_rows.items():
+            if row:
+                rows[labels == label] = row
+        return rows
+
+    def classify(self, labels, delta_t):
+        """
+        Classifies arrays of labels and ΔT values in one vectorized call.
+
+        Args:
+            labels (array-like): Component labels (str), shape (n,).
+            delta_t (array-like): ΔT values (°C), shape (n,). NaN gives level 0.
+
+        Returns:
+            np.ndarray: Level index (int8) of each reading, from 0 (least severe).
+        """
+        delta_t = np.asarray(delta_t, dtype=np.float64)
+        thresholds = self._thresholds[self.label_rows(labels)]
+        return (delta_t[..., np.newaxis] >= thresholds).sum(axis=-1).astype(np.int8)
+
+    def level_texts(self, levels):
+        """Diagnosis text of each level index."""
+        return np.asarray(self.level_names, dtype=object)[levels]
+
+    @property
+    def level_colors(self):
+        """ReportLab colour of each level, resolved on first use."""
+        if self._colors is None:
+            # Importado aqui para que a classificação em lote não dependa do ReportLab
+            from reportlab.lib import colors
+            self._colors = [getattr(colors, color) if isinstance(color, str) else colors.Color(*color)
+                            for color in self._level_colors]
+        return self._colors
+
+    def diagnose(self, label, delta_t):
+        """Diagnosis of a single component: (text, ReportLab colour)."""
+        thresholds = self._thresholds[self._label_rows.get(label, 0)]
+        level = int(np.count_nonzero(delta_t >= thresholds))
+        return self.level_names[level], self.level_colors[level]
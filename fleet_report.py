@@ -0,0 +1,218 @@
+# fleet_report.py
+"""
+Relatório consolidado da frota a partir do banco de resultados (results_store.py).
+
+Os componentes gravados são lidos em blocos e agregados de forma vetorizada
+(NumPy): contagens por nível de diagnóstico, por tipo de componente, por
+alimentador e por agência regional, além dos piores componentes (maior ΔT).
+A memória depende do tamanho do bloco e do número de grupos, não do número
+de componentes no banco.
+
+O diagnóstico é recalculado com os limites atuais (diagnosis_thresholds.json,
+os mesmos de get_diagnosis_by_component), a partir do rótulo e do ΔT gravados.
+
+Exemplo (relatório semanal):
+    python fleet_report.py inspection_results.db --days 7 --output relatorio_frota.pdf
+"""
+import argparse
+import heapq
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from get_utils import get_diagnosis_thresholds_path, get_label_translation
+
+# Colunas lidas do banco, na ordem usada por `FleetSummary.add_chunk`
+FLEET_COLUMNS = ('c.label', 'c.delta_t', 'r.feeder', 'r.agency_region', 'r.form_number',
+                 'r.equipment', 'r.inspected_at', 'c.component_id', 'c.temp_max')
+
+UNKNOWN_GROUP = '(não informado)'
+
+
+class FleetSummary:
+    """
+    Accumulates fleet-wide counts per diagnosis level, chunk by chunk.
+
+    Args:
+        engine (DiagnosisEngine): Engine used to classify (label, ΔT) readings.
+        top_k (int): Number of worst components (highest ΔT) to keep.
+    """
+    GROUPS = ('label', 'feeder', 'agency_region')
+
+    def __init__(self, engine, top_k=20):
+        self.engine = engine
+        self.n_levels = len(engine.level_names)
+        self.top_k = top_k
+        self.level_counts = np.zeros(self.n_levels, dtype=np.int64)
+        self.group_counts = {group: {} for group in self.GROUPS}
+        # Min-heap de (ΔT, sequência, linha): o topo é o menos grave dos K guardados
+        self._worst = []
+        self._sequence = 0
+        self.total_components = 0
+
+    def add_chunk(self, rows):
+        """Adds a chunk of rows in `FLEET_COLUMNS` order."""
+        columns = list(zip(*rows))
+        labels = np.array(columns[0], dtype=object)
+        delta_t = np.array([np.nan if v is None else v for v in columns[1]], dtype=np.float64)
+        levels = self.engine.classify(labels, delta_t)
+
+        self.level_counts += np.bincount(levels, minlength=self.n_levels)
+        for group, values in zip(self.GROUPS, (columns[0], columns[2], columns[3])):
+            self._count_by(group, np.array([UNKNOWN_GROUP if v is None else v for v in values], dtype=object), levels)
+        self._keep_worst(rows, delta_t, levels)
+        self.total_components += len(rows)
+
+    def _count_by(self, group, keys, levels):
+        # Um group-by por bloco: índice de cada chave distinta x nível -> contagem
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse * self.n_levels + levels,
+                             minlength=len(unique_keys) * self.n_levels).reshape(-1, self.n_levels)
+        totals = self.group_counts[group]
+        for key, row in zip(unique_keys, counts):
+            if key in totals:
+                totals[key] += row
+            else:
+                totals[key] = row.copy()
+
+    def _keep_worst(self, rows, delta_t, levels):
+        valid = np.flatnonzero(~np.isnan(delta_t))
+        if not valid.size or not self.top_k:
+            return
+        # Só os K maiores do bloco disputam o heap
+        if valid.size > self.top_k:
+            valid = valid[np.argpartition(delta_t[valid], -self.top_k)[-self.top_k:]]
+        for i in valid:
+            item = (float(delta_t[i]), self._sequence, rows[i] + (int(levels[i]),))
+            self._sequence += 1
+            if len(self._worst) < self.top_k:
+                heapq.heappush(self._worst, item)
+            elif item[0] > self._worst[0][0]:
+                heapq.heapreplace(self._worst, item)
+
+    def worst(self):
+        """Worst components, highest ΔT first: rows in `FLEET_COLUMNS` order plus the level index."""
+        return [row for _, _, row in sorted(self._worst, key=lambda item: (-item[0], item[1]))]
+
+    def group_table(self, group):
+        """(key, counts per level) of a group, most severe first."""
+        items = self.group_counts[group].items()
+        # Ordena pelos níveis mais graves primeiro e, no empate, pelo total
+        return sorted(items, key=lambda item: (tuple(-item[1][::-1]), -item[1].sum(), str(item[0])))
+
+
+def summarize(store, since=None, until=None, top_k=20, chunk_size=50000, engine=None):
+    """
+    Aggregates every stored component of the period.
+
+    Returns:
+        FleetSummary: The accumulated counts and worst components.
+    """
+    if engine is None:
+        from diagnosis import DiagnosisEngine
+        engine = DiagnosisEngine.from_file(get_diagnosis_thresholds_path())
+    summary = FleetSummary(engine, top_k=top_k)
+    for rows in store.iter_component_chunks(FLEET_COLUMNS, chunk_size=chunk_size, since=since, until=until):
+        summary.add_chunk(rows)
+    return summary
+
+
+def build_fleet_pdf(summary, output_pdf_path, n_inspections, since=None, until=None):
+    """Renders the fleet summary PDF (totals, group-by tables and worst components)."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    level_names = summary.engine.level_names
+    level_colors = summary.engine.level_colors
+    label_translation = get_label_translation()
+    header_style = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+    ]
+    header_cell = styles['Normal'].clone('FleetHeader', fontName='Helvetica-Bold', fontSize=8, leading=10)
+
+    def level_header(first_column):
+        return [first_column] + [Paragraph(name, header_cell) for name in level_names] + ['Total']
+
+    def group_section(title, group, first_column, translate=None):
+        rows = [level_header(first_column)]
+        for key, counts in summary.group_table(group):
+            rows.append([translate(key) if translate else key] + [int(c) for c in counts] + [int(counts.sum())])
+        return [Paragraph(title, styles['h2']), Table(rows, repeatRows=1, style=TableStyle(header_style)),
+                Spacer(1, 6 * mm)]
+
+    period = "Todo o período"
+    if since or until:
+        period = f"{since or '...'} a {until or '...'}"
+
+    story = [
+        Paragraph("Relatório Consolidado de Inspeções Termográficas", styles['Title']),
+        Paragraph(f"Período: {period} &nbsp;&nbsp; Gerado em: {datetime.now():%d/%m/%Y %H:%M}", styles['Normal']),
+        Spacer(1, 6 * mm),
+        Paragraph("Resumo por diagnóstico", styles['h2']),
+    ]
+    totals = [['Inspeções', n_inspections], ['Componentes analisados', summary.total_components]]
+    totals += [[name, int(count)] for name, count in zip(level_names, summary.level_counts)]
+    totals_style = TableStyle(header_style[:1] + [('FONTSIZE', (0, 0), (-1, -1), 9), ('ALIGN', (1, 0), (1, -1), 'CENTER')]
+                              + [('BACKGROUND', (1, 2 + level), (1, 2 + level), color)
+                                 for level, color in enumerate(level_colors)])
+    story += [Table(totals, colWidths=[70 * mm, 40 * mm], style=totals_style), Spacer(1, 6 * mm)]
+
+    story += group_section("Por tipo de componente", 'label', 'Componente',
+                           translate=lambda label: label_translation.get(label, label))
+    story += group_section("Por alimentador", 'feeder', 'Alimentador')
+    story += group_section("Por agência regional", 'agency_region', 'Agência regional')
+
+    worst = summary.worst()
+    if worst:
+        rows = [['Nota', 'Equipamento', 'Alimentador', 'Componente', 'ΔT (°C)', 'Diagnóstico']]
+        worst_style = list(header_style)
+        for i, (label, delta_t, feeder, _, form_number, equipment, _, component_id, _, level) in enumerate(worst, start=1):
+            rows.append([form_number, equipment, feeder or UNKNOWN_GROUP,
+                         f"{component_id}. {label_translation.get(label, label)}", f"{delta_t:.1f}",
+                         Paragraph(level_names[level], styles['Normal'])])
+            worst_style.append(('BACKGROUND', (5, i), (5, i), level_colors[level]))
+        story += [Paragraph(f"Componentes mais críticos (maior ΔT, {len(worst)} primeiros)", styles['h2']),
+                  Table(rows, repeatRows=1, colWidths=[38 * mm, 30 * mm, 25 * mm, 40 * mm, 15 * mm, 32 * mm],
+                        style=TableStyle(worst_style))]
+
+    SimpleDocTemplate(output_pdf_path, pagesize=A4).build(story)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório consolidado da frota a partir do banco de resultados.")
+    parser.add_argument('database', help="Arquivo SQLite do banco de resultados (results_store.py).")
+    parser.add_argument('--output', default='relatorio_frota.pdf', help="PDF de saída.")
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument('--days', type=int, help="Apenas as inspeções dos últimos N dias (ex.: 7).")
+    period.add_argument('--since', help="Apenas inspeções a partir desta data (ISO, ex.: 2024-03-01).")
+    parser.add_argument('--until', help="Apenas inspeções anteriores a esta data (ISO).")
+    parser.add_argument('--top', type=int, default=20, help="Número de componentes mais críticos listados.")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Componentes lidos por bloco.")
+    args = parser.parse_args(argv)
+
+    from results_store import ResultsStore
+
+    since = args.since
+    if args.days:
+        since = (datetime.now() - timedelta(days=args.days)).date().isoformat()
+
+    with ResultsStore(args.database) as store:
+        n_inspections = store.count_reports(since=since, until=args.until)
+        summary = summarize(store, since=since, until=args.until, top_k=args.top, chunk_size=args.chunk_size)
+    build_fleet_pdf(summary, args.output, n_inspections, since=since, until=args.until)
+    print(f"{n_inspections} inspeções, {summary.total_components} componentes. Relatório: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
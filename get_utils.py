@@ -1,6 +1,6 @@
 # get_utils.py
+import os
 from datetime import datetime
-from reportlab.lib import colors
 
 # --- Data Structures ---
 class GPS:
@@ -39,8 +39,35 @@ def get_thermal_image_path(): return IMG_FOLDER + "Img_Termica.jpg"
 def get_timestamp(): return datetime.now()
 def get_temp_max_equipment_value(): return "Isolador"
 def get_pickle_path(): return 'pickle_resultado_inferencia.pkl'
+# Inspeções com vários pares: lista de {'visual_image_path', 'thermal_image_path', 'pickle_path'[, 'frame']}.
+# None usa o par único acima.
+def get_image_pairs(): return None
+def get_pair_workers(): return None # threads de preparação dos pares, e pares preparados à frente (None = 2, até o nº de CPUs)
+# Threads de preparação dos componentes de cada par (None = nº de CPUs / pair_workers,
+# para o total de threads não passar do nº de CPUs)
+def get_component_workers(): return None
 def get_gps(): return GPS(-27.59, -48.54) # Florianópolis
 def get_environmental_conditions(): return {'hr': 0.65, 'env_temp': 25}
+def get_thermal_calibration():
+    # Paleta da câmera térmica (do mais frio ao mais quente) e a faixa de temperatura da escala
+    return {'palette': 'jet', 'temp_min': 15.0, 'temp_max': 65.0}
+# Registro térmico -> visual do conjunto de câmeras: None (apenas redimensiona), um dict com
+# 'homography', 'thermal_size' e 'visual_size' ou o JSON gerado por `python registration.py calibrate`
+def get_thermal_registration(): return None
+def get_registration_cache_dir(): return '.registration_cache' # tabelas de remapeamento pré-calculadas
+# Codificação das imagens por papel ('scene', 'crop', 'thermal_crop', 'summary'), sobrepondo
+# image_utils.DEFAULT_IMAGE_ENCODING. Ex.: {'scene': {'jpeg_quality': 75}, 'summary': {'format': 'jpeg'}}
+def get_image_encoding(): return None
+def get_print_dpi(): return 200 # resolução de impressão das imagens incorporadas; None = resolução original
+def get_max_pdf_size_mb(): return None # limite de tamanho do PDF; None = sem limite
+def get_streaming_build(): return True # páginas de componentes geradas e liberadas uma a uma durante o doc.build
+# Cache de relatórios já gerados (report_cache.py); None desativa
+def get_report_cache_dir(): return None
+def get_report_cache_max_mb(): return 2048
+def get_report_cache_max_entries(): return None
+def get_results_db_path(): return 'inspection_results.db' # resultados por componente (results_store.py); None desativa
+def get_metrics_json_path(): return 'report_metrics.jsonl' # um registro JSON por relatório; None desativa
+def get_metrics_prometheus_path(): return None # ex.: '/var/lib/node_exporter/textfile/celesc_report.prom'
 def get_label_translation():
     return {
         "transformer" : "Transformador", "vertical-insulator" : "Isolador vertical",
@@ -48,29 +75,15 @@ def get_label_translation():
         "overhead-switch" : "Chave faca", "connector" : "Conector", 'person': 'Pessoa'
     }
 
+def get_diagnosis_thresholds_path(): return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diagnosis_thresholds.json')
 def get_diagnosis_by_component(component_label, delta_t):
     """
     Determina o diagnóstico e a cor com base no tipo de componente e no delta_t.
     Retorna uma tupla (texto_do_diagnostico, cor_reportlab).
-    """
-    # Thresholds de Delta T em Celsius para cada diagnóstico: (Programada, Imediata, Urgente)
-    thresholds = {
-        "connector":              (20, 40, 60),
-        "fuse-cutout":            (15, 30, 50),
-        "overhead-switch":        (15, 35, 55),
-        "transformer":            (25, 50, 75),
-        "vertical-insulator":     (10, 20, 40),
-        "horizontal-insulator":   (10, 20, 40),
-        "default":                (10, 30, 60)
-    }
-    
-    prog_thresh, imed_thresh, urg_thresh = thresholds.get(component_label, thresholds["default"])
 
-    if delta_t >= urg_thresh:
-        return "Manutenção Urgente", colors.Color(0.8, 0, 0)
-    elif delta_t >= imed_thresh:
-        return "Manutenção Imediata", colors.red
-    elif delta_t >= prog_thresh:
-        return "Manutenção Programada", colors.orange
-    else:
-        return "Sem Manutenção", colors.lightgreen
\ No newline at end of file
+    Os limites de ΔT por classe vêm de get_diagnosis_thresholds_path() e são
+    carregados uma única vez (ver diagnosis.py, que também classifica arrays).
+    """
+    # Importado aqui para que os getters de metadados não carreguem o NumPy
+    from diagnosis import DiagnosisEngine
+    return DiagnosisEngine.from_file(get_diagnosis_thresholds_path()).diagnose(component_label, delta_t)
@@ -0,0 +1,257 @@
+# image_utils.py
+"""
+Helpers to hand NumPy images to ReportLab without going through temporary files,
+and the per-role image encoding settings of the report.
+"""
+import io
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+from reportlab import rl_config
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Image
+
+# Fluxos binários no PDF: o padrão do ReportLab (ASCII85) aumenta cada imagem em
+# 25% e, sem a extensão rl_accel, é codificado em Python puro (a etapa mais lenta)
+rl_config.useA85 = 0
+
+# Codificação padrão de cada papel de imagem no relatório:
+#   scene        cena anotada (repetida, mas incorporada uma vez, em cada página de componente)
+#   crop         recorte visual de cada componente
+#   thermal_crop recorte térmico de cada componente
+#   summary      fotos originais da página de resumo
+# ('original' incorpora o arquivo como está; na cena, a imagem crua, sem perdas.
+# Nas fotos do resumo, arquivos maiores que o necessário para 'print_dpi' são
+# decodificados em resolução reduzida e recodificados em JPEG com 'jpeg_quality')
+# Opções: 'format' ('jpeg', 'png' ou 'original'), 'jpeg_quality' (0-100),
+# 'png_compression' (0-9), 'grayscale' (True, False ou 'auto': só quando a imagem
+# já é cinza) e 'scale' (fator de redução antes de codificar).
+# O ReportLab incorpora JPEG sem recodificar; PNG é decodificado e recomprimido com
+# Flate, então 'png_compression' só afeta o tempo e a memória intermediária.
+DEFAULT_IMAGE_ENCODING = {
+    'scene': {'format': 'jpeg', 'jpeg_quality': 85},
+    'crop': {'format': 'png', 'png_compression': 1},
+    'thermal_crop': {'format': 'png', 'png_compression': 1, 'grayscale': 'auto'},
+    'summary': {'format': 'original', 'jpeg_quality': 90},
+}
+
+# Degraus do modo de tamanho máximo do PDF, do mais leve ao mais agressivo:
+# (qualidade JPEG de todos os papéis, redução da cena e das fotos do resumo)
+SIZE_BUDGET_LADDER = ((80, 1.0), (65, 1.0), (50, 0.75), (40, 0.5), (30, 0.35))
+
+# Reduções que o decodificador JPEG faz diretamente no domínio DCT (os demais
+# formatos são decodificados inteiros e reduzidos pelo OpenCV)
+_REDUCED_READ_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                       (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+_encoder_pool = None
+_encoder_pool_lock = threading.Lock()
+
+
+def encode_image(image, ext='.png', params=None):
+    """
+    Encodes a BGR NumPy image in memory.
+
+    Args:
+        image (np.ndarray): Image in OpenCV (BGR) layout.
+        ext (str): Target format extension understood by `cv2.imencode`.
+        params (list): Optional `cv2.imencode` flags (e.g. JPEG quality).
+
+    Returns:
+        bytes: The encoded image.
+    """
+    ok, buffer = cv2.imencode(ext, image, params or [])
+    if not ok:
+        raise ValueError(f"Não foi possível codificar a imagem como {ext}")
+    return buffer.tobytes()
+
+
+def resolve_image_encoding(overrides=None):
+    """
+    Merges per-role overrides (e.g. report_data['image_encoding']) into
+    `DEFAULT_IMAGE_ENCODING`.
+    """
+    encoding = {role: dict(settings) for role, settings in DEFAULT_IMAGE_ENCODING.items()}
+    for role, settings in (overrides or {}).items():
+        if role not in encoding:
+            raise ValueError(f"Papel de imagem desconhecido: {role}")
+        encoding[role].update(settings)
+    return encoding
+
+
+def display_pixels(width, height, dpi):
+    """Pixel size (width, height) needed to print a `width` x `height` points box at `dpi`."""
+    return (max(1, int(math.ceil(width / 72.0 * dpi))),
+            max(1, int(math.ceil(height / 72.0 * dpi))))
+
+
+# Orientações EXIF (tag 0x0112) que giram a imagem em 90°: largura e altura trocam
+_EXIF_ORIENTATION = 0x0112
+_TRANSPOSED_ORIENTATIONS = frozenset((5, 6, 7, 8))
+
+
+def image_file_size(path):
+    """
+    (width, height) of an image file as `cv2.imread` returns it, read from its
+    header only: width and height are swapped when the EXIF orientation rotates
+    the image by 90 degrees.
+    """
+    with PILImage.open(path) as image:
+        width, height = image.size
+        if image.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+            return height, width
+        return width, height
+
+
+def exceeds_display_size(size, max_size):
+    """True if an image of `size` has more pixels than `max_size` needs in both directions."""
+    return max_size is not None and size[0] > max_size[0] and size[1] > max_size[1]
+
+
+def fit_image(image, max_size):
+    """
+    Downscales `image` (never upscales) to the smallest size that still covers
+    `max_size` (width, height) in both directions, keeping the aspect ratio.
+    """
+    if max_size is None:
+        return image
+    h, w = image.shape[:2]
+    scale = max(max_size[0] / w, max_size[1] / h)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def read_image_for_display(path, max_size=None):
+    """
+    Reads an image file decoding only the pixels needed for display.
+
+    When the file is at least 2, 4 or 8 times larger than `max_size` in both
+    directions, it is decoded at that reduced scale (for JPEG, directly in the
+    DCT domain, without decoding the full-resolution image) and then fitted
+    with `fit_image`. Without `max_size` the image is read at full resolution.
+    """
+    if max_size is None:
+        return cv2.imread(path)
+    width, height = image_file_size(path)
+    factor = min(width / max_size[0], height / max_size[1])
+    flag = next((f for reduction, f in _REDUCED_READ_FLAGS if factor >= reduction), cv2.IMREAD_COLOR)
+    image = cv2.imread(path, flag)
+    return None if image is None else fit_image(image, max_size)
+
+
+def budget_image_encoding(step, base=None):
+    """Encoding settings of step `step` of `SIZE_BUDGET_LADDER`, on top of `base`."""
+    quality, scale = SIZE_BUDGET_LADDER[step]
+    encoding = resolve_image_encoding(base)
+    for role, settings in encoding.items():
+        settings.update(format='jpeg', jpeg_quality=min(quality, settings.get('jpeg_quality', 100)))
+        if role in ('scene', 'summary'):
+            settings['scale'] = min(scale, settings.get('scale', 1.0))
+    return encoding
+
+
+def _is_grayscale(image):
+    return image.ndim == 2 or (np.array_equal(image[..., 0], image[..., 1])
+                               and np.array_equal(image[..., 1], image[..., 2]))
+
+
+def encode_for_role(image, settings):
+    """
+    Encodes a BGR image according to the settings of its role (see
+    `DEFAULT_IMAGE_ENCODING`). Returns None for the 'original' format.
+    """
+    if settings.get('format') == 'original':
+        return None
+    scale = settings.get('scale', 1.0)
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    grayscale = settings.get('grayscale', False)
+    if image.ndim == 3 and (grayscale is True or (grayscale == 'auto' and _is_grayscale(image))):
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if settings.get('format') == 'jpeg':
+        return encode_image(image, '.jpg', [cv2.IMWRITE_JPEG_QUALITY, int(settings.get('jpeg_quality', 85))])
+    return encode_image(image, '.png', [cv2.IMWRITE_PNG_COMPRESSION, int(settings.get('png_compression', 1))])
+
+
+def encode_many(images, settings):
+    """
+    Encodes several images in parallel (cv2.imencode releases the GIL).
+
+    Args:
+        images (list): BGR images.
+        settings (list): Role settings for each image.
+
+    Returns:
+        list: Encoded bytes of each image, in order.
+    """
+    global _encoder_pool
+    if len(images) <= 1:
+        return [encode_for_role(image, s) for image, s in zip(images, settings)]
+    with _encoder_pool_lock:
+        if _encoder_pool is None:
+            _encoder_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='encode')
+    return list(_encoder_pool.map(encode_for_role, images, settings))
+
+
+def image_flowable(image, width, height, kind='direct'):
+    """
+    Builds a ReportLab `Image` flowable from a NumPy image or encoded bytes,
+    reading from an in-memory buffer instead of a file on disk.
+    """
+    data = image if isinstance(image, (bytes, bytearray)) else encode_image(image)
+    return Image(io.BytesIO(data), width=width, height=height, kind=kind)
+
+
+def shared_image_reader(image):
+    """
+    Wraps a BGR NumPy image (without encoding) or already encoded bytes in a
+    single ReportLab `ImageReader`. JPEG bytes are embedded as they are.
+
+    The reader is meant to be shared by every `SharedImage` that shows the same picture.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return ImageReader(io.BytesIO(image))
+    return ImageReader(PILImage.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+
+@lru_cache(maxsize=32)
+def file_image_reader(path):
+    """
+    Returns one `ImageReader` per image file, cached for the life of the process.
+
+    Meant for static assets (e.g. the logo) reused by every report.
+    """
+    return ImageReader(path)
+
+
+class SharedImage(Flowable):
+    """
+    Image flowable backed by a shared `ImageReader`.
+
+    ReportLab registers an image XObject the first time the reader is drawn and
+    every later `SharedImage` using the same reader only references it, so a
+    picture repeated on many pages is stored once in the PDF. Sizing follows
+    `reportlab.platypus.Image` (`kind='direct'` or `'proportional'`).
+    """
+    def __init__(self, reader, width, height, kind='direct', hAlign='CENTER'):
+        Flowable.__init__(self)
+        self._reader = reader
+        self.hAlign = hAlign
+        if kind == 'proportional':
+            image_width, image_height = reader.getSize()
+            factor = min(float(width) / image_width, float(height) / image_height)
+            width, height = image_width * factor, image_height * factor
+        self.drawWidth, self.drawHeight = width, height
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self._reader, 0, 0, self.drawWidth, self.drawHeight, mask='auto')
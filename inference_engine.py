@@ -1,7 +1,8 @@
 import os
 import cv2
 import pickle
-from ultralytics import YOLO
+
+from detection_format import Detections, DETECTIONS_EXTENSION
 
 class InferenceEngine:
     """
@@ -14,6 +15,41 @@ class InferenceEngine:
         """
         print("Motor de inferência inicializado. Pronto para carregar resultados.")
 
+    def load_results(self, results_path: str):
+        """
+        Carrega os resultados da inferência, escolhendo o formato pela extensão.
+
+        Arquivos `.cdet` (formato compacto) são abertos sem torch/ultralytics;
+        qualquer outro caminho é tratado como o pickle do Ultralytics.
+
+        Args:
+            results_path (str): Caminho para o arquivo .cdet ou .pkl.
+
+        Returns:
+            list: Lista com os resultados de cada quadro.
+        """
+        if results_path.lower().endswith(DETECTIONS_EXTENSION):
+            return self.load_detections(results_path)
+        return self.load_inference_from_pickle(results_path)
+
+    def load_detections(self, detections_path: str):
+        """
+        Carrega os resultados da inferência de um arquivo no formato compacto (.cdet).
+
+        Args:
+            detections_path (str): Caminho para o arquivo .cdet.
+
+        Returns:
+            list: Lista com um objeto `Detections` (mapeado em memória).
+        """
+        print(f"Carregando detecções compactas de: {detections_path}")
+        if not os.path.exists(detections_path):
+            raise FileNotFoundError(f"Arquivo de detecções não encontrado: {detections_path}")
+
+        results = [Detections.load(detections_path)]
+        print("Detecções carregadas com sucesso.")
+        return results
+
     def load_inference_from_pickle(self, pickle_path: str):
         """
         Carrega os resultados da inferência de um arquivo .pkl.
@@ -36,28 +72,56 @@ class InferenceEngine:
         print("Resultados da inferência carregados com sucesso.")
         return results
 
-    def generate_annotated_image(self, results, save_dir: str, filename="annotated_visual.png") -> str:
+    def render_annotated_image(self, results, visual_img_path=None, max_size=None):
         """
-        Gera e salva a imagem visual com as máscaras e caixas delimitadoras de todos os componentes.
+        Gera a imagem visual com as máscaras e caixas delimitadoras de todos os
+        componentes, sem gravá-la em disco.
 
         Args:
-            results: O objeto de resultado da inferência do YOLO.
-            save_dir (str): O diretório temporário para salvar a imagem.
-            filename (str): O nome do arquivo para a imagem anotada.
+            results: O objeto de resultado da inferência do YOLO (ou `Detections`).
+            visual_img_path (str): Imagem visual original; obrigatória para o
+                formato compacto, que não armazena a imagem.
+            max_size (tuple): (largura, altura) em pixels necessária para exibição.
+                No formato compacto a imagem já é decodificada em resolução
+                reduzida e anotada nesse tamanho; None mantém a resolução original.
 
         Returns:
-            str: O caminho completo para a imagem anotada salva.
+            np.ndarray: A imagem anotada (BGR), ou None se não houver resultados.
         """
         if not results:
             print("Nenhum resultado de inferência para gerar imagem anotada.")
             return None
         
         print("Gerando imagem visual anotada...")
+        # Importado aqui para que importar este módulo não carregue o ReportLab
+        from image_utils import fit_image, read_image_for_display
+        if isinstance(results[0], Detections):
+            if visual_img_path is None:
+                raise ValueError("visual_img_path é obrigatório para resultados no formato compacto.")
+            return results[0].plot(read_image_for_display(visual_img_path, max_size))
         # O método .plot() da Ultralytics retorna a imagem como um array NumPy (BGR)
-        annotated_image_np = results[0].plot()
+        return fit_image(results[0].plot(), max_size)
+
+    def generate_annotated_image(self, results, save_dir: str, filename="annotated_visual.png", visual_img_path=None) -> str:
+        """
+        Gera e salva a imagem visual com as máscaras e caixas delimitadoras de todos os componentes.
+
+        Args:
+            results: O objeto de resultado da inferência do YOLO.
+            save_dir (str): O diretório para salvar a imagem.
+            filename (str): O nome do arquivo para a imagem anotada.
+            visual_img_path (str): Imagem visual original; obrigatória para o
+                formato compacto, que não armazena a imagem.
+
+        Returns:
+            str: O caminho completo para a imagem anotada salva.
+        """
+        annotated_image_np = self.render_annotated_image(results, visual_img_path)
+        if annotated_image_np is None:
+            return None
         
         annotated_image_path = os.path.join(save_dir, filename)
         cv2.imwrite(annotated_image_path, annotated_image_np)
         
         print(f"Imagem anotada salva em: {annotated_image_path}")
-        return annotated_image_path
\ No newline at end of file
+        return annotated_image_path
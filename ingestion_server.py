@@ -0,0 +1,221 @@
+# ingestion_server.py
+"""
+Servidor assíncrono de ingestão de inspeções (substitui Legacy/gera_resultado.py).
+
+Protocolo: cada mensagem é um quadro com prefixo de tamanho -- 8 bytes
+big-endian com o tamanho do payload, seguidos do payload em pickle, um dict com
+as chaves "results" (lista de resultados da YOLO), "visual" e "thermal" (imagens
+BGR) e "timestamp". Um cliente pode enviar vários quadros na mesma conexão e
+recebe, para cada um, um quadro de resposta com um JSON de status.
+
+Os uploads entram em uma fila limitada; quando ela enche, a leitura do cliente
+é pausada (contrapressão) em vez de acumular memória. A renderização dos
+relatórios roda em um pool de processos, para que o laço de eventos continue
+aceitando novos uploads.
+
+ATENÇÃO: o payload é desserializado com pickle; aceite conexões apenas de
+clientes confiáveis.
+
+Exemplo:
+    python ingestion_server.py --port 6000 --workers 4 --queue-size 16
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import pickle
+import socket
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 6000
+SAVE_DIR = "/app/resultado_final/"
+SAVE_DIR_PDF = "/app/relatorios/"
+
+HEADER = struct.Struct('>Q')
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """Prefixa o payload com o seu tamanho."""
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader, max_payload_bytes):
+    """
+    Lê um quadro completo. Retorna None se o cliente fechou a conexão entre quadros.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    (length,) = HEADER.unpack(header)
+    if length > max_payload_bytes:
+        raise ValueError(f"Payload de {length} bytes excede o limite de {max_payload_bytes} bytes")
+    return await reader.readexactly(length)
+
+
+def process_upload(payload, job_id, save_dir, pdf_dir):
+    """
+    Desserializa um upload e gera o seu relatório (executado no pool de processos).
+
+    Returns:
+        str: Caminho do PDF gerado.
+    """
+    import cv2
+    from detection_format import Detections, DETECTIONS_EXTENSION
+    from Main import build_report_data, render_report
+
+    response = pickle.loads(payload)
+    timestamp = response.get('timestamp', job_id)
+
+    # O pipeline trabalha com caminhos: grava as imagens e as detecções compactas da inspeção
+    job_dir = os.path.join(save_dir, f"inspecao_{timestamp}")
+    os.makedirs(job_dir, exist_ok=True)
+    visual_path = os.path.join(job_dir, "Img_Visual.jpg")
+    thermal_path = os.path.join(job_dir, "Img_Termica.jpg")
+    detections_path = os.path.join(job_dir, f"resultado{DETECTIONS_EXTENSION}")
+    cv2.imwrite(visual_path, response["visual"])
+    cv2.imwrite(thermal_path, response["thermal"])
+    Detections.from_ultralytics(response["results"][0]).save(detections_path)
+
+    report_data = build_report_data()
+    report_data.update({
+        'visual_image_path': visual_path,
+        'thermal_image_path': thermal_path,
+        'pickle_path': detections_path,
+    })
+    output_pdf_path = os.path.join(pdf_dir, f"inspection_report_{timestamp}.pdf")
+    return render_report(report_data, output_pdf_path)
+
+
+class IngestionServer:
+    """
+    Recebe uploads de vários clientes ao mesmo tempo e os renderiza em segundo plano.
+    """
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, save_dir=SAVE_DIR, pdf_dir=SAVE_DIR_PDF,
+                 workers=2, queue_size=16, max_payload_mb=512):
+        self.host = host
+        self.port = port
+        self.save_dir = save_dir
+        self.pdf_dir = pdf_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_payload_bytes = max_payload_mb * 1024 * 1024
+        self._job_ids = itertools.count(1)
+        self._queue = None
+        self._executor = None
+
+    async def serve_forever(self):
+        os.makedirs(self.save_dir, exist_ok=True)
+        os.makedirs(self.pdf_dir, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            self._executor = executor
+            consumers = [asyncio.create_task(self._render_worker()) for _ in range(self.workers)]
+            server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            print(f"Servidor de ingestão ouvindo em {self.host}:{self.port} "
+                  f"({self.workers} processos, fila de {self.queue_size})")
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                for consumer in consumers:
+                    consumer.cancel()
+
+    async def _handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        print(f"Conectado a {addr}")
+        try:
+            while True:
+                payload = await read_frame(reader, self.max_payload_bytes)
+                if payload is None:
+                    break
+                job_id = next(self._job_ids)
+                # Bloqueia este cliente (e só ele) enquanto a fila estiver cheia
+                await self._queue.put((job_id, payload, time.perf_counter()))
+                print(f"Upload {job_id} de {addr} recebido ({len(payload)} bytes), "
+                      f"fila: {self._queue.qsize()}/{self.queue_size}")
+                await self._reply(writer, {'job_id': job_id, 'status': 'queued'})
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            print(f"Conexão com {addr} interrompida no meio de um quadro.")
+        except ValueError as e:
+            print(f"Upload de {addr} rejeitado: {e}")
+            await self._reply(writer, {'status': 'rejected', 'error': str(e)})
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _reply(self, writer, message):
+        writer.write(encode_frame(json.dumps(message).encode('utf-8')))
+        await writer.drain()
+
+    async def _render_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, payload, received_at = await self._queue.get()
+            try:
+                pdf_path = await loop.run_in_executor(
+                    self._executor, process_upload, payload, job_id, self.save_dir, self.pdf_dir
+                )
+                print(f"Relatório do upload {job_id} gerado em {time.perf_counter() - received_at:.1f}s: {pdf_path}")
+            except Exception as e:
+                print(f"Ocorreu um erro inesperado no upload {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+def send_inspection(response, host="127.0.0.1", port=SERVER_PORT):
+    """
+    Envia um upload (dict com "results", "visual", "thermal" e "timestamp") e
+    retorna a resposta do servidor. Cliente síncrono para os drones/scripts.
+    """
+    with socket.create_connection((host, port)) as conn:
+        conn.sendall(encode_frame(pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)))
+        header = _recv_exactly(conn, HEADER.size)
+        (length,) = HEADER.unpack(header)
+        return json.loads(_recv_exactly(conn, length).decode('utf-8'))
+
+
+def _recv_exactly(conn, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Conexão encerrada pelo servidor")
+        received += count
+    return bytes(buffer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor assíncrono de ingestão de inspeções.")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--save-dir', default=SAVE_DIR, help="Diretório para imagens e detecções recebidas.")
+    parser.add_argument('--pdf-dir', default=SAVE_DIR_PDF, help="Diretório dos relatórios gerados.")
+    parser.add_argument('--workers', type=int, default=2, help="Processos de renderização.")
+    parser.add_argument('--queue-size', type=int, default=16, help="Uploads aguardando renderização.")
+    parser.add_argument('--max-payload-mb', type=int, default=512, help="Tamanho máximo de um upload.")
+    args = parser.parse_args(argv)
+
+    server = IngestionServer(args.host, args.port, args.save_dir, args.pdf_dir,
+                             workers=args.workers, queue_size=args.queue_size,
+                             max_payload_mb=args.max_payload_mb)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nExecução interrompida pelo usuário (Ctrl+C).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# inspection_pairs.py
+"""
+Inspeções com vários pares de imagens (visual/térmica), cada um com as suas
+próprias detecções, em um único relatório.
+
+Os próximos pares são preparados em paralelo por um pool de threads (imagem
+anotada, registro térmico e temperaturas; OpenCV e NumPy liberam o GIL)
+enquanto o par atual é montado, e entregues sempre na ordem em que aparecem em
+'image_pairs', de modo que o documento final não depende de qual par termina
+primeiro. Cada par preparado à frente já produz os seus primeiros recortes
+(`PREFETCHED_CROPS`), em paralelo com o par que está sendo montado; os demais
+só são produzidos quando o par é consumido, um componente por vez.
+"""
+import os
+from collections import namedtuple
+from itertools import chain, islice
+
+from metrics import timed, timed_iter
+from parallel_utils import ordered_thread_map, resolve_workers
+
+PAIR_KEYS = ('visual_image_path', 'thermal_image_path', 'pickle_path')
+
+# Padrão de pares preparados ao mesmo tempo (limitado ao nº de CPUs): cada um
+# guarda as imagens da sua cena, então a memória cresce com este número
+PREFETCHED_PAIRS = 2
+# Recortes de cada par produzidos já na preparação, antes de o par ser consumido
+PREFETCHED_CROPS = 16
+
+# 'components' é um iterável de (recortes, predição), em geral produzido sob demanda
+PreparedPair = namedtuple('PreparedPair', ['index', 'pair', 'annotated_image', 'components'])
+
+
+def resolve_image_pairs(report_data):
+    """
+    Returns the list of image pairs of the inspection.
+
+    Each pair is a dict with 'visual_image_path', 'thermal_image_path' and
+    'pickle_path', plus an optional 'frame' (index of the frame inside a
+    multi-frame results file, default 0). Without 'image_pairs', the single
+    pair given by the top-level keys of `report_data` is used.
+    """
+    pairs = report_data.get('image_pairs') or [{key: report_data[key] for key in PAIR_KEYS}]
+    for i, pair in enumerate(pairs, start=1):
+        missing = [key for key in PAIR_KEYS if not pair.get(key)]
+        if missing:
+            raise ValueError(f"Par de imagens {i} sem os campos: {', '.join(missing)}")
+    return pairs
+
+
+def load_pair_results(engine, pairs):
+    """
+    Carrega os resultados de todos os pares, lendo cada arquivo uma única vez
+    mesmo quando vários pares (quadros) o compartilham.
+
+    Returns:
+        dict: {caminho do arquivo de resultados: lista de resultados por quadro}
+    """
+    loaded = {}
+    for pair in pairs:
+        if pair['pickle_path'] not in loaded:
+            loaded[pair['pickle_path']] = engine.load_results(pair['pickle_path'])
+    return loaded
+
+
+def prepare_pair(index, pair, loaded_results, engine, analyzer, metrics=None, encode=True):
+    """
+    Prepara um par: imagem anotada, registro térmico e temperaturas. Os
+    recortes (já codificados) são produzidos ao percorrer `components`.
+    Com `metrics`, os tempos entram nas etapas 'annotate', 'scene',
+    'temperatures' e (com `encode=False`) 'crops'.
+
+    Com `encode=False`, a imagem anotada e os recortes ficam sem codificação e
+    os recortes de todos os componentes são produzidos já aqui (uma lista),
+    para que o par possa ser codificado várias vezes (`encode_prepared_pair`).
+    """
+    frame = pair.get('frame', 0)
+    results = loaded_results[pair['pickle_path']][frame:frame + 1]
+    if not results:
+        raise IndexError(f"Quadro {frame} inexistente em {pair['pickle_path']}")
+
+    with timed(metrics, 'annotate'):
+        annotated_image = engine.render_annotated_image(results, visual_img_path=pair['visual_image_path'],
+                                                        max_size=analyzer.scene_max_size)
+        if encode:
+            annotated_image = analyzer.encode_scene(annotated_image)
+    with timed(metrics, 'scene'):
+        scene = analyzer.load_scene(results, pair['visual_image_path'], pair['thermal_image_path'], metrics)
+    if not encode:
+        components = list(timed_iter(metrics, 'crops', analyzer.iter_scene_components(scene)))
+        return PreparedPair(index, pair, annotated_image, components)
+
+    components = analyzer.iter_scene_components(scene, roles=analyzer.crop_roles())
+    # Os primeiros recortes são feitos nesta thread, em paralelo com o par que está sendo montado
+    with timed(metrics, 'crops'):
+        head = list(islice(components, PREFETCHED_CROPS))
+    return PreparedPair(index, pair, annotated_image, chain(head, components))
+
+
+def resolve_pair_workers(workers, n_pairs=None):
+    """Threads de preparação dos pares: `workers` ou `PREFETCHED_PAIRS` (no máximo o nº de CPUs)."""
+    if not workers:
+        workers = min(PREFETCHED_PAIRS, os.cpu_count() or 1)
+    return resolve_workers(workers, n_pairs)
+
+
+def encode_prepared_pair(prepared, analyzer):
+    """
+    Codifica um par preparado com `encode=False` usando o `image_encoding` de
+    `analyzer`, sem refazer o registro, as temperaturas nem os recortes. Os
+    recortes são codificados sob demanda, ao percorrer `components`.
+    """
+    roles = analyzer.crop_roles()
+    components = ordered_thread_map(
+        lambda item: (analyzer.encode_crops(item[0], roles), dict(item[1])), prepared.components,
+        workers=resolve_workers(analyzer.component_workers, len(prepared.components)), thread_name_prefix='component')
+    return prepared._replace(annotated_image=analyzer.encode_scene(prepared.annotated_image), components=components)
+
+
+def iter_prepared_pairs(engine, analyzer, pairs, loaded_results, workers=None, metrics=None, encode=True):
+    """
+    Prepara os pares em um pool de threads e os entrega na ordem original.
+
+    No máximo `workers` pares são preparados à frente do que está sendo
+    consumido, em paralelo entre si e com a montagem do par atual, e cada par
+    guarda apenas as imagens da cena e até `PREFETCHED_CROPS` recortes (os
+    demais são produzidos sob demanda), de modo que a memória não cresce com o
+    número de componentes nem de pares.
+
+    Args:
+        engine (InferenceEngine): Motor usado para gerar as imagens anotadas.
+        analyzer (ComponentAnalyzer): Analisador usado para recortes e temperaturas.
+        pairs (list): Pares retornados por `resolve_image_pairs`.
+        loaded_results (dict): Resultados retornados por `load_pair_results`.
+        workers (int): Threads de preparação, e pares preparados à frente
+            (padrão: `PREFETCHED_PAIRS`, limitado ao nº de CPUs).
+        metrics (StageMetrics): Métricas por etapa do relatório (opcional).
+        encode (bool): Se False, ver `prepare_pair`.
+
+    Returns:
+        iterator: Um `PreparedPair` por vez, na ordem de `pairs`.
+    """
+    workers = resolve_pair_workers(workers, len(pairs))
+    # Com um único par não há o que preparar à frente: o par é preparado na própria thread
+    return ordered_thread_map(lambda item: prepare_pair(*item, loaded_results, engine, analyzer, metrics, encode),
+                              enumerate(pairs), workers=workers, lookahead=workers if len(pairs) > 1 else None,
+                              thread_name_prefix='pair')
@@ -0,0 +1,227 @@
+# metadata_provider.py
+"""
+Metadados de inspeções em lote, no lugar dos get_*() de get_utils.py.
+
+Os registros são lidos uma única vez de um arquivo CSV, JSON Lines ou de uma
+tabela SQLite e indexados pelo número da nota ('form_number') e pelo
+equipamento ('equipment'), de modo que cada consulta é uma busca em dicionário.
+
+Cada registro usa os mesmos nomes de campo do report_data (ex.: 'inspector',
+'situacao_dec', 'visual_image_path'); campos ausentes ou vazios mantêm o valor
+padrão de Main.build_report_data() (em 'environmental_conditions', cada
+chave ausente). Além deles são aceitos (com vírgula ou ponto decimal):
+  * 'gps_lat' / 'gps_lon' (ou 'gps' como {"lat": ..., "lon": ...} ou [lat, lon]);
+  * 'env_temp' / 'hr' (ou 'environmental_conditions' como objeto);
+  * 'timestamp' em ISO 8601;
+  * 'image_pairs' como lista JSON (em CSV / SQLite, texto JSON);
+  * 'job_id', o nome do PDF em batch_report.py (padrão: derivado da nota).
+
+Caminhos relativos são resolvidos a partir do diretório do arquivo de metadados.
+
+Exemplo:
+    provider = MetadataProvider.from_file('inspecoes.csv')
+    report_data = provider.report_data('NOTA Nº 810000068071')
+"""
+import csv
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from get_utils import GPS
+
+PATH_KEYS = ('visual_image_path', 'thermal_image_path', 'pickle_path', 'logo_path')
+JSON_KEYS = ('image_pairs', 'environmental_conditions', 'gps', 'thermal_calibration', 'image_encoding')
+
+CSV_EXTENSIONS = ('.csv',)
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def _read_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        # Planilhas em português costumam usar ';' (a vírgula é o separador decimal)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        return list(csv.DictReader(f, dialect=dialect))
+
+
+def _read_jsonl(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Linha {line_number} de {path} não é um JSON válido: {e}") from e
+    return records
+
+
+def _read_sqlite(path, table):
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table):
+        raise ValueError(f"Nome de tabela inválido: {table}")
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        connection.row_factory = sqlite3.Row
+        return [dict(row) for row in connection.execute(f"SELECT * FROM {table}")]
+    finally:
+        connection.close()
+
+
+def _to_float(value):
+    """Número de um campo de texto, aceitando vírgula decimal ('12,5')."""
+    return float(value.replace(',', '.')) if isinstance(value, str) else float(value)
+
+
+def normalize_record(record, base_dir=None):
+    """
+    Converte um registro bruto (valores de texto do CSV / SQLite ou JSON) nos
+    campos do report_data. Campos vazios são descartados.
+
+    Returns:
+        dict: Campos a sobrepor ao report_data padrão.
+    """
+    fields = {k: v for k, v in record.items() if k and v is not None and v != ''}
+
+    for key in JSON_KEYS:
+        if isinstance(fields.get(key), str):
+            fields[key] = json.loads(fields[key])
+
+    gps = fields.pop('gps', None)
+    lat, lon = fields.pop('gps_lat', None), fields.pop('gps_lon', None)
+    if isinstance(gps, dict):
+        lat, lon = gps.get('lat'), gps.get('lon')
+    elif isinstance(gps, (list, tuple)):
+        lat, lon = gps
+    if lat is not None and lon is not None:
+        fields['gps'] = GPS(_to_float(lat), _to_float(lon))
+
+    env_temp, hr = fields.pop('env_temp', None), fields.pop('hr', None)
+    if env_temp is not None or hr is not None:
+        conditions = dict(fields.get('environmental_conditions') or {})
+        if env_temp is not None:
+            conditions['env_temp'] = _to_float(env_temp)
+        if hr is not None:
+            conditions['hr'] = _to_float(hr)
+        fields['environmental_conditions'] = conditions
+
+    if isinstance(fields.get('timestamp'), str):
+        fields['timestamp'] = datetime.fromisoformat(fields['timestamp'])
+
+    if base_dir:
+        def resolve(path):
+            return path if os.path.isabs(path) else os.path.join(base_dir, path)
+        for key in PATH_KEYS:
+            if isinstance(fields.get(key), str):
+                fields[key] = resolve(fields[key])
+        if fields.get('image_pairs'):
+            fields['image_pairs'] = [
+                {k: resolve(v) if k in PATH_KEYS and isinstance(v, str) else v for k, v in pair.items()}
+                for pair in fields['image_pairs']
+            ]
+    return fields
+
+
+def job_id_for(fields):
+    """Nome do job / PDF de um registro: 'job_id' ou a nota, sem caracteres inválidos em nomes de arquivo."""
+    job_id = str(fields.get('job_id') or fields['form_number'])
+    return re.sub(r'[^\w.-]+', '_', job_id).strip('_')
+
+
+class MetadataProvider:
+    """
+    Registros de inspeção indexados por nota e por equipamento.
+
+    Args:
+        records (list): Registros brutos (dicts com os nomes de campo do report_data).
+        base_dir (str): Diretório base dos caminhos relativos.
+        source (str): Descrição da origem, usada nas mensagens de erro.
+    """
+    def __init__(self, records, base_dir=None, source='metadados'):
+        self.source = source
+        self.records = []
+        self._by_form_number = {}
+        self._by_equipment = {}
+        self._by_job_id = {}
+        for number, record in enumerate(records, start=1):
+            fields = normalize_record(record, base_dir)
+            form_number = fields.get('form_number')
+            if not form_number:
+                raise ValueError(f"Registro {number} de {source} sem 'form_number'")
+            if form_number in self._by_form_number:
+                raise ValueError(f"Nota repetida em {source}: {form_number}")
+            # Notas diferentes podem virar o mesmo nome de arquivo (ex.: 'NOTA 1/2' e 'NOTA 1 2')
+            job_id = job_id_for(fields)
+            if job_id in self._by_job_id:
+                raise ValueError(f"Nome de job repetido em {source}: {job_id} (notas "
+                                 f"{self._by_job_id[job_id]['form_number']} e {form_number}); "
+                                 f"informe 'job_id' distintos")
+            self.records.append(fields)
+            self._by_form_number[form_number] = fields
+            self._by_job_id[job_id] = fields
+            if fields.get('equipment'):
+                self._by_equipment.setdefault(fields['equipment'], []).append(fields)
+
+    @classmethod
+    def from_file(cls, path, table='inspections'):
+        """
+        Loads the records of a CSV (',', ';' or tab separated), JSON Lines or
+        SQLite file (`table` holds one inspection per row), by extension.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension in CSV_EXTENSIONS:
+            records = _read_csv(path)
+        elif extension in JSONL_EXTENSIONS:
+            records = _read_jsonl(path)
+        elif extension in SQLITE_EXTENSIONS:
+            records = _read_sqlite(path, table)
+        else:
+            raise ValueError(f"Formato de metadados não suportado: {extension} "
+                             f"(use {', '.join(CSV_EXTENSIONS + JSONL_EXTENSIONS + SQLITE_EXTENSIONS)})")
+        return cls(records, base_dir=os.path.dirname(os.path.abspath(path)), source=path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __contains__(self, form_number):
+        return form_number in self._by_form_number
+
+    def by_form_number(self, form_number):
+        """Campos da inspeção de nota `form_number`."""
+        try:
+            return self._by_form_number[form_number]
+        except KeyError:
+            raise KeyError(f"Nota {form_number} não encontrada em {self.source}") from None
+
+    def by_job_id(self, job_id):
+        """Campos da inspeção cujo nome de job é `job_id` (ex.: o subdiretório da inspeção), ou None."""
+        return self._by_job_id.get(job_id)
+
+    def by_equipment(self, equipment):
+        """Campos de todas as inspeções do equipamento (lista vazia se nenhuma)."""
+        return list(self._by_equipment.get(equipment, ()))
+
+    def report_data(self, form_number, defaults=None):
+        """report_data da inspeção: `defaults` (padrão: Main.build_report_data()) com os campos do registro."""
+        from Main import apply_overrides, build_report_data
+
+        fields = self.by_form_number(form_number)
+        if defaults is None:
+            defaults = build_report_data()
+        return apply_overrides(defaults, {k: v for k, v in fields.items() if k != 'job_id'})
+
+    def jobs(self):
+        """Jobs de batch_report.py ({'job_id', 'overrides'}), um por registro, na ordem do arquivo."""
+        return [{'job_id': job_id_for(fields), 'overrides': {k: v for k, v in fields.items() if k != 'job_id'}}
+                for fields in self.records]
@@ -0,0 +1,267 @@
+# metrics.py
+"""
+Métricas por etapa da geração de relatórios (tempo de parede, tempo de CPU e
+pico de memória), exportadas como um registro JSON por relatório (JSON Lines) e,
+opcionalmente, como um arquivo do textfile collector do Prometheus.
+"""
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Limites (segundos) dos buckets do histograma de duração por etapa no Prometheus
+PROMETHEUS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_CLEAR_REFS = '/proc/self/clear_refs'
+_STATUS = '/proc/self/status'
+
+# Seções medidas em andamento em cada thread, para descontar as aninhadas
+_active = threading.local()
+
+# Histogramas do Prometheus: métrica -> (nome, descrição)
+PROMETHEUS_HISTOGRAMS = {
+    'wall_s': ('celesc_report_stage_wall_seconds', "Tempo de parede por etapa do relatório."),
+    'cpu_s': ('celesc_report_stage_cpu_seconds', "Tempo de CPU por etapa do relatório."),
+}
+_METRIC_BY_NAME = {name: metric for metric, (name, _) in PROMETHEUS_HISTOGRAMS.items()}
+_SAMPLE_RE = re.compile(r'^(?P<name>\w+)_(?P<kind>bucket|sum|count)\{stage="(?P<stage>[^"]*)"'
+                        r'(?:,le="(?P<le>[^"]*)")?\} (?P<value>\S+)$')
+
+# Serializa as threads do processo (o único lock disponível sem fcntl)
+_histograms_lock = threading.Lock()
+
+
+def _reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux). Retorna False se não for suportado."""
+    try:
+        with open(_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes():
+    """Pico de RSS do processo desde o último reset (Linux) ou desde o início."""
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class StageMetrics:
+    """
+    Coleta as métricas de cada etapa de um relatório.
+
+    O tempo de uma seção não inclui o das seções medidas dentro dela na mesma
+    thread: o trabalho feito sob demanda durante o doc.build conta em 'crops'
+    (recortes) e 'pages' (páginas dos componentes), não em 'pdf_build'. Seções
+    de threads de preparação podem se sobrepor às da thread principal; o tempo
+    de CPU de cada seção é o da thread que a executou, e os totais são os do
+    processo desde a criação do objeto.
+
+    Uso:
+        metrics = StageMetrics(report_id)
+        with metrics.stage('load'):
+            ...
+        crops = metrics.timed_iter('crops', crops)
+        metrics.write_json('report_metrics.jsonl')
+    """
+    def __init__(self, report_id):
+        self.report_id = report_id
+        self.started_at = datetime.now()
+        self.stages = {}
+        self.info = {}
+        self._peak_resettable = None
+        self._lock = threading.Lock()
+        self._wall_start, self._cpu_start = time.perf_counter(), time.process_time()
+
+    @contextmanager
+    def stage(self, name):
+        """Mede uma etapa de nível superior, com o pico de memória zerado no início."""
+        if self._peak_resettable is None or self._peak_resettable:
+            self._peak_resettable = _reset_peak_rss()
+        with self.timed(name):
+            yield
+
+    @contextmanager
+    def timed(self, name):
+        """Mede uma seção (em qualquer thread), acumulando-a na etapa `name`."""
+        stack = getattr(_active, 'stack', None)
+        if stack is None:
+            stack = _active.stack = []
+        # [tempo de parede, tempo de CPU] das seções aninhadas, descontados ao final
+        nested = [0.0, 0.0]
+        stack.append(nested)
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            with self._lock:
+                # Uma etapa repetida no mesmo relatório (ex.: nova tentativa) acumula os tempos
+                previous = self.stages.get(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_bytes': 0})
+                self.stages[name] = {
+                    'wall_s': previous['wall_s'] + wall - nested[0],
+                    'cpu_s': previous['cpu_s'] + cpu - nested[1],
+                    # Sem reset (fora do Linux) é o pico do processo até aqui, não só da etapa
+                    'peak_rss_bytes': max(previous['peak_rss_bytes'], _peak_rss_bytes()),
+                }
+
+    def timed_iter(self, name, iterable):
+        """Percorre `iterable` medindo cada item obtido na etapa `name` (para geradores sob demanda)."""
+        iterator = iter(iterable)
+        while True:
+            with self.timed(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_record(self):
+        return {
+            'report_id': self.report_id,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'peak_rss_per_stage': bool(self._peak_resettable),
+            'stages': self.stages,
+            'total_wall_s': time.perf_counter() - self._wall_start,
+            'total_cpu_s': time.process_time() - self._cpu_start,
+            **self.info,
+        }
+
+    def write_json(self, path):
+        """Acrescenta o registro deste relatório a um arquivo JSON Lines."""
+        line = json.dumps(self.as_record(), ensure_ascii=False) + '\n'
+        # Uma única escrita em modo append, para que processos concorrentes não intercalem linhas
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def write_prometheus(self, path):
+        """
+        Acrescenta as métricas deste relatório aos histogramas do arquivo do
+        textfile collector do Prometheus e o regrava de forma atômica.
+
+        Processos concorrentes (ex.: um lote) usam o mesmo arquivo: a leitura,
+        a soma e a regravação são feitas sob um lock ('<arquivo>.lock').
+        """
+        with _histograms_lock, _file_lock(path + '.lock'):
+            histograms = _parse_prometheus(path)
+            for stage, values in self.stages.items():
+                for metric in ('wall_s', 'cpu_s'):
+                    _observe(histograms, stage, metric, values[metric])
+            text = _render_prometheus(histograms, self.stages)
+
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+
+def timed(metrics, name):
+    """`metrics.timed(name)`, ou um contexto vazio sem métricas."""
+    return metrics.timed(name) if metrics is not None else nullcontext()
+
+
+def timed_iter(metrics, name, iterable):
+    """`metrics.timed_iter(name, iterable)`, ou o próprio `iterable` sem métricas."""
+    return metrics.timed_iter(name, iterable) if metrics is not None else iterable
+
+
+@contextmanager
+def _file_lock(path):
+    """Lock exclusivo entre processos (fcntl); sem fcntl (Windows), apenas entre threads."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _parse_prometheus(path):
+    """Histogramas de um arquivo gravado por `_render_prometheus` ({} se não existir)."""
+    histograms = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return histograms
+    bucket_index = {f'{bound:g}': i for i, bound in enumerate(PROMETHEUS_BUCKETS)}
+    for line in lines:
+        match = _SAMPLE_RE.match(line)
+        if match is None or match['name'] not in _METRIC_BY_NAME:
+            continue
+        histogram = _new_histogram(histograms, match['stage'], _METRIC_BY_NAME[match['name']])
+        if match['kind'] == 'sum':
+            histogram['sum'] = float(match['value'])
+        elif match['kind'] == 'count':
+            histogram['count'] = int(match['value'])
+        elif match['le'] in bucket_index:
+            histogram['buckets'][bucket_index[match['le']]] = int(match['value'])
+    return histograms
+
+
+def _new_histogram(histograms, stage, metric):
+    return histograms.setdefault((stage, metric), {
+        'buckets': [0] * len(PROMETHEUS_BUCKETS), 'sum': 0.0, 'count': 0,
+    })
+
+
+def _observe(histograms, stage, metric, value):
+    histogram = _new_histogram(histograms, stage, metric)
+    for i, bound in enumerate(PROMETHEUS_BUCKETS):
+        if value <= bound:
+            histogram['buckets'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+def _render_prometheus(histograms, last_stages):
+    lines = []
+    for metric, (name, help_text) in PROMETHEUS_HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (stage, hist_metric), histogram in sorted(histograms.items()):
+            if hist_metric != metric:
+                continue
+            for bound, count in zip(PROMETHEUS_BUCKETS, histogram['buckets']):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+
+    name = 'celesc_report_stage_peak_rss_bytes'
+    lines += [f"# HELP {name} Pico de memória (RSS) da etapa no último relatório.", f"# TYPE {name} gauge"]
+    for stage, values in last_stages.items():
+        lines.append(f'{name}{{stage="{stage}"}} {values["peak_rss_bytes"]}')
+    return '\n'.join(lines) + '\n'
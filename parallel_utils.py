@@ -0,0 +1,78 @@
+# parallel_utils.py
+"""
+Execução em pool de threads com os resultados entregues na ordem de entrada.
+
+Usado onde o trabalho é feito em OpenCV / NumPy (que liberam o GIL) e o
+documento final precisa ser o mesmo qualquer que seja a tarefa que termine
+primeiro.
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def resolve_workers(workers, n_items=None):
+    """Número de threads: `workers` (padrão: nº de CPUs), limitado a `n_items`."""
+    workers = workers or os.cpu_count() or 1
+    if n_items is not None:
+        workers = min(workers, n_items)
+    return max(1, workers)
+
+
+def nested_workers(outer, inner=None):
+    """
+    Threads de um pool usado dentro de cada uma de `outer` threads (ou
+    processos): `inner` se informado ou, por padrão, a parcela das CPUs de
+    cada uma, para o total não passar do nº de CPUs.
+    """
+    if inner:
+        return inner
+    return max(1, (os.cpu_count() or 1) // (outer or 1))
+
+
+def ordered_thread_map(fn, items, workers=None, lookahead=None, thread_name_prefix=''):
+    """
+    Aplica `fn` a cada item em um pool de threads e entrega os resultados na
+    ordem de `items`.
+
+    No máximo `lookahead` itens (padrão: `workers`) são processados à frente do
+    que está sendo consumido, o que limita a memória a alguns resultados por
+    vez. Com uma única thread e sem `lookahead`, `fn` é chamada diretamente,
+    sem pool; com `lookahead`, essa thread prepara os próximos itens enquanto
+    o atual é consumido.
+
+    Args:
+        fn (callable): Função aplicada a cada item.
+        items (iterable): Itens de entrada (consumidos sob demanda).
+        workers (int): Threads do pool (padrão: nº de CPUs).
+        lookahead (int): Itens em processamento à frente do consumidor.
+        thread_name_prefix (str): Prefixo do nome das threads.
+
+    Yields:
+        O resultado de `fn` para cada item, na ordem original.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1 and lookahead is None:
+        for item in items:
+            yield fn(item)
+        return
+
+    pending_items = iter(items)
+    futures = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix) as executor:
+        def submit_next():
+            for item in pending_items:
+                futures.append(executor.submit(fn, item))
+                return
+
+        for _ in range(max(lookahead or workers, 1)):
+            submit_next()
+        try:
+            while futures:
+                result = futures.popleft().result()
+                submit_next()
+                yield result
+        finally:
+            # Consumidor interrompido (erro ou gerador fechado): não inicia os itens restantes
+            for future in futures:
+                future.cancel()
@@ -1,154 +1,319 @@
 # part_analysis.py
-import os
+from collections import namedtuple
+from functools import lru_cache
+
 import cv2
-import random
 import numpy as np
-from datetime import datetime
-from ultralytics import YOLO
-from reportlab.platypus import Paragraph, Table, TableStyle, Image, Spacer, PageBreak
+from reportlab.platypus import Paragraph, Table, TableStyle, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import mm, inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.enums import TA_LEFT
+
+from detection_format import as_detections
+from thermal_analysis import ThermalCalibration, component_temperature_stats
+from image_utils import (
+    SharedImage, display_pixels, encode_for_role, image_flowable, resolve_image_encoding, shared_image_reader,
+)
+from inspection_pairs import PreparedPair, resolve_pair_workers
+from metrics import timed, timed_iter
+from parallel_utils import nested_workers, ordered_thread_map, resolve_workers
+from registration import RigRegistration
+from results_store import component_record
+from streaming_doc import LazyFlowables
+
+
+@lru_cache(maxsize=None)
+def _get_styles():
+    """Stylesheet with the component page styles, built once per process."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='BoldLeft', parent=styles['Normal'], fontName='Helvetica-Bold', alignment=TA_LEFT))
+    styles.add(ParagraphStyle(name='ComponentTitle', parent=styles['h2'], alignment=TA_LEFT))
+    return styles
+
+
+# Trabalho por cena de `ComponentAnalyzer.load_scene`, do qual os recortes são produzidos sob demanda
+ComponentScene = namedtuple('ComponentScene', ['detections', 'boxes_xyxy', 'visual_img', 'thermal_registered',
+                                               'temp_stats'])
+
 
 class ComponentAnalyzer:
     """
     Performs detailed component analysis by processing pre-computed model results,
     and adds the results to a report story.
     """
+    # Tamanho de exibição (pontos) da cena anotada e dos recortes de cada componente
+    SCENE_WIDTH, SCENE_HEIGHT = 170*mm, 127.5*mm
+    CROP_DISPLAY_SIZE = 0.6*inch
+    # Tamanho dos recortes sem 'print_dpi' (resolução original)
+    DEFAULT_CROP_PIXELS = 240
+
     def __init__(self, report_main_data):
         self.main_data = report_main_data
-        self.styles = getSampleStyleSheet()
-        self.styles.add(ParagraphStyle(name='BoldLeft', parent=self.styles['Normal'], fontName='Helvetica-Bold', alignment=TA_LEFT))
-        self.styles.add(ParagraphStyle(name='ComponentTitle', parent=self.styles['h2'], alignment=TA_LEFT))
+        self.styles = _get_styles()
         self.label_translation = report_main_data.get('label_translation', {})
         self.diagnosis_function = report_main_data.get('diagnosis_function')
+        self.thermal_calibration = ThermalCalibration.from_config(report_main_data['thermal_calibration'])
+        self.registration = RigRegistration.from_config(report_main_data.get('thermal_registration'),
+                                                        cache_dir=report_main_data.get('registration_cache_dir'))
+        self.image_encoding = resolve_image_encoding(report_main_data.get('image_encoding'))
+        # Threads que preparam os componentes de uma cena (padrão: nº de CPUs / threads de pares)
+        self.component_workers = nested_workers(resolve_pair_workers(report_main_data.get('pair_workers')),
+                                                report_main_data.get('component_workers'))
+        # Um registro por página de componente gerada (ver results_store.py)
+        self.component_records = []
+        # Pixels realmente necessários para imprimir a cena e os recortes em 'print_dpi'
+        dpi = report_main_data.get('print_dpi')
+        self.scene_max_size = display_pixels(self.SCENE_WIDTH, self.SCENE_HEIGHT, dpi) if dpi else None
+        self.crop_size = (display_pixels(self.CROP_DISPLAY_SIZE, self.CROP_DISPLAY_SIZE, dpi) if dpi
+                          else (self.DEFAULT_CROP_PIXELS, self.DEFAULT_CROP_PIXELS))
         
-    def _predict_and_process(self, results, visual_img, thermal_img):
-        """Processes pre-computed prediction results to generate necessary data."""
+    def load_scene(self, results, visual_img_path, thermal_img_path, metrics=None):
+        """
+        Does the per-scene work: loads the images, registers the thermal frame
+        onto the visual one and computes the temperatures of every component.
+        The crops are only produced later, by `iter_scene_components`. With
+        `metrics`, the temperature statistics are timed as 'temperatures'.
+
+        Returns:
+            ComponentScene: The prepared scene, or None if there are no masks.
+        """
+        visual_img = cv2.imread(visual_img_path)
+        thermal_img = cv2.imread(thermal_img_path)
         print("Processing pre-computed results to extract components...")
-        
+
         h_visual, w_visual, _ = visual_img.shape
-        env_temp = self.main_data['environmental_conditions']['env_temp']
 
-        predictions_list = []
-        zoomed_images = []
-        target_size = (240, 240)
-        
-        result_data = results[0]
-        model_names = result_data.names
-
-        if result_data.masks is not None:
-            for i, (mask, box) in enumerate(zip(result_data.masks, result_data.boxes)):
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                mask_data = mask.data[0].cpu().numpy()
-                component_mask_full_res = mask_data[y1:y2, x1:x2]
-                resized_mask = cv2.resize(component_mask_full_res, target_size, interpolation=cv2.INTER_NEAREST)
-                mask_3channel_bool = np.stack([resized_mask] * 3, axis=-1) > 0
-                white_bg = np.full((*target_size, 3), 255, dtype=np.uint8)
-
-                # Imagem visual COM máscara
-                cropped_visual = visual_img[y1:y2, x1:x2]
-                resized_visual = cv2.resize(cropped_visual, target_size)
-                component_visual_isolated = np.where(mask_3channel_bool, resized_visual, white_bg)
-                
-                # Imagem térmica (continua com máscara)
-                thermal_full_resized = cv2.resize(thermal_img, (w_visual, h_visual))
-                cropped_thermal = thermal_full_resized[y1:y2, x1:x2]
-                resized_thermal = cv2.resize(cropped_thermal, target_size)
-                component_thermal_isolated = np.where(mask_3channel_bool, resized_thermal, white_bg)
-
-                zoomed_images.append({
-                    "visual": component_visual_isolated,
-                    "thermal": component_thermal_isolated
-                })
-
-                label = model_names[int(box.cls)]
-                temp_max = random.randint(env_temp + 5, env_temp + 30)
-                temp_min = temp_max - random.randint(10, 25)
-                if temp_min < env_temp: temp_min = env_temp
-
-                predictions_list.append({
-                    "id": i + 1, "label": label,
-                    "temp_max": temp_max, "temp_min": temp_min,
-                })
-        
-        return zoomed_images, predictions_list
+        # Aceita tanto resultados do Ultralytics quanto o formato compacto (.cdet)
+        detections = as_detections(results)
+        if not detections.has_masks:
+            return None
 
-    def add_analysis_to_story(self, story, results, visual_img_path, thermal_img_path, annotated_visual_image_path, temp_dir):
-        visual_img = cv2.imread(visual_img_path)
-        thermal_img = cv2.imread(thermal_img_path)
+        # Caixas em pixels da imagem visual (que pode ter outra resolução que a da inferência)
+        boxes_xyxy = detections.scaled_boxes(visual_img.shape).astype(int)
+
+        # A imagem térmica é registrada sobre a visual uma única vez por cena
+        # (homografia calibrada do conjunto de câmeras, com tabelas de remapeamento em cache)
+        thermal_registered = self.registration.warp(thermal_img, (w_visual, h_visual))
+
+        # Estatísticas de temperatura de todos os componentes, na resolução do mapa de temperaturas e
+        # sem os pixels fora do campo de visão da câmera térmica (borda preta do registro)
+        field_of_view = self.registration.coverage(thermal_img.shape[1::-1], (w_visual, h_visual))
+        temperature_map = self.thermal_calibration.to_temperature(thermal_registered)
+        with timed(metrics, 'temperatures'):
+            temp_stats = component_temperature_stats(temperature_map, detections, valid_mask=field_of_view)
+        del temperature_map
+
+        return ComponentScene(detections, boxes_xyxy, visual_img, thermal_registered, temp_stats)
+
+    def iter_scene_components(self, scene, roles=None):
+        """
+        Yields (crops, prediction) for one component of a `load_scene` scene at
+        a time, in component order. Crops are produced (and, with `roles`,
+        encoded) by a pool of `component_workers` threads a few components
+        ahead of the caller, so only those components' crops are alive at any time.
+        """
+        if scene is None:
+            return
+        detections, boxes_xyxy = scene.detections, scene.boxes_xyxy
+        crops = self._iter_component_crops(detections, boxes_xyxy, scene.visual_img, scene.thermal_registered,
+                                           self.crop_size, roles=roles,
+                                           workers=resolve_workers(self.component_workers, len(boxes_xyxy)))
+        for i, (class_id, component_assets) in enumerate(zip(detections.class_ids, crops)):
+            prediction = {"id": i + 1, "label": detections.names[int(class_id)], "box": boxes_xyxy[i].tolist()}
+            prediction.update({key: float(values[i]) for key, values in scene.temp_stats.items()})
+            yield component_assets, prediction
+
+    def crop_roles(self):
+        """Encoding settings of the visual and thermal crops ('crop' / 'thermal_crop' of `image_encoding`)."""
+        return {"visual": self.image_encoding['crop'], "thermal": self.image_encoding['thermal_crop']}
+
+    def encode_scene(self, annotated_image):
+        """Encodes the annotated scene with the 'scene' settings of `image_encoding` ('original' keeps it as is)."""
+        if annotated_image is None or self.image_encoding['scene'].get('format') == 'original':
+            return annotated_image
+        return encode_for_role(annotated_image, self.image_encoding['scene'])
+
+    @staticmethod
+    def encode_crops(crops, roles):
+        """Encodes a crop dict with `roles` (see `crop_roles`); 'original' keeps the crop as is."""
+        encoded = {key: encode_for_role(crop, roles[key]) for key, crop in crops.items()}
+        return {key: crops[key] if data is None else data for key, data in encoded.items()}
+
+    @staticmethod
+    def _iter_component_crops(detections, boxes_xyxy, visual_img, thermal_registered, target_size,
+                              roles=None, workers=1):
+        """
+        Yields the isolated visual/thermal crop dict of each component, in
+        order, from shared state (`thermal_registered` is the thermal image
+        already registered onto the visual frame; crops are `target_size`
+        (width, height)). With `roles` ({"visual": settings, "thermal":
+        settings}) each crop is encoded as well; with `workers` > 1 components
+        are processed in a thread pool (OpenCV and NumPy release the GIL).
+        """
+        white_bg = np.full((*target_size, 3), 255, dtype=np.uint8)
+
+        def component_crop(item):
+            i, (x1, y1, x2, y2) = item
+            # Só a região da caixa é levada do espaço da máscara ao tamanho do recorte
+            resized_mask = detections.mask_roi(i, x1, y1, x2, y2, target_size, image_shape=visual_img.shape)
+            mask_bool = (resized_mask > 0)[..., np.newaxis]
+
+            # Imagem visual COM máscara
+            resized_visual = cv2.resize(visual_img[y1:y2, x1:x2], target_size)
+            # Imagem térmica (continua com máscara)
+            resized_thermal = cv2.resize(thermal_registered[y1:y2, x1:x2], target_size)
+
+            crops = {
+                "visual": np.where(mask_bool, resized_visual, white_bg),
+                "thermal": np.where(mask_bool, resized_thermal, white_bg),
+            }
+            if roles:
+                crops = ComponentAnalyzer.encode_crops(crops, roles)
+            return crops
+
+        # Alguns componentes à frente por thread, para o pool não esperar pelo consumidor
+        return ordered_thread_map(component_crop, enumerate(boxes_xyxy), workers=workers,
+                                  lookahead=2 * workers if workers > 1 else None, thread_name_prefix='component')
+
+    def prepare_components(self, results, visual_img_path, thermal_img_path, roles=None):
+        """Loads the images and extracts the crops and temperature data of every component, as lists."""
+        components = list(self.iter_scene_components(self.load_scene(results, visual_img_path, thermal_img_path),
+                                                     roles=roles))
+        return [assets for assets, _ in components], [prediction for _, prediction in components]
+
+    def prepare_encoded_components(self, results, visual_img_path, thermal_img_path):
+        """
+        Same as `prepare_components`, but the crops are encoded (in the component
+        worker threads) with the 'crop' / 'thermal_crop' settings of
+        `image_encoding`, so a prepared scene keeps only the compressed crops in memory.
+        """
+        return self.prepare_components(results, visual_img_path, thermal_img_path, roles=self.crop_roles())
+
+    def add_analysis_to_story(self, story, results, visual_img_path, thermal_img_path, annotated_visual_image,
+                              streaming=False):
+        """
+        Appends the component pages of a single scene to the story.
+
+        With `streaming=True` only a `LazyFlowables` placeholder is appended and
+        the crops and page flowables are created while `StreamingDocTemplate`
+        builds the PDF (see `add_prepared_pairs_to_story`).
+        """
+        scene = self.load_scene(results, visual_img_path, thermal_img_path)
+        prepared = PreparedPair(0, None, annotated_visual_image,
+                                self.iter_scene_components(scene, roles=self.crop_roles()))
+        self.add_prepared_pairs_to_story(story, [prepared], streaming=streaming)
+
+    def add_components_to_story(self, story, zoomed_images, predictions, annotated_visual_image):
+        """Appends one page per component, built from already extracted crops and predictions."""
+        prepared = PreparedPair(0, None, annotated_visual_image, list(zip(zoomed_images, predictions)))
+        self.add_prepared_pairs_to_story(story, [prepared])
+
+    def add_prepared_pairs_to_story(self, story, prepared_pairs, streaming=False, metrics=None):
+        """
+        Appends the component pages of every prepared image pair, in order.
+
+        Args:
+            story (list): Story being built.
+            prepared_pairs (iterable): `PreparedPair` objects, e.g. from
+                `inspection_pairs.iter_prepared_pairs`.
+            streaming (bool): If True, only a `LazyFlowables` placeholder is
+                appended: pairs are consumed and each page is created while
+                `StreamingDocTemplate` builds the PDF, and released right after
+                it is drawn, so peak memory does not grow with the number of
+                components or pairs.
+            metrics (StageMetrics): If given, the time spent waiting for each
+                pair goes to the 'pair_wait' stage, producing (and encoding)
+                each component's crops to 'crops' and building its page
+                flowables to 'pages', also when pages are created during the
+                PDF build.
+        """
+        pages = self.iter_prepared_pair_pages(timed_iter(metrics, 'pair_wait', prepared_pairs), metrics)
+        if streaming:
+            story.append(LazyFlowables(pages))
+            return
+        for page in pages:
+            story.extend(page)
+
+    def iter_prepared_pair_pages(self, prepared_pairs, metrics=None):
+        """Yields the flowables of one component page at a time, numbering components across pairs."""
         env_temp = self.main_data['environmental_conditions']['env_temp']
+        component_id = 0
+
+        for prepared in prepared_pairs:
+            annotated_scene = None
+            for component_assets, prediction in timed_iter(metrics, 'crops', prepared.components):
+                with timed(metrics, 'pages'):
+                    if annotated_scene is None:
+                        # A cena anotada é incorporada uma única vez no PDF e referenciada por todas as páginas do par
+                        annotated_scene = shared_image_reader(prepared.annotated_image)
+                    component_id += 1
+                    prediction.update(id=component_id, pair=prepared.index + 1)
+                    page = self._component_page(component_assets, prediction, annotated_scene, env_temp)
+                yield page
+
+        print("Finished adding component analysis to story with unified table format.")
+
+    def _component_page(self, component_assets, prediction, annotated_scene, env_temp):
+        """Builds the flowables of a single component page."""
+        page = []
+        # Adiciona o título geral da página de análise
+        page.append(Paragraph("Relatório de Inspeção Detalhada", self.styles['Title']))
+        page.append(Spacer(1, 8*mm))
+
+        # Adiciona a imagem de cena completa
+        img_annotated_full = SharedImage(annotated_scene, width=self.SCENE_WIDTH, height=self.SCENE_HEIGHT,
+                                         kind='proportional')
+        page.append(img_annotated_full)
+        page.append(Spacer(1, 5*mm))
+
+        # --- Preparação dos Elementos da Tabela ---
+        # MODIFICAÇÃO: Tamanho da imagem reduzido para compactar a tabela
+        img_size = self.CROP_DISPLAY_SIZE
+        img_comp_visual = image_flowable(component_assets["visual"], width=img_size, height=img_size)
+        img_comp_thermal = image_flowable(component_assets["thermal"], width=img_size, height=img_size)
+
+        temp_max = prediction['temp_max']
+        temp_min = prediction['temp_min']
+        delta_t = temp_max - env_temp
         
-        zoomed_images, predictions = self._predict_and_process(results, visual_img, thermal_img)
-        
-        if not predictions: return
-
-        for i, component_assets in enumerate(zoomed_images):
-            # Adiciona o título geral da página de análise
-            story.append(Paragraph("Relatório de Inspeção Detalhada", self.styles['Title']))
-            story.append(Spacer(1, 8*mm))
-
-            # Adiciona a imagem de cena completa
-            img_annotated_full = Image(annotated_visual_image_path, width=170*mm, height=127.5*mm, kind='proportional')
-            story.append(img_annotated_full)
-            story.append(Spacer(1, 5*mm))
-
-            prediction = predictions[i]
-            
-            # --- Preparação dos Elementos da Tabela ---
-            # MODIFICAÇÃO: Tamanho da imagem reduzido para compactar a tabela
-            img_size = 0.6 * inch
-            comp_visual_path = os.path.join(temp_dir, f"comp_{i+1}_visual.png")
-            comp_thermal_path = os.path.join(temp_dir, f"comp_{i+1}_thermal.png")
-            cv2.imwrite(comp_visual_path, component_assets["visual"])
-            cv2.imwrite(comp_thermal_path, component_assets["thermal"])
-            
-            img_comp_visual = Image(comp_visual_path, width=img_size, height=img_size)
-            img_comp_thermal = Image(comp_thermal_path, width=img_size, height=img_size)
-
-            temp_max = prediction['temp_max']
-            temp_min = prediction['temp_min']
-            delta_t = temp_max - env_temp
-            
-            diagnosis_text, diag_color = self.diagnosis_function(prediction['label'], delta_t)
-            display_label = self.label_translation.get(prediction['label'], prediction['label'])
-
-            p_temp_amb_key = Paragraph(f"Temperatura ambiente (°C)<br/>(Δt) Temp. máx - Temp. amb", self.styles['Normal'])
-            p_temp_amb_val = Paragraph(f"{env_temp:.1f}°C<br/>{delta_t:.1f}°C", self.styles['Normal'])
-
-            # --- Construção da Tabela Unificada ---
-            # A primeira linha da tabela já contém o nome específico do componente.
-            table_data = [
-                [Paragraph(f"<b>{i+1}. {display_label}</b>", self.styles['ComponentTitle']), None, None],
-                [img_comp_visual, Paragraph("<b>Análise do Componente</b>", self.styles['h3']), None],
-                [None, 'Temperatura máxima', f"{temp_max:.1f}°C"],
-                [None, 'Temperatura mínima', f"{temp_min:.1f}°C"],
-                [img_comp_thermal, p_temp_amb_key, p_temp_amb_val],
-                [None, 'Diagnóstico Preliminar', Paragraph(diagnosis_text, self.styles['Normal'])],
-            ]
-
-            comp_table = Table(table_data, colWidths=[1.4*inch, 2.8*inch, 2.8*inch], spaceBefore=10)
-            
-            comp_table.setStyle(TableStyle([
-                ('GRID', (0,0), (-1,-1), 1, colors.black),
-                ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                ('ALIGN', (2,2), (2,3), 'CENTER'),
-                ('ALIGN', (1,4), (2,4), 'CENTER'),
-                ('ALIGN', (2,5), (2,5), 'CENTER'),
-                ('SPAN', (0,0), (2,0)), 
-                ('SPAN', (1,1), (2,1)),
-                ('SPAN', (0,1), (0,3)),
-                ('SPAN', (0,4), (0,5)),
-                ('ALIGN', (0,0), (0,0), 'LEFT'),
-                ('LEFTPADDING', (0,0), (0,0), 6),
-                ('ALIGN', (1,1), (1,1), 'CENTER'),
-                ('BACKGROUND', (1,1), (2,1), colors.lightgrey),
-                ('BACKGROUND', (2,5), (2,5), diag_color),
-            ]))
-
-            story.append(comp_table)
-            story.append(PageBreak())
+        diagnosis_text, diag_color = self.diagnosis_function(prediction['label'], delta_t)
+        self.component_records.append(component_record(prediction, env_temp, delta_t, diagnosis_text))
+        display_label = self.label_translation.get(prediction['label'], prediction['label'])
+
+        p_temp_amb_key = Paragraph(f"Temperatura ambiente (°C)<br/>(Δt) Temp. máx - Temp. amb", self.styles['Normal'])
+        p_temp_amb_val = Paragraph(f"{env_temp:.1f}°C<br/>{delta_t:.1f}°C", self.styles['Normal'])
+
+        # --- Construção da Tabela Unificada ---
+        # A primeira linha da tabela já contém o nome específico do componente.
+        table_data = [
+            [Paragraph(f"<b>{prediction['id']}. {display_label}</b>", self.styles['ComponentTitle']), None, None],
+            [img_comp_visual, Paragraph("<b>Análise do Componente</b>", self.styles['h3']), None],
+            [None, 'Temperatura máxima', f"{temp_max:.1f}°C"],
+            [None, 'Temperatura mínima', f"{temp_min:.1f}°C"],
+            [img_comp_thermal, p_temp_amb_key, p_temp_amb_val],
+            [None, 'Diagnóstico Preliminar', Paragraph(diagnosis_text, self.styles['Normal'])],
+        ]
+
+        comp_table = Table(table_data, colWidths=[1.4*inch, 2.8*inch, 2.8*inch], spaceBefore=10)
         
-        print("Finished adding component analysis to story with unified table format.")
\ No newline at end of file
+        comp_table.setStyle(TableStyle([
+            ('GRID', (0,0), (-1,-1), 1, colors.black),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('ALIGN', (2,2), (2,3), 'CENTER'),
+            ('ALIGN', (1,4), (2,4), 'CENTER'),
+            ('ALIGN', (2,5), (2,5), 'CENTER'),
+            ('SPAN', (0,0), (2,0)), 
+            ('SPAN', (1,1), (2,1)),
+            ('SPAN', (0,1), (0,3)),
+            ('SPAN', (0,4), (0,5)),
+            ('ALIGN', (0,0), (0,0), 'LEFT'),
+            ('LEFTPADDING', (0,0), (0,0), 6),
+            ('ALIGN', (1,1), (1,1), 'CENTER'),
+            ('BACKGROUND', (1,1), (2,1), colors.lightgrey),
+            ('BACKGROUND', (2,5), (2,5), diag_color),
+        ]))
+
+        page.append(comp_table)
+        page.append(PageBreak())
+        return page
@@ -0,0 +1,223 @@
+# registration.py
+"""
+Registro (alinhamento) da imagem térmica sobre a visual para um conjunto de
+câmeras (visual + térmica) calibrado.
+
+A calibração é uma homografia térmica -> visual medida uma única vez por
+conjunto de câmeras, a partir de pontos correspondentes nas duas imagens:
+
+    python registration.py calibrate --points pontos.json --output camera_rig.json
+
+O arquivo de pontos é um JSON com 'thermal_points' e 'visual_points' (listas
+de [x, y] em pixels, ao menos 4 pares) e 'thermal_size' / 'visual_size'
+([largura, altura] das imagens usadas na calibração).
+
+As tabelas de remapeamento (cv2.remap) derivadas da homografia são calculadas
+uma vez por tamanho de imagem, mantidas em memória e gravadas em disco, de modo
+que cada quadro paga apenas o custo do remapeamento.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+# Registros já construídos (as tabelas de remapeamento são reaproveitadas entre relatórios)
+_REGISTRATION_CACHE = {}
+
+
+class RigRegistration:
+    """
+    Warps thermal frames onto the visual frame of a camera rig.
+
+    Without a homography the thermal frame is just stretched to the visual size
+    (the behaviour for uncalibrated rigs). With one, the homography measured at
+    the calibration sizes is rescaled to the actual frame sizes and turned into
+    fixed-point remap tables, built once per (thermal size, output size) and
+    cached in memory and, if `cache_dir` is set, on disk.
+
+    Visual pixels outside the thermal field of view are filled with black;
+    `coverage` tells which pixels actually come from the thermal frame, so
+    that the black border is not read as a (minimum) temperature.
+    """
+    def __init__(self, homography=None, thermal_size=None, visual_size=None, cache_dir=None):
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64).reshape(3, 3)
+        self.thermal_size = tuple(thermal_size) if thermal_size else None
+        self.visual_size = tuple(visual_size) if visual_size else None
+        self.cache_dir = cache_dir
+        self._maps = {}
+        self._coverage = {}
+        if self.homography is not None and (self.thermal_size is None or self.visual_size is None):
+            raise ValueError("A homografia exige 'thermal_size' e 'visual_size' da calibração.")
+
+    @classmethod
+    def from_config(cls, config, cache_dir=None):
+        """
+        Builds a registration from `get_utils.get_thermal_registration()`: None
+        (no calibration), a dict with 'homography', 'thermal_size' and
+        'visual_size', or the path of a JSON file with those fields (as written
+        by `python registration.py calibrate`). Instances are cached per
+        configuration, so the remap tables are built only once per process.
+        """
+        cache_key = repr((sorted(config.items()) if isinstance(config, dict) else config, cache_dir))
+        if cache_key in _REGISTRATION_CACHE:
+            return _REGISTRATION_CACHE[cache_key]
+
+        if isinstance(config, str):
+            with open(config, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        config = config or {}
+        registration = cls(config.get('homography'), config.get('thermal_size'),
+                           config.get('visual_size'), cache_dir=cache_dir)
+        _REGISTRATION_CACHE[cache_key] = registration
+        return registration
+
+    @classmethod
+    def from_point_pairs(cls, thermal_points, visual_points, thermal_size, visual_size, cache_dir=None):
+        """Estimates the thermal -> visual homography from corresponding points (RANSAC)."""
+        thermal_points = np.asarray(thermal_points, dtype=np.float64).reshape(-1, 2)
+        visual_points = np.asarray(visual_points, dtype=np.float64).reshape(-1, 2)
+        if len(thermal_points) < 4 or len(thermal_points) != len(visual_points):
+            raise ValueError("São necessários ao menos 4 pares de pontos correspondentes.")
+        homography, _ = cv2.findHomography(thermal_points, visual_points, cv2.RANSAC, 3.0)
+        if homography is None:
+            raise ValueError("Não foi possível estimar a homografia com os pontos fornecidos.")
+        return cls(homography, thermal_size, visual_size, cache_dir=cache_dir)
+
+    @property
+    def is_calibrated(self):
+        return self.homography is not None
+
+    def as_config(self):
+        return {
+            'homography': self.homography.tolist() if self.is_calibrated else None,
+            'thermal_size': list(self.thermal_size) if self.thermal_size else None,
+            'visual_size': list(self.visual_size) if self.visual_size else None,
+        }
+
+    def warp(self, thermal_img, output_size):
+        """
+        Registers a thermal frame onto the visual frame.
+
+        Args:
+            thermal_img (np.ndarray): Thermal image (H, W[, C]).
+            output_size (tuple): (width, height) of the visual frame.
+
+        Returns:
+            np.ndarray: The thermal image in visual-frame coordinates.
+        """
+        if not self.is_calibrated:
+            return cv2.resize(thermal_img, tuple(output_size))
+        thermal_h, thermal_w = thermal_img.shape[:2]
+        map1, map2 = self.remap_tables((thermal_w, thermal_h), tuple(output_size))
+        return cv2.remap(thermal_img, map1, map2, cv2.INTER_LINEAR,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def coverage(self, thermal_size, output_size):
+        """
+        Boolean mask (height, width) of the output pixels that lie entirely
+        inside the thermal field of view, or None when every pixel does
+        (uncalibrated rig). Built once per (thermal size, output size).
+
+        Args:
+            thermal_size (tuple): (width, height) of the thermal frame.
+            output_size (tuple): (width, height) of the visual frame.
+        """
+        if not self.is_calibrated:
+            return None
+        key = (tuple(thermal_size), tuple(output_size))
+        mask = self._coverage.get(key)
+        if mask is None:
+            map1, map2 = self.remap_tables(*key)
+            # A mesma interpolação do warp: pixels da borda misturados com o preto também ficam de fora
+            ones = np.full((thermal_size[1], thermal_size[0]), 255, dtype=np.uint8)
+            mask = cv2.remap(ones, map1, map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0) == 255
+            self._coverage[key] = mask
+        return mask
+
+    def effective_homography(self, thermal_size, output_size):
+        """Homography rescaled from the calibration sizes to the actual frame sizes."""
+        scale_thermal = np.diag([thermal_size[0] / self.thermal_size[0], thermal_size[1] / self.thermal_size[1], 1.0])
+        scale_visual = np.diag([output_size[0] / self.visual_size[0], output_size[1] / self.visual_size[1], 1.0])
+        return scale_visual @ self.homography @ np.linalg.inv(scale_thermal)
+
+    def remap_tables(self, thermal_size, output_size):
+        """
+        Returns the cv2.remap tables (fixed-point, CV_16SC2 + CV_16UC1) that map
+        each output pixel to its thermal source position.
+        """
+        key = (tuple(thermal_size), tuple(output_size))
+        maps = self._maps.get(key)
+        if maps is None:
+            maps = self._load_cached_tables(key)
+            if maps is None:
+                maps = self._build_tables(*key)
+                self._store_cached_tables(key, maps)
+            self._maps[key] = maps
+        return maps
+
+    def _build_tables(self, thermal_size, output_size):
+        inverse = np.linalg.inv(self.effective_homography(thermal_size, output_size)).astype(np.float32)
+        width, height = output_size
+        xs = np.arange(width, dtype=np.float32)
+        map_x = np.empty((height, width), dtype=np.float32)
+        map_y = np.empty((height, width), dtype=np.float32)
+        # Linha a linha, para não materializar a grade homogênea inteira da imagem
+        for y in range(height):
+            w = inverse[2, 0] * xs + (inverse[2, 1] * y + inverse[2, 2])
+            map_x[y] = (inverse[0, 0] * xs + (inverse[0, 1] * y + inverse[0, 2])) / w
+            map_y[y] = (inverse[1, 0] * xs + (inverse[1, 1] * y + inverse[1, 2])) / w
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def _cache_path(self, key):
+        digest = hashlib.sha1(repr((self.homography.round(10).tolist(), self.thermal_size,
+                                    self.visual_size, key)).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.cache_dir, f"remap_{digest}.npz")
+
+    def _load_cached_tables(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return data['map1'], data['map2']
+        except (OSError, ValueError, KeyError):
+            return None  # arquivo corrompido ou incompleto: recalcula
+
+    def _store_cached_tables(self, key, maps):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Gravação atômica: processos concorrentes de um lote nunca leem um arquivo parcial
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.remap', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, map1=maps[0], map2=maps[1])
+        os.replace(tmp_path, self._cache_path(key))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibração do registro térmico -> visual do conjunto de câmeras.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    calibrate = subparsers.add_parser('calibrate', help="Estima a homografia a partir de pontos correspondentes.")
+    calibrate.add_argument('--points', required=True, help="JSON com os pontos e os tamanhos das imagens.")
+    calibrate.add_argument('--output', required=True, help="Arquivo JSON de calibração a ser gravado.")
+    args = parser.parse_args(argv)
+
+    with open(args.points, 'r', encoding='utf-8') as f:
+        points = json.load(f)
+    registration = RigRegistration.from_point_pairs(points['thermal_points'], points['visual_points'],
+                                                    points['thermal_size'], points['visual_size'])
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(registration.as_config(), f, indent=2)
+    print(f"Calibração gravada em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
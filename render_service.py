@@ -0,0 +1,218 @@
+# render_service.py
+"""
+Serviço de renderização persistente ("quente") com uma API HTTP local.
+
+Os processos de trabalho são iniciados uma única vez e pré-carregam o pipeline
+(OpenCV, ReportLab, folhas de estilo, logotipo, calibração térmica), de modo
+que cada relatório paga apenas o custo da renderização.
+
+Endpoints:
+    POST /jobs              corpo JSON {"report_data": {...}, "output_pdf_path": "..."}
+                            (report_data sobrescreve os campos padrão, como em batch_report.py);
+                            adicione ?wait=1 para aguardar a conclusão.
+    GET  /jobs/<id>         status do job (queued, running, done, failed) e caminho do PDF
+    GET  /jobs/<id>/pdf     o PDF gerado
+    GET  /metrics           profundidade da fila, jobs em execução e percentis de latência
+
+Exemplo:
+    python render_service.py --port 8750 --workers 4 --output-dir relatorios/
+    curl -X POST localhost:8750/jobs -d '{"report_data": {"pickle_path": "resultado.cdet"}}'
+"""
+import argparse
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch_report import _render_job
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8750
+
+
+def _warm_worker():
+    """Inicializador dos processos de trabalho: carrega o pipeline uma única vez."""
+    from Main import warm_up
+    warm_up()
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RenderService:
+    """
+    Fila de jobs de renderização atendida por um pool de processos pré-aquecidos.
+    """
+    def __init__(self, output_dir='relatorios', workers=2, latency_window=1000, max_retained_jobs=10000):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.max_retained_jobs = max_retained_jobs
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._latencies = deque(maxlen=latency_window)
+        self._counters = {'completed': 0, 'failed': 0, 'running': 0}
+        self._executor = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        # Um despachante por processo: o job só sai da fila quando há um processo livre
+        for _ in range(self.workers):
+            threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, overrides, output_pdf_path=None):
+        job_id = str(next(self._job_ids))
+        if output_pdf_path:
+            overrides = dict(overrides, output_pdf_path=output_pdf_path)
+        job = {'job_id': job_id, 'overrides': overrides, 'status': 'queued',
+               'submitted_at': time.perf_counter(), 'output': None, 'error': None,
+               'done': threading.Event()}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._forget_finished_jobs()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _forget_finished_jobs(self):
+        # Descarta os jobs concluídos mais antigos para o serviço não crescer sem limite
+        excess = len(self._jobs) - self.max_retained_jobs
+        for job_id in [j for j, job in self._jobs.items() if job['done'].is_set()][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _dispatch_loop(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job['status'] = 'running'
+                self._counters['running'] += 1
+            try:
+                outcome = self._executor.submit(
+                    _render_job, {'job_id': job['job_id'], 'overrides': job['overrides']}, self.output_dir
+                ).result()
+            except Exception as e:
+                outcome = {'ok': False, 'output': None, 'error': f"{type(e).__name__}: {e}"}
+
+            latency = time.perf_counter() - job['submitted_at']
+            with self._lock:
+                self._counters['running'] -= 1
+                self._counters['completed' if outcome['ok'] else 'failed'] += 1
+                self._latencies.append(latency)
+                job.update(status='done' if outcome['ok'] else 'failed',
+                           output=outcome['output'], error=outcome['error'], latency_s=latency)
+            job['done'].set()
+
+    def metrics(self):
+        with self._lock:
+            latencies_ms = sorted(l * 1000.0 for l in self._latencies)
+            counters = dict(self._counters)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'workers': self.workers,
+            **counters,
+            'latency_ms': {f'p{q}': _percentile(latencies_ms, q) for q in (50, 90, 99)},
+        }
+
+
+def _job_view(job):
+    return {key: job.get(key) for key in ('job_id', 'status', 'output', 'error', 'latency_s')}
+
+
+def make_handler(service):
+    class RenderRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/jobs':
+                return self._send_json(404, {'error': 'rota não encontrada'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError as e:
+                return self._send_json(400, {'error': f'JSON inválido: {e}'})
+
+            job = service.submit(body.get('report_data', {}), body.get('output_pdf_path'))
+            if parse_qs(url.query).get('wait', ['0'])[0] in ('1', 'true'):
+                job['done'].wait()
+                return self._send_json(200 if job['status'] == 'done' else 500, _job_view(job))
+            self._send_json(202, _job_view(job))
+
+        def do_GET(self):
+            parts = [p for p in urlparse(self.path).path.split('/') if p]
+            if parts == ['metrics']:
+                return self._send_json(200, service.metrics())
+            if len(parts) in (2, 3) and parts[0] == 'jobs':
+                job = service.get(parts[1])
+                if job is None:
+                    return self._send_json(404, {'error': 'job não encontrado'})
+                if len(parts) == 2:
+                    return self._send_json(200, _job_view(job))
+                if parts[2] == 'pdf':
+                    if job['status'] != 'done':
+                        return self._send_json(409, _job_view(job))
+                    return self._send_file(job['output'])
+            self._send_json(404, {'error': 'rota não encontrada'})
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_file(self, path):
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # sem log por requisição
+
+    return RenderRequestHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço local de renderização de relatórios.")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=2, help="Processos de renderização pré-aquecidos.")
+    parser.add_argument('--output-dir', default='relatorios', help="Diretório padrão dos PDFs.")
+    args = parser.parse_args(argv)
+
+    service = RenderService(args.output_dir, workers=args.workers)
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serviço de renderização ouvindo em http://{args.host}:{args.port} ({args.workers} processos)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nExecução interrompida pelo usuário (Ctrl+C).")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# report_cache.py
+"""
+Cache endereçado por conteúdo dos relatórios gerados.
+
+A chave de um relatório é o SHA-256 de tudo o que determina o PDF:
+
+  * o conteúdo (não o caminho nem a data) de cada arquivo citado no
+    report_data: resultados da inferência, imagens visual e térmica, logotipo,
+    arquivos de calibração etc.;
+  * os demais campos do report_data, exceto os voláteis (CACHE_VOLATILE_KEYS,
+    como o 'timestamp' de geração);
+  * a versão do código e dos modelos do relatório (código-fonte e arquivos
+    .json deste diretório, mais as versões do ReportLab, OpenCV e NumPy).
+
+Um relatório cuja chave já está no cache é apenas copiado, sem passar pelo
+pipeline. O relatório em cache mantém a data de geração da primeira vez em
+que foi renderizado.
+
+As páginas de componentes também são guardadas como uma entrada própria, cuja
+chave ignora os campos usados apenas na página de resumo (SUMMARY_ONLY_KEYS).
+Quando só esses campos mudam, apenas o resumo é renderizado e as páginas de
+componentes em cache são anexadas a ele (requer o pacote opcional pypdf; sem
+ele, o relatório é sempre construído por inteiro).
+
+O cache é limitado em bytes e/ou em número de entradas e descarta as menos
+usadas (LRU pela data de modificação, atualizada a cada acerto). Vários
+processos (ex.: batch_report.py) podem compartilhar o mesmo diretório: as
+entradas são gravadas de forma atômica.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from functools import lru_cache
+
+# Campos do report_data que não entram na chave (não alteram o PDF)
+CACHE_VOLATILE_KEYS = ('timestamp', 'metrics_json_path', 'metrics_prometheus_path',
+                       'report_cache_dir', 'report_cache_max_mb', 'report_cache_max_entries',
+                       'registration_cache_dir', 'pair_workers', 'component_workers', 'streaming_build',
+                       'results_db_path')
+
+# Campos usados apenas na página de resumo (ReportGenerator), fora da chave das páginas de componentes
+SUMMARY_ONLY_KEYS = ('logo_path', 'report_code', 'reg_code', 'pbo_code', 'info_title', 'inspector',
+                     'delta_t', 'temp_ambient', 'temp_object', 'agency_region', 'feeder', 'equipment',
+                     'form_number', 'emissivity_val', 'department_info', 'dec_atual', 'contrib_dec',
+                     'uc_conjunto', 'uc_possiveis', 'dec_date', 'contrib_global', 'situacao_dec',
+                     'location', 'description_long', 'temp_max_equipment_value', 'gps')
+
+# Incrementado quando o formato da chave muda
+CACHE_KEY_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+# Resumos de arquivos já lidos neste processo: {(caminho, tamanho, mtime_ns): sha256}
+_file_digests = {}
+
+
+def file_digest(path):
+    """
+    SHA-256 do conteúdo de um arquivo, memorizado por (caminho, tamanho,
+    mtime) para que cada arquivo seja lido no máximo uma vez por processo.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                h.update(chunk)
+        digest = _file_digests[memo_key] = h.hexdigest()
+    return digest
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Resumo do código e dos modelos (.py / .json deste diretório) e das bibliotecas de renderização."""
+    import cv2
+    import numpy as np
+    import reportlab
+
+    h = hashlib.sha256(f"{CACHE_KEY_VERSION}|{reportlab.Version}|{cv2.__version__}|{np.__version__}".encode())
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(module_dir, '*.py')) + glob.glob(os.path.join(module_dir, '*.json'))):
+        h.update(os.path.basename(path).encode('utf-8'))
+        h.update(file_digest(path).encode('ascii'))
+    return h.hexdigest()
+
+
+def _canonical(value):
+    """Representação JSON estável de um valor do report_data (arquivos pelo conteúdo)."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, str):
+        return {'file_sha256': file_digest(value)} if os.path.isfile(value) else value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if callable(value):
+        return f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if hasattr(value, '__dict__'):
+        # Objetos simples (ex.: get_utils.GPS): o repr padrão traz o endereço de memória
+        return {'type': type(value).__qualname__, **_canonical(vars(value))}
+    return repr(value)
+
+
+def report_key(report_data, volatile_keys=CACHE_VOLATILE_KEYS):
+    """
+    Chave de cache (hex SHA-256) de um relatório.
+
+    Args:
+        report_data (dict): Dados do relatório, como passados a `render_report`.
+        volatile_keys (tuple): Campos ignorados.
+
+    Returns:
+        str: A chave do relatório.
+    """
+    fields = {k: v for k, v in report_data.items() if k not in volatile_keys}
+    payload = json.dumps(_canonical(fields), sort_keys=True, ensure_ascii=False, allow_nan=True)
+    return hashlib.sha256(f"{code_version()}\n{payload}".encode('utf-8')).hexdigest()
+
+
+def component_section_key(report_data):
+    """Chave de cache das páginas de componentes (ignora os campos exclusivos do resumo)."""
+    return 'components_' + report_key(report_data, volatile_keys=CACHE_VOLATILE_KEYS + SUMMARY_ONLY_KEYS)
+
+
+def pdf_splicing_available():
+    """True se o pacote opcional pypdf estiver instalado."""
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def extract_pdf_pages(source_path, output_path, first_page):
+    """Grava em `output_path` as páginas de `source_path` a partir de `first_page` (base 0)."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for page in PdfReader(source_path).pages[first_page:]:
+        writer.add_page(page)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+def concatenate_pdfs(source_paths, output_path):
+    """Grava em `output_path` as páginas de todos os `source_paths`, em ordem."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for path in source_paths:
+        for page in PdfReader(path).pages:
+            writer.add_page(page)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+class ReportCache:
+    """
+    Diretório de PDFs indexados pela chave do relatório, com limite de tamanho
+    e descarte LRU.
+
+    Args:
+        cache_dir (str): Diretório do cache (criado se não existir).
+        max_bytes (int): Tamanho máximo do cache; None = sem limite.
+        max_entries (int): Número máximo de relatórios; None = sem limite.
+    """
+    SUFFIX = '.pdf'
+
+    def __init__(self, cache_dir, max_bytes=None, max_entries=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_report_data(cls, report_data):
+        """Cache configurado em `report_data` ('report_cache_dir', ...), ou None se desativado."""
+        cache_dir = report_data.get('report_cache_dir')
+        if not cache_dir:
+            return None
+        max_mb = report_data.get('report_cache_max_mb')
+        return cls(cache_dir, max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+                   max_entries=report_data.get('report_cache_max_entries'))
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key):
+        """Caminho da entrada `key`, ou None se não estiver no cache. Marca a entrada como usada."""
+        path = self._entry_path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, key, output_path):
+        """Copia a entrada `key` para `output_path`. Retorna False se não estiver no cache."""
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            return False  # descartada por outro processo entre o get e a cópia
+        return True
+
+    def put(self, key, source_path):
+        """Grava uma cópia de `source_path` como a entrada `key` e aplica os limites do cache."""
+        # Gravação atômica: outros processos nunca leem uma entrada parcial
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp', suffix=self.SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(source_path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove as entradas menos usadas até respeitar `max_bytes` e `max_entries`."""
+        if self.max_bytes is None and self.max_entries is None:
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.SUFFIX) and not entry.name.startswith('.'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in entries:
+            if ((self.max_bytes is None or total_bytes <= self.max_bytes)
+                    and (self.max_entries is None or count <= self.max_entries)):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # já removida por outro processo
+            total_bytes -= size
+            count -= 1
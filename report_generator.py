@@ -1,36 +1,99 @@
 # report_generator.py
-from reportlab.lib.pagesizes import A4
+import copy
+from functools import lru_cache
+
 from reportlab.platypus import Paragraph, Table, TableStyle, Image, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.lib.enums import TA_CENTER
 
+from image_utils import (
+    SharedImage, display_pixels, encode_many, exceeds_display_size, file_image_reader, image_file_size,
+    image_flowable, read_image_for_display, resolve_image_encoding,
+)
+
+
+@lru_cache(maxsize=None)
+def _get_styles():
+    """Sample stylesheet built once per process and shared by every report."""
+    return getSampleStyleSheet()
+
+
+class SummaryTemplate:
+    """
+    Static layout of the summary page (styles, table styles, column widths and
+    fixed paragraphs), built once per process and filled in by each report.
+    """
+    INFO_TABLE_COL_WIDTHS = [70*mm, 90*mm]
+    HEADER_COL_WIDTHS = [45*mm, 65*mm, 65*mm]
+    IMG_WIDTH, IMG_HEIGHT = 85*mm, (85*mm / 4) * 3
+
+    def __init__(self, styles):
+        normal = styles['Normal']
+        self.paragraph_styles = {
+            'agency': ParagraphStyle(name='AgencyStyle', parent=normal, alignment=TA_CENTER, fontName='Helvetica-Bold', fontSize=10),
+            'info_title': ParagraphStyle(name='InfoContStyle', parent=normal, fontName='Helvetica-Bold', fontSize=11, spaceBefore=6, spaceAfter=6),
+            'location': ParagraphStyle(name='LocationStyle', parent=normal, fontSize=9, leading=12),
+            'obs_title': ParagraphStyle(name='ObsTitleStyle', parent=normal, fontName='Helvetica-Bold', fontSize=10),
+            'description': ParagraphStyle(name='DescriptionStyle', parent=normal, fontSize=9, leading=12),
+            'dept_info': ParagraphStyle(name='DeptInfoStyle', parent=normal, alignment=TA_CENTER, fontSize=8, leading=10),
+            'header': ParagraphStyle(name='Header', fontSize=8, leading=10),
+        }
+        self.header_table_style = TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP')])
+        self.info_table_style = TableStyle([('FONTNAME', (0,0), (-1,-1), 'Helvetica'), ('FONTSIZE', (0,0), (-1,-1), 9), ('BOX', (0,0), (-1,-1), 0.5, colors.black), ('INNERGRID', (0,0), (-1,-1), 0.3, colors.grey), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('LEFTPADDING', (0,0), (-1,-1), 2*mm)])
+
+    @lru_cache(maxsize=256)
+    def _parsed_paragraph(self, text, style_key):
+        return Paragraph(text, self.paragraph_styles[style_key])
+
+    def static_paragraph(self, text, style_key):
+        """
+        Returns a paragraph for a fixed label of the layout (e.g. "OBSERVAÇÕES:").
+        The markup is parsed once; each report gets a deep copy, since wrap/split
+        keep layout state on the flowable and its frags. Only the style is shared.
+        """
+        parsed = self._parsed_paragraph(text, style_key)
+        return copy.deepcopy(parsed, {id(parsed.style): parsed.style})
+
+    def paragraph(self, text, style_key):
+        """Returns a paragraph for a per-report (variable) field."""
+        return Paragraph(text, self.paragraph_styles[style_key])
+
+    def info_table(self, rows):
+        return Table(rows, colWidths=self.INFO_TABLE_COL_WIDTHS, style=self.info_table_style)
+
+
+@lru_cache(maxsize=None)
+def _get_template():
+    """Summary page template built once per process and shared by every report."""
+    return SummaryTemplate(_get_styles())
+
+
 class ReportGenerator:
     """Generates the summary page of the inspection report."""
 
     def __init__(self, report_data):
         self.data = report_data
-        self.styles = getSampleStyleSheet()
+        self.styles = _get_styles()
+        self.template = _get_template()
 
     def generate_summary_story(self):
         """Builds the story list containing the summary page elements."""
+        template = self.template
         story = []
         # Build all elements for the first page
         story.extend(self._create_header())
         story.append(Spacer(1, 2 * mm)) # This spacer is already small, kept as is.
 
-        agency_style = ParagraphStyle(name='AgencyStyle', parent=self.styles['Normal'], alignment=TA_CENTER, fontName='Helvetica-Bold', fontSize=10)
-        story.append(Paragraph(self.data['agency_region'], agency_style))
+        story.append(template.paragraph(self.data['agency_region'], 'agency'))
         story.append(Spacer(1, 3 * mm)) # REDUCED from 5*mm
 
-        info_title_style = ParagraphStyle(name='InfoContStyle', parent=self.styles['Normal'], fontName='Helvetica-Bold', fontSize=11, spaceBefore=6, spaceAfter=6)
-        story.append(Paragraph(self.data['info_title'], info_title_style))
+        story.append(template.paragraph(self.data['info_title'], 'info_title'))
         story.append(self._create_dec_table())
         story.append(Spacer(1, 3 * mm)) # REDUCED from 5*mm
 
-        location_style = ParagraphStyle(name='LocationStyle', parent=self.styles['Normal'], fontSize=9, leading=12)
-        story.append(Paragraph(f"<b>Localização:</b> {self.data['location']}", location_style))
+        story.append(template.paragraph(f"<b>Localização:</b> {self.data['location']}", 'location'))
         story.append(Spacer(1, 3 * mm)) # Kept as is.
 
         story.append(self._create_main_images_table())
@@ -39,48 +102,61 @@ class ReportGenerator:
         story.append(self._create_temperature_table())
         story.append(Spacer(1, 3 * mm)) # REDUCED from 5*mm
 
-        obs_title_style = ParagraphStyle(name='ObsTitleStyle', parent=self.styles['Normal'], fontName='Helvetica-Bold', fontSize=10)
-        story.append(Paragraph("<b>OBSERVAÇÕES:</b>", obs_title_style))
+        story.append(template.static_paragraph("<b>OBSERVAÇÕES:</b>", 'obs_title'))
         story.append(Spacer(1, 2 * mm)) # Kept as is.
-        desc_style = ParagraphStyle(name='DescriptionStyle', parent=self.styles['Normal'], fontSize=9, leading=12)
-        story.append(Paragraph(self.data['description_long'], desc_style))
+        story.append(template.paragraph(self.data['description_long'], 'description'))
         story.append(Spacer(1, 4 * mm)) # SIGNIFICANTLY REDUCED from 8*mm
 
-        dept_info_style = ParagraphStyle(name='DeptInfoStyle', parent=self.styles['Normal'], alignment=TA_CENTER, fontSize=8, leading=10)
-        story.append(Paragraph(self.data['department_info'], dept_info_style))
-        
+        story.append(template.paragraph(self.data['department_info'], 'dept_info'))
+
         return story
 
     def _create_header(self):
-        logo = Image(self.data['logo_path'], width=45*mm, height=25*mm)
-        p_style = ParagraphStyle(name='Header', fontSize=8, leading=10)
+        # O logotipo é decodificado uma vez por processo e reaproveitado entre relatórios
+        logo = SharedImage(file_image_reader(self.data['logo_path']), width=45*mm, height=25*mm)
         header_table_data = [[
             logo,
-            Paragraph(f"<b>Código:</b> {self.data['report_code']}<br/>"
-                      f"<b>Horário:</b> {self.data['timestamp'].strftime('%H:%M:%S')}<br/>"
-                      f"<b>Inspetor:</b> {self.data['inspector']}", p_style),
-            Paragraph(f"<b>Alimentador:</b> {self.data['feeder']}<br/>"
-                      f"<b>Equipamento:</b> {self.data['equipment']}<br/>"
-                      f"<b>Formulário:</b> {self.data['form_number']}", p_style)
+            self.template.paragraph(f"<b>Código:</b> {self.data['report_code']}<br/>"
+                                    f"<b>Horário:</b> {self.data['timestamp'].strftime('%H:%M:%S')}<br/>"
+                                    f"<b>Inspetor:</b> {self.data['inspector']}", 'header'),
+            self.template.paragraph(f"<b>Alimentador:</b> {self.data['feeder']}<br/>"
+                                    f"<b>Equipamento:</b> {self.data['equipment']}<br/>"
+                                    f"<b>Formulário:</b> {self.data['form_number']}", 'header')
         ]]
-        header_table = Table(header_table_data, colWidths=[45*mm, 65*mm, 65*mm])
-        header_table.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP')]))
+        header_table = Table(header_table_data, colWidths=SummaryTemplate.HEADER_COL_WIDTHS, style=self.template.header_table_style)
         return [header_table]
 
     def _create_dec_table(self):
         data = [['DEC Atual do Conjunto (hs):', self.data['dec_atual']], ['Contribuição p/ DEC do Conjunto:', self.data['contrib_dec']], ['UC do Conjunto:', self.data['uc_conjunto']], ['UC Possíveis Afetadas:', self.data['uc_possiveis']], ['Data:', self.data['dec_date']], ['Contribuição Global:', self.data['contrib_global']], ['Situação do DEC do Conjunto:', self.data['situacao_dec']]]
-        tbl = Table(data, colWidths=[70*mm, 90*mm], style=[('FONTNAME', (0,0), (-1,-1), 'Helvetica'), ('FONTSIZE', (0,0), (-1,-1), 9), ('BOX', (0,0), (-1,-1), 0.5, colors.black), ('INNERGRID', (0,0), (-1,-1), 0.3, colors.grey), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('LEFTPADDING', (0,0), (-1,-1), 2*mm)])
-        return tbl
-        
+        return self.template.info_table(data)
+
     def _create_main_images_table(self):
         # Uses original, un-annotated images
-        img_width, img_height = 85*mm, (85*mm / 4) * 3
-        visual_img = Image(self.data['visual_image_path'], width=img_width, height=img_height)
-        thermal_img = Image(self.data['thermal_image_path'], width=img_width, height=img_height)
-        tbl = Table([[visual_img, thermal_img]], colWidths=[img_width, img_width], rowHeights=[img_height])
+        img_width, img_height = SummaryTemplate.IMG_WIDTH, SummaryTemplate.IMG_HEIGHT
+        paths = [self.data['visual_image_path'], self.data['thermal_image_path']]
+        settings = resolve_image_encoding(self.data.get('image_encoding'))['summary']
+        # Pixels necessários para a resolução de impressão (None = resolução original)
+        dpi = self.data.get('print_dpi')
+        max_size = display_pixels(img_width, img_height, dpi) if dpi else None
+
+        images = [None] * len(paths)
+        to_encode = []
+        for i, path in enumerate(paths):
+            if settings.get('format') == 'original' and (
+                    max_size is None or not exceeds_display_size(image_file_size(path), max_size)):
+                images[i] = Image(path, width=img_width, height=img_height)
+            else:
+                to_encode.append(i)
+        if to_encode:
+            # Decodificadas já na resolução de impressão e recodificadas (em paralelo) conforme o papel 'summary'
+            encode_settings = settings if settings.get('format') != 'original' else dict(settings, format='jpeg')
+            encoded = encode_many([read_image_for_display(paths[i], max_size) for i in to_encode],
+                                  [encode_settings] * len(to_encode))
+            for i, data in zip(to_encode, encoded):
+                images[i] = image_flowable(data, width=img_width, height=img_height)
+        tbl = Table([images], colWidths=[img_width, img_width], rowHeights=[img_height])
         return tbl
-        
+
     def _create_temperature_table(self):
         data = [['ΔT (°C):', self.data['delta_t']], ['Temperatura Ambiente (°C):', self.data['temp_ambient']], ['Maior temperatura (°C):', self.data['temp_object']], ['Equipamento de maior temperatura:', self.data['temp_max_equipment_value']], ['Emissividade:', self.data['emissivity_val']]]
-        tbl = Table(data, colWidths=[70*mm, 90*mm], style=[('FONTNAME', (0,0), (-1,-1), 'Helvetica'), ('FONTSIZE', (0,0), (-1,-1), 9), ('BOX', (0,0), (-1,-1), 0.5, colors.black), ('INNERGRID', (0,0), (-1,-1), 0.3, colors.grey), ('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('LEFTPADDING', (0,0), (-1,-1), 2*mm)])
-        return tbl
\ No newline at end of file
+        return self.template.info_table(data)
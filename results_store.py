@@ -0,0 +1,317 @@
+# results_store.py
+"""
+Armazenamento local (SQLite) dos resultados por componente de cada relatório.
+
+Cada relatório grava, em uma única transação, uma linha em 'reports' (nota,
+equipamento, alimentador, agência, data da inspeção, PDF) e uma linha por
+componente em 'components' (rótulo, caixa, temperaturas, ΔT e diagnóstico).
+O banco usa WAL, então vários processos (ex.: batch_report.py) podem gravar
+ao mesmo tempo enquanto consultas são feitas.
+
+Cada relatório é identificado pelo PDF gerado (caminho absoluto): gerar de novo
+o mesmo PDF substitui o registro anterior, enquanto PDFs distintos com a mesma
+nota (ex.: jobs de um lote sem 'form_number', que recebem a nota padrão) são
+relatórios distintos. Bancos criados com o esquema antigo (nota única) são
+migrados ao abrir.
+
+Consulta pela linha de comando, ex.: todos os conectores com manutenção
+urgente no alimentador X:
+    python results_store.py inspection_results.db --feeder X --label connector --diagnosis "Manutenção Urgente"
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+# Versão do esquema (PRAGMA user_version); 1: relatórios identificados pelo PDF, não pela nota
+SCHEMA_VERSION = 1
+
+REPORTS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id             INTEGER PRIMARY KEY,
+    pdf_path       TEXT NOT NULL UNIQUE,
+    form_number    TEXT NOT NULL,
+    equipment      TEXT,
+    feeder         TEXT,
+    agency_region  TEXT,
+    location       TEXT,
+    inspector      TEXT,
+    inspected_at   TEXT,
+    component_key  TEXT,
+    stored_at      TEXT NOT NULL
+);
+"""
+
+SCHEMA = REPORTS_TABLE.format(name='reports') + """
+CREATE TABLE IF NOT EXISTS components (
+    report_id      INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    component_id   INTEGER NOT NULL,
+    pair           INTEGER,
+    label          TEXT NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    temp_max       REAL,
+    temp_min       REAL,
+    temp_mean      REAL,
+    temp_p95       REAL,
+    env_temp       REAL,
+    delta_t        REAL,
+    diagnosis      TEXT,
+    PRIMARY KEY (report_id, component_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reports_form_number ON reports(form_number);
+CREATE INDEX IF NOT EXISTS idx_reports_feeder ON reports(feeder);
+CREATE INDEX IF NOT EXISTS idx_reports_equipment ON reports(equipment);
+CREATE INDEX IF NOT EXISTS idx_reports_agency ON reports(agency_region);
+CREATE INDEX IF NOT EXISTS idx_reports_component_key ON reports(component_key);
+CREATE INDEX IF NOT EXISTS idx_reports_inspected_at ON reports(inspected_at);
+CREATE INDEX IF NOT EXISTS idx_components_label_diagnosis ON components(label, diagnosis);
+CREATE INDEX IF NOT EXISTS idx_components_diagnosis ON components(diagnosis);
+"""
+
+# Campos de cada componente, na ordem das colunas de 'components' (após report_id)
+COMPONENT_FIELDS = ('component_id', 'pair', 'label', 'x1', 'y1', 'x2', 'y2', 'temp_max', 'temp_min',
+                    'temp_mean', 'temp_p95', 'env_temp', 'delta_t', 'diagnosis')
+REPORT_FIELDS = ('form_number', 'equipment', 'feeder', 'agency_region', 'location', 'inspector')
+
+
+def component_record(prediction, env_temp, delta_t, diagnosis):
+    """Tupla de `COMPONENT_FIELDS` de um componente, a partir da sua predição."""
+    x1, y1, x2, y2 = prediction.get('box') or (None,) * 4
+    return (prediction['id'], prediction.get('pair'), prediction['label'], x1, y1, x2, y2,
+            _real(prediction.get('temp_max')), _real(prediction.get('temp_min')),
+            _real(prediction.get('temp_mean')), _real(prediction.get('temp_p95')),
+            _real(env_temp), _real(delta_t), diagnosis)
+
+
+def _real(value):
+    # NaN (componente sem pixels de máscara) é gravado como NULL
+    return None if value is None or math.isnan(value) else float(value)
+
+
+class ResultsStore:
+    """
+    Conexão com o banco de resultados. Use como gerenciador de contexto.
+
+    Args:
+        path (str): Arquivo SQLite (criado se não existir).
+        timeout (float): Espera máxima (s) pelo bloqueio de escrita de outro processo.
+    """
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        # Transações explícitas (BEGIN IMMEDIATE): o bloqueio de escrita é obtido logo no início
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def _migrate(self):
+        """
+        Atualiza um banco do esquema antigo (relatórios únicos por nota), em que
+        jobs de um lote com a mesma nota apagavam os componentes uns dos outros.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Conferido dentro da transação: outro processo pode ter migrado antes
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            has_reports = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports'").fetchone()
+            if version < SCHEMA_VERSION and has_reports:
+                # Recria a tabela (o SQLite não remove restrições UNIQUE com ALTER TABLE);
+                # as chaves estrangeiras estão desligadas, então os componentes são mantidos
+                cursor.execute(REPORTS_TABLE.format(name='reports_new'))
+                cursor.execute(
+                    "INSERT INTO reports_new (id, pdf_path, form_number, equipment, feeder, agency_region, location, "
+                    "inspector, inspected_at, component_key, stored_at) "
+                    "SELECT id, COALESCE(pdf_path, 'nota:' || form_number), form_number, equipment, feeder, "
+                    "agency_region, location, inspector, inspected_at, component_key, stored_at FROM reports")
+                cursor.execute("DROP TABLE reports")
+                cursor.execute("ALTER TABLE reports_new RENAME TO reports")
+            if version < SCHEMA_VERSION:
+                cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_report(self, report_data, pdf_path, components, component_key=None):
+        """
+        Grava um relatório e os seus componentes em uma única transação,
+        substituindo um registro anterior do mesmo PDF.
+
+        Args:
+            report_data (dict): Dados do relatório (nota, equipamento, alimentador...).
+            pdf_path (str): PDF gerado (identifica o relatório no banco).
+            components (list): Tuplas de `COMPONENT_FIELDS` (ver `component_record`).
+            component_key (str): Chave das páginas de componentes no cache de
+                relatórios, usada por `copy_report_components`.
+
+        Returns:
+            int: O id do relatório no banco.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            report_id = self._replace_report(cursor, report_data, pdf_path, component_key)
+            cursor.executemany(
+                f"INSERT INTO components (report_id, {', '.join(COMPONENT_FIELDS)}) "
+                f"VALUES (?{', ?' * len(COMPONENT_FIELDS)})",
+                ((report_id, *record) for record in components),
+            )
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return report_id
+
+    def copy_report_components(self, report_data, pdf_path, component_key):
+        """
+        Grava um relatório cujas páginas de componentes vieram do cache de
+        relatórios, copiando os componentes de um relatório já gravado com a
+        mesma `component_key`.
+
+        Returns:
+            bool: False se nenhum relatório com essa chave estiver no banco.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            source = cursor.execute("SELECT id FROM reports WHERE component_key = ? ORDER BY id DESC LIMIT 1",
+                                    (component_key,)).fetchone()
+            if source is None:
+                cursor.execute("ROLLBACK")
+                return False
+            # Os componentes de origem são lidos antes de substituir o relatório (que pode ser a própria origem)
+            components = cursor.execute(f"SELECT {', '.join(COMPONENT_FIELDS)} FROM components "
+                                        f"WHERE report_id = ?", (source[0],)).fetchall()
+            report_id = self._replace_report(cursor, report_data, pdf_path, component_key)
+            cursor.executemany(
+                f"INSERT INTO components (report_id, {', '.join(COMPONENT_FIELDS)}) "
+                f"VALUES (?{', ?' * len(COMPONENT_FIELDS)})",
+                ((report_id, *record) for record in components),
+            )
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return True
+
+    @staticmethod
+    def _replace_report(cursor, report_data, pdf_path, component_key):
+        values = [_text(report_data.get(field)) for field in REPORT_FIELDS]
+        timestamp = report_data.get('timestamp')
+        inspected_at = timestamp.isoformat() if isinstance(timestamp, datetime) else _text(timestamp)
+        pdf_path = os.path.abspath(pdf_path)
+        cursor.execute("DELETE FROM reports WHERE pdf_path = ?", (pdf_path,))
+        cursor.execute(
+            f"INSERT INTO reports ({', '.join(REPORT_FIELDS)}, inspected_at, pdf_path, component_key, stored_at) "
+            f"VALUES ({', '.join('?' * len(REPORT_FIELDS))}, ?, ?, ?, ?)",
+            (*values, inspected_at, pdf_path, component_key, datetime.now().isoformat(timespec='seconds')),
+        )
+        return cursor.lastrowid
+
+    def iter_component_chunks(self, columns, chunk_size=50000, since=None, until=None):
+        """
+        Streams the components joined with their report, `chunk_size` rows at
+        a time, so memory does not depend on the size of the database.
+
+        Args:
+            columns (list): Columns to read, e.g. ['c.label', 'c.delta_t', 'r.feeder'].
+            chunk_size (int): Rows per chunk.
+            since (str): Only reports inspected at or after this ISO date.
+            until (str): Only reports inspected before this ISO date.
+
+        Yields:
+            list: Row tuples, in the order of `columns`.
+        """
+        conditions, params = _period_conditions(since, until)
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(columns)} FROM components c JOIN reports r ON r.id = c.report_id"
+            + (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    def count_reports(self, since=None, until=None):
+        """Number of stored reports (inspections) in the period."""
+        conditions, params = _period_conditions(since, until)
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM reports r" + (f" WHERE {' AND '.join(conditions)}" if conditions else ""),
+            params).fetchone()[0]
+
+    def query_components(self, feeder=None, agency_region=None, equipment=None, label=None, diagnosis=None):
+        """
+        Componentes que atendem a todos os filtros informados, com os campos do
+        relatório de origem.
+
+        Returns:
+            list: Um dict por componente.
+        """
+        filters = {'r.feeder': feeder, 'r.agency_region': agency_region, 'r.equipment': equipment,
+                   'c.label': label, 'c.diagnosis': diagnosis}
+        conditions = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        sql = (f"SELECT r.form_number, r.equipment, r.feeder, r.agency_region, r.inspected_at, r.pdf_path, "
+               f"{', '.join('c.' + field for field in COMPONENT_FIELDS)} "
+               f"FROM components c JOIN reports r ON r.id = c.report_id"
+               + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+               + " ORDER BY c.delta_t DESC")
+        cursor = self.connection.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+def _period_conditions(since, until):
+    conditions, params = [], []
+    if since:
+        conditions.append("r.inspected_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("r.inspected_at < ?")
+        params.append(until)
+    return conditions, params
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta os componentes gravados no banco de resultados.")
+    parser.add_argument('database', help="Arquivo SQLite do banco de resultados.")
+    parser.add_argument('--feeder')
+    parser.add_argument('--agency-region')
+    parser.add_argument('--equipment')
+    parser.add_argument('--label', help="Rótulo do modelo, ex.: connector.")
+    parser.add_argument('--diagnosis', help="Texto do diagnóstico, ex.: 'Manutenção Urgente'.")
+    parser.add_argument('--limit', type=int, default=50, help="Linhas mostradas (0 = todas).")
+    args = parser.parse_args(argv)
+
+    with ResultsStore(args.database) as store:
+        rows = store.query_components(feeder=args.feeder, agency_region=args.agency_region,
+                                      equipment=args.equipment, label=args.label, diagnosis=args.diagnosis)
+    for row in rows[:args.limit or None]:
+        delta_t = '-' if row['delta_t'] is None else f"{row['delta_t']:.1f}"
+        print(f"{row['form_number']} | {row['feeder']} | {row['equipment']} | #{row['component_id']} "
+              f"{row['label']} | ΔT {delta_t} °C | {row['diagnosis']}")
+    print(f"{len(rows)} componente(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
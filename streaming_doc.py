@@ -0,0 +1,88 @@
+# streaming_doc.py
+"""
+Construção do PDF em modo streaming: partes do 'story' podem ser fornecidas por
+um gerador e só são criadas quando o ReportLab chega até elas, sendo liberadas
+assim que a página correspondente é desenhada.
+"""
+from reportlab.platypus import SimpleDocTemplate
+from reportlab.platypus.flowables import Flowable, PageBreak
+
+
+class LazyFlowables(Flowable):
+    """
+    Marcador no 'story' que representa uma sequência de flowables ainda não criada.
+
+    `source` é um iterável que produz listas de flowables (por exemplo, uma
+    página de componente por vez). Só tem efeito com `StreamingDocTemplate`.
+    """
+    _NOT_FETCHED = object()
+
+    def __init__(self, source):
+        Flowable.__init__(self)
+        self._source = iter(source)
+        self._pending = self._NOT_FETCHED
+
+    def _peek(self):
+        if self._pending is self._NOT_FETCHED:
+            self._pending = next(self._source, None)
+        return self._pending
+
+    @property
+    def exhausted(self):
+        return self._peek() is None
+
+    def next_batch(self):
+        """Retorna a próxima lista de flowables ou None quando a fonte se esgota."""
+        batch = self._peek()
+        self._pending = self._NOT_FETCHED
+        return batch
+
+    def wrap(self, availWidth, availHeight):
+        raise TypeError("LazyFlowables precisa ser construído com StreamingDocTemplate")
+
+
+class SectionBreak(PageBreak):
+    """
+    `PageBreak` que marca o início de uma seção do documento. Após a construção,
+    `StreamingDocTemplate.section_starts[name]` é o índice (base 0) da primeira
+    página da seção.
+    """
+    def __init__(self, name):
+        PageBreak.__init__(self)
+        self.name = name
+
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """
+    `SimpleDocTemplate` que expande os marcadores `LazyFlowables` sob demanda.
+
+    Antes de cada flowable ser processado, se o próximo item do 'story' for um
+    marcador, o lote seguinte do gerador é inserido à frente dele. Assim, no
+    máximo dois lotes (a página atual e a seguinte, lida antecipadamente para
+    saber se a fonte acabou) ficam em memória; para 'stories' sem marcadores o
+    comportamento é idêntico ao do SimpleDocTemplate.
+    """
+    def build(self, flowables, *args, **kwargs):
+        # Marcadores vazios são removidos antes da construção: um marcador
+        # pendente no fim do 'story' faria o ReportLab abrir uma página em branco
+        flowables[:] = [f for f in flowables if not (isinstance(f, LazyFlowables) and f.exhausted)]
+        self.section_starts = {}
+        SimpleDocTemplate.build(self, flowables, *args, **kwargs)
+
+    def afterFlowable(self, flowable):
+        # A quebra já encerrou a página atual: a seção começa na página seguinte
+        if isinstance(flowable, SectionBreak):
+            self.section_starts[flowable.name] = self.page
+
+    def filterFlowables(self, flowables):
+        # O marcador é expandido quando chega à frente do 'story' ou quando é o
+        # alvo de uma cadeia keepWithNext que o ReportLab está prestes a agrupar
+        i = 0
+        while i < len(flowables) - 1 and flowables[i] is not None and flowables[i].getKeepWithNext():
+            i += 1
+        while i < len(flowables) and isinstance(flowables[i], LazyFlowables):
+            marker = flowables[i]
+            batch = marker.next_batch()
+            if marker.exhausted:
+                del flowables[i]
+            flowables[i:i] = batch
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+from reportlab.lib import colors
+
+from diagnosis import DiagnosisEngine
+from get_utils import get_diagnosis_by_component, get_diagnosis_thresholds_path
+
+LABELS = ('connector', 'fuse-cutout', 'overhead-switch', 'transformer', 'vertical-insulator',
+          'horizontal-insulator', 'default', 'unknown-label', '')
+
+
+def legacy_diagnosis(component_label, delta_t):
+    """get_diagnosis_by_component antes da tabela em diagnosis_thresholds.json."""
+    thresholds = {
+        "connector":              (20, 40, 60),
+        "fuse-cutout":            (15, 30, 50),
+        "overhead-switch":        (15, 35, 55),
+        "transformer":            (25, 50, 75),
+        "vertical-insulator":     (10, 20, 40),
+        "horizontal-insulator":   (10, 20, 40),
+        "default":                (10, 30, 60)
+    }
+    prog_thresh, imed_thresh, urg_thresh = thresholds.get(component_label, thresholds["default"])
+
+    if delta_t >= urg_thresh:
+        return "Manutenção Urgente", colors.Color(0.8, 0, 0)
+    elif delta_t >= imed_thresh:
+        return "Manutenção Imediata", colors.red
+    elif delta_t >= prog_thresh:
+        return "Manutenção Programada", colors.orange
+    else:
+        return "Sem Manutenção", colors.lightgreen
+
+
+def _delta_t_values():
+    # Todos os limites, logo abaixo e logo acima deles, além de valores fora das faixas
+    limits = (10, 15, 20, 25, 30, 35, 40, 50, 55, 60, 75)
+    values = [-20.0, 0.0, 5.0, 100.0, 1e6, math.inf, -math.inf]
+    for limit in limits:
+        values += [limit - 0.05, np.nextafter(limit, -math.inf), float(limit), np.nextafter(limit, math.inf)]
+    return values
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return DiagnosisEngine.from_file(get_diagnosis_thresholds_path())
+
+
+def test_diagnose_matches_legacy_thresholds(engine):
+    for label in LABELS:
+        for delta_t in _delta_t_values():
+            text, color = engine.diagnose(label, delta_t)
+            legacy_text, legacy_color = legacy_diagnosis(label, delta_t)
+            assert text == legacy_text, (label, delta_t)
+            assert color.rgba() == legacy_color.rgba(), (label, delta_t)
+            assert get_diagnosis_by_component(label, delta_t)[0] == legacy_text
+
+
+def test_classify_matches_legacy_thresholds(engine):
+    values = _delta_t_values()
+    labels = np.repeat(np.array(LABELS, dtype=object), len(values))
+    delta_t = np.tile(values, len(LABELS))
+
+    levels = engine.classify(labels, delta_t)
+    expected = [legacy_diagnosis(label, value)[0] for label, value in zip(labels, delta_t)]
+    assert list(engine.level_texts(levels)) == expected
+
+
+def test_nan_delta_t_is_the_lowest_level(engine):
+    # O código antigo também cai em "Sem Manutenção" (toda comparação com NaN é falsa)
+    assert legacy_diagnosis('connector', math.nan)[0] == "Sem Manutenção"
+    assert engine.diagnose('connector', math.nan)[0] == "Sem Manutenção"
+    assert engine.classify(np.array(['connector', 'transformer'], dtype=object), [math.nan, 80.0]).tolist() == [0, 3]
@@ -0,0 +1,39 @@
+import numpy as np
+from PIL import Image as PILImage
+
+from image_utils import image_file_size, read_image_for_display
+
+
+def _write_rotated_jpeg(path, width, height, orientation):
+    """JPEG stored as `width` x `height` pixels with the given EXIF orientation."""
+    rng = np.random.default_rng(0)
+    image = PILImage.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    exif = PILImage.Exif()
+    exif[0x0112] = orientation
+    image.save(path, quality=90, exif=exif)
+
+
+def test_file_size_follows_exif_rotation(tmp_path):
+    # Foto retrato gravada deitada (orientação 6 = girar 90° no sentido horário)
+    path = str(tmp_path / 'portrait.jpg')
+    _write_rotated_jpeg(path, 1600, 1200, orientation=6)
+    decoded = read_image_for_display(path)
+
+    assert image_file_size(path) == (1200, 1600)
+    assert decoded.shape[:2] == (1600, 1200)
+
+
+def test_reduced_read_covers_the_display_size_of_rotated_photos(tmp_path):
+    path = str(tmp_path / 'portrait.jpg')
+    _write_rotated_jpeg(path, 1600, 1200, orientation=6)
+
+    # Pelo tamanho do cabeçalho (1600 x 1200) a leitura seria reduzida pela metade: 600 px de largura, abaixo dos 700
+    image = read_image_for_display(path, max_size=(700, 500))
+    assert image.shape[1] >= 700 and image.shape[0] >= 500
+    assert image.shape[0] > image.shape[1]
+
+
+def test_file_size_without_rotation(tmp_path):
+    path = str(tmp_path / 'landscape.jpg')
+    _write_rotated_jpeg(path, 1600, 1200, orientation=1)
+    assert image_file_size(path) == (1600, 1200)
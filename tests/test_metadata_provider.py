@@ -0,0 +1,23 @@
+import pytest
+
+from Main import build_report_data
+from metadata_provider import MetadataProvider
+
+
+def test_report_data_defaults_to_build_report_data():
+    provider = MetadataProvider([{'form_number': 'NOTA 1', 'inspector': 'Fulano', 'env_temp': '31,5'}])
+    report_data = provider.report_data('NOTA 1')
+
+    defaults = build_report_data()
+    assert report_data['inspector'] == 'Fulano'
+    assert report_data['environmental_conditions'] == dict(defaults['environmental_conditions'], env_temp=31.5)
+    assert report_data['thermal_calibration'] == defaults['thermal_calibration']
+    assert report_data['logo_path'] == defaults['logo_path']
+
+
+def test_colliding_job_ids_are_rejected():
+    with pytest.raises(ValueError, match='NOTA_1_2'):
+        MetadataProvider([{'form_number': 'NOTA 1/2'}, {'form_number': 'NOTA 1 2'}])
+
+    provider = MetadataProvider([{'form_number': 'NOTA 1/2'}, {'form_number': 'NOTA 1 2', 'job_id': 'outra'}])
+    assert [job['job_id'] for job in provider.jobs()] == ['NOTA_1_2', 'outra']
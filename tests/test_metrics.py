@@ -0,0 +1,31 @@
+import time
+
+from metrics import StageMetrics, _parse_prometheus
+
+
+def test_nested_sections_are_not_counted_twice():
+    metrics = StageMetrics('nota')
+    with metrics.stage('pdf_build'):
+        for _ in metrics.timed_iter('components', [1, 2]):
+            pass
+        with metrics.timed('components'):
+            time.sleep(0.05)
+
+    assert metrics.stages['components']['wall_s'] >= 0.05
+    assert metrics.stages['pdf_build']['wall_s'] < 0.05
+
+
+def test_prometheus_file_accumulates_across_writers(tmp_path):
+    path = str(tmp_path / 'celesc_report.prom')
+    for wall_s in (0.01, 2.0):
+        # Um objeto por relatório, como em processos diferentes de um lote
+        metrics = StageMetrics('nota')
+        metrics.stages = {'load': {'wall_s': wall_s, 'cpu_s': 0.0, 'peak_rss_bytes': 0}}
+        metrics.write_prometheus(path)
+
+    histogram = _parse_prometheus(path)[('load', 'wall_s')]
+    assert histogram['count'] == 2
+    assert histogram['sum'] == 2.01
+    assert histogram['buckets'][0] == 1
+    assert histogram['buckets'][-1] == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['celesc_report.prom', 'celesc_report.prom.lock']
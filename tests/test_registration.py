@@ -0,0 +1,47 @@
+import numpy as np
+
+from detection_format import Detections
+from registration import RigRegistration
+from thermal_analysis import ThermalCalibration, component_temperature_stats
+
+CALIBRATION = {'palette': 'jet', 'temp_min': 15.0, 'temp_max': 65.0}
+
+
+def _shifted_rig(shift_x):
+    # A câmera térmica vê a cena deslocada: as primeiras colunas da visual ficam fora do campo de visão
+    homography = [[1, 0, shift_x], [0, 1, 0], [0, 0, 1]]
+    return RigRegistration(homography, thermal_size=(200, 100), visual_size=(200, 100))
+
+
+def test_coverage_excludes_pixels_outside_the_thermal_field_of_view():
+    rig = _shifted_rig(20)
+    coverage = rig.coverage((200, 100), (200, 100))
+    assert coverage.shape == (100, 200)
+    assert not coverage[:, :20].any()
+    assert coverage[:, 21:].all()
+    assert RigRegistration().coverage((200, 100), (200, 100)) is None
+
+
+def test_border_is_not_read_as_minimum_temperature():
+    calibration = ThermalCalibration.from_config(CALIBRATION)
+    # Quadro térmico uniforme, com a cor de 40 °C da paleta
+    color = calibration.palette[len(calibration.palette) // 2].astype(np.uint8)
+    thermal = np.empty((100, 200, 3), dtype=np.uint8)
+    thermal[:] = color
+    rig = _shifted_rig(20)
+    registered = rig.warp(thermal, (200, 100))
+    temperature_map = calibration.to_temperature(registered)
+
+    # Componente na borda esquerda, metade fora do campo de visão
+    masks = np.zeros((1, 100, 200), dtype=np.uint8)
+    masks[0, 30:70, 0:40] = 1
+    detections = Detections([(0, 30, 40, 70)], [0], [0.9], {0: 'connector'}, (100, 200), (100, 200), masks=masks)
+
+    naive = component_temperature_stats(temperature_map, detections)
+    assert naive['temp_min'][0] == CALIBRATION['temp_min']
+
+    stats = component_temperature_stats(temperature_map, detections,
+                                        valid_mask=rig.coverage((200, 100), (200, 100)))
+    expected = calibration.to_temperature(thermal[:1, :1])[0, 0]
+    assert stats['temp_min'][0] == stats['temp_max'][0] == expected
+    assert stats['temp_mean'][0] == expected
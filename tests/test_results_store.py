@@ -0,0 +1,70 @@
+import sqlite3
+
+from results_store import ResultsStore, component_record
+
+
+def _components(n):
+    prediction = {'id': 0, 'label': 'connector', 'box': [1, 2, 3, 4],
+                  'temp_max': 50.0, 'temp_min': 20.0, 'temp_mean': 30.0, 'temp_p95': 45.0}
+    return [component_record(dict(prediction, id=i + 1), 25.0, 25.0, 'Manutenção Programada') for i in range(n)]
+
+
+def _component_counts(store):
+    return store.connection.execute(
+        "SELECT r.pdf_path, COUNT(c.component_id) FROM reports r LEFT JOIN components c ON c.report_id = r.id "
+        "GROUP BY r.id ORDER BY r.pdf_path").fetchall()
+
+
+def test_reports_with_the_same_form_number_are_kept(tmp_path):
+    # Jobs de um lote sem 'form_number' recebem todos a nota padrão
+    report_data = {'form_number': 'NOTA Nº 810000068071', 'feeder': 'AL1'}
+    with ResultsStore(str(tmp_path / 'results.db')) as store:
+        store.add_report(report_data, str(tmp_path / 'a.pdf'), _components(5))
+        store.add_report(report_data, str(tmp_path / 'b.pdf'), _components(12))
+        assert _component_counts(store) == [(str(tmp_path / 'a.pdf'), 5), (str(tmp_path / 'b.pdf'), 12)]
+        assert len(store.query_components(feeder='AL1')) == 17
+
+
+def test_rendering_the_same_pdf_again_replaces_the_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with ResultsStore('results.db') as store:
+        store.add_report({'form_number': 'NOTA 1'}, 'a.pdf', _components(5))
+        # Mesmo arquivo, agora por caminho absoluto
+        store.add_report({'form_number': 'NOTA 2'}, str(tmp_path / 'a.pdf'), _components(3))
+        assert _component_counts(store) == [(str(tmp_path / 'a.pdf'), 3)]
+        assert store.connection.execute("SELECT form_number FROM reports").fetchall() == [('NOTA 2',)]
+
+
+def test_copy_report_components_keeps_the_source_report(tmp_path):
+    with ResultsStore(str(tmp_path / 'results.db')) as store:
+        store.add_report({'form_number': 'NOTA 1'}, str(tmp_path / 'a.pdf'), _components(4), component_key='k')
+        assert store.copy_report_components({'form_number': 'NOTA 1'}, str(tmp_path / 'b.pdf'), 'k')
+        assert not store.copy_report_components({'form_number': 'NOTA 1'}, str(tmp_path / 'c.pdf'), 'other')
+        assert _component_counts(store) == [(str(tmp_path / 'a.pdf'), 4), (str(tmp_path / 'b.pdf'), 4)]
+
+
+def test_old_schema_is_migrated(tmp_path):
+    path = str(tmp_path / 'results.db')
+    # Esquema anterior: nota única em 'reports'
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE reports (id INTEGER PRIMARY KEY, form_number TEXT NOT NULL UNIQUE, equipment TEXT,
+            feeder TEXT, agency_region TEXT, location TEXT, inspector TEXT, inspected_at TEXT, pdf_path TEXT,
+            component_key TEXT, stored_at TEXT NOT NULL);
+        CREATE TABLE components (report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+            component_id INTEGER NOT NULL, pair INTEGER, label TEXT NOT NULL, x1 INTEGER, y1 INTEGER,
+            x2 INTEGER, y2 INTEGER, temp_max REAL, temp_min REAL, temp_mean REAL, temp_p95 REAL,
+            env_temp REAL, delta_t REAL, diagnosis TEXT, PRIMARY KEY (report_id, component_id));
+        INSERT INTO reports (id, form_number, pdf_path, stored_at) VALUES (1, 'NOTA 1', '/old/a.pdf', 'x');
+        INSERT INTO components (report_id, component_id, label) VALUES (1, 1, 'connector'), (1, 2, 'fuse-cutout');
+    """)
+    connection.close()
+
+    with ResultsStore(path) as store:
+        store.add_report({'form_number': 'NOTA 1'}, str(tmp_path / 'b.pdf'), _components(2))
+        assert _component_counts(store) == [('/old/a.pdf', 2), (str(tmp_path / 'b.pdf'), 2)]
+        # O relatório migrado continua ligado aos componentes (ON DELETE CASCADE)
+        store.add_report({'form_number': 'NOTA 1'}, '/old/a.pdf', _components(1))
+        assert _component_counts(store) == [('/old/a.pdf', 1), (str(tmp_path / 'b.pdf'), 2)]
+    with ResultsStore(path) as store:
+        assert store.connection.execute("PRAGMA user_version").fetchone()[0] == 1
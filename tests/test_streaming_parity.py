@@ -0,0 +1,84 @@
+import contextlib
+import io
+import json
+from datetime import datetime
+
+import cv2
+import pytest
+
+from Main import build_report_data, render_report
+from benchmark import make_synthetic_scene
+from results_store import ResultsStore
+
+
+@pytest.fixture
+def scene_report_data(tmp_path):
+    visual, thermal, detections = make_synthetic_scene(6, (640, 480), 0.6, seed=3)
+    report_data = build_report_data()
+    report_data.update({
+        'visual_image_path': str(tmp_path / 'visual.jpg'),
+        'thermal_image_path': str(tmp_path / 'thermal.jpg'),
+        'pickle_path': str(tmp_path / 'scene.cdet'),
+        'timestamp': datetime(2024, 1, 1, 10, 0, 0),
+        'report_cache_dir': None,
+        'results_db_path': str(tmp_path / 'results.db'),
+        'metrics_json_path': str(tmp_path / 'metrics.jsonl'),
+        'metrics_prometheus_path': None,
+    })
+    cv2.imwrite(report_data['visual_image_path'], visual)
+    cv2.imwrite(report_data['thermal_image_path'], thermal)
+    detections.save(report_data['pickle_path'])
+    return report_data
+
+
+def _render(report_data, output_pdf_path, streaming):
+    with contextlib.redirect_stdout(io.StringIO()):
+        render_report(dict(report_data, streaming_build=streaming), output_pdf_path)
+
+
+def _components_by_pdf(db_path):
+    with ResultsStore(db_path) as store:
+        rows = store.query_components()
+    by_pdf = {}
+    for row in rows:
+        by_pdf.setdefault(row['pdf_path'], []).append({k: v for k, v in row.items() if k != 'pdf_path'})
+    return by_pdf
+
+
+def test_streaming_build_matches_regular_build(scene_report_data, tmp_path):
+    _render(scene_report_data, str(tmp_path / 'regular.pdf'), streaming=False)
+    _render(scene_report_data, str(tmp_path / 'streaming.pdf'), streaming=True)
+
+    by_pdf = _components_by_pdf(scene_report_data['results_db_path'])
+    regular, streaming = (by_pdf[str(tmp_path / name)] for name in ('regular.pdf', 'streaming.pdf'))
+    assert len(regular) == 6
+    assert regular == streaming
+
+    pypdf = pytest.importorskip('pypdf')
+    assert len(pypdf.PdfReader(str(tmp_path / 'regular.pdf')).pages) == \
+        len(pypdf.PdfReader(str(tmp_path / 'streaming.pdf')).pages)
+
+
+def test_streaming_build_times_components_in_their_own_stages(scene_report_data, tmp_path):
+    _render(scene_report_data, str(tmp_path / 'streaming.pdf'), streaming=True)
+
+    with open(scene_report_data['metrics_json_path'], encoding='utf-8') as f:
+        record = json.loads(f.readline())
+    stages = record['stages']
+    assert {'load', 'annotate', 'summary', 'scene', 'temperatures', 'crops', 'pages', 'pdf_build'} <= set(stages)
+    # Os recortes e as páginas são feitos durante o doc.build, mas contam nas suas próprias etapas
+    assert stages['crops']['wall_s'] > 0.0
+    assert stages['pages']['wall_s'] > 0.0
+    assert sum(stage['wall_s'] for stage in stages.values()) <= record['total_wall_s'] + 1e-3
+
+
+def test_size_budget_retries_keep_the_same_components(scene_report_data, tmp_path):
+    _render(scene_report_data, str(tmp_path / 'regular.pdf'), streaming=True)
+    # Limite inalcançável: todas as tentativas do SIZE_BUDGET_LADDER são feitas
+    _render(dict(scene_report_data, max_pdf_size_mb=0.001), str(tmp_path / 'budget.pdf'), streaming=True)
+
+    by_pdf = _components_by_pdf(scene_report_data['results_db_path'])
+    assert by_pdf[str(tmp_path / 'budget.pdf')] == by_pdf[str(tmp_path / 'regular.pdf')]
+    with open(scene_report_data['metrics_json_path'], encoding='utf-8') as f:
+        record = json.loads(f.read().splitlines()[-1])
+    assert record['encoding_attempts'] > 1
@@ -0,0 +1,61 @@
+import numpy as np
+
+from detection_format import Detections
+from thermal_analysis import component_temperature_stats
+
+NAMES = {0: 'connector', 1: 'fuse-cutout'}
+
+
+def _letterboxed_detections(boxes, orig_shape=(600, 800), mask_shape=(160, 160)):
+    """Detections with rectangular masks covering each box, in letterboxed mask space (as Ultralytics)."""
+    mask_h, mask_w = mask_shape
+    gain = min(mask_h / orig_shape[0], mask_w / orig_shape[1])
+    pad_x, pad_y = (mask_w - orig_shape[1] * gain) / 2, (mask_h - orig_shape[0] * gain) / 2
+    masks = np.zeros((len(boxes), mask_h, mask_w), dtype=np.uint8)
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        masks[i, int(y1 * gain + pad_y):int(np.ceil(y2 * gain + pad_y)),
+              int(x1 * gain + pad_x):int(np.ceil(x2 * gain + pad_x))] = 1
+    return Detections(boxes, [0] * len(boxes), [0.9] * len(boxes), NAMES, mask_shape, orig_shape,
+                      packed_masks=np.packbits(masks, axis=-1))
+
+
+def test_small_hot_spot_sets_the_maximum():
+    # Ponto quente de 4x4 px, menor que uma célula da máscara (5x5 px da imagem)
+    temperature_map = np.full((600, 800), 25.0, dtype=np.float32)
+    temperature_map[303:307, 413:417] = 64.02
+    detections = _letterboxed_detections([(380, 280, 460, 340), (100, 100, 160, 150)])
+
+    stats = component_temperature_stats(temperature_map, detections)
+
+    np.testing.assert_allclose(stats['temp_max'], [64.02, 25.0], rtol=1e-6)
+    np.testing.assert_allclose(stats['temp_min'], [25.0, 25.0])
+    assert 25.0 < stats['temp_mean'][0] < 26.0
+
+
+def test_matches_direct_reduction_with_full_resolution_masks():
+    rng = np.random.default_rng(0)
+    temperature_map = rng.uniform(15, 65, (120, 160)).astype(np.float32)
+    boxes = np.array([(10, 10, 50, 40), (30, 20, 90, 100), (100, 5, 159, 60)], dtype=np.float32)
+    masks = rng.random((3, 120, 160)) < 0.5
+    for i, (x1, y1, x2, y2) in enumerate(boxes.astype(int)):
+        outside = np.ones((120, 160), dtype=bool)
+        outside[y1:y2, x1:x2] = False
+        masks[i, outside] = False
+    detections = Detections(boxes, [0, 1, 0], [0.9] * 3, NAMES, (120, 160), (120, 160),
+                            masks=masks.astype(np.uint8))
+
+    stats = component_temperature_stats(temperature_map, detections, chunk_size=2)
+
+    for i in range(3):
+        values = temperature_map[masks[i]]
+        assert stats['temp_max'][i] == values.max()
+        assert stats['temp_min'][i] == values.min()
+        np.testing.assert_allclose(stats['temp_mean'][i], values.mean(), rtol=1e-5)
+        np.testing.assert_allclose(stats['temp_p95'][i], np.percentile(values, 95), rtol=1e-5)
+
+
+def test_component_without_mask_pixels_is_nan():
+    detections = _letterboxed_detections([(380, 280, 460, 340)])
+    detections._packed_masks[:] = 0
+    stats = component_temperature_stats(np.full((600, 800), 30.0, dtype=np.float32), detections)
+    assert np.isnan(stats['temp_max'][0]) and np.isnan(stats['temp_mean'][0])
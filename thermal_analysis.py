@@ -0,0 +1,173 @@
+# thermal_analysis.py
+"""
+Conversion of false-colour thermal images to temperatures and per-component
+temperature statistics.
+"""
+import cv2
+import numpy as np
+
+# Paletas do OpenCV aceitas pelo nome na configuração de calibração
+OPENCV_PALETTES = {
+    'jet': cv2.COLORMAP_JET,
+    'rainbow': cv2.COLORMAP_RAINBOW,
+    'hot': cv2.COLORMAP_HOT,
+    'inferno': cv2.COLORMAP_INFERNO,
+    'magma': cv2.COLORMAP_MAGMA,
+    'plasma': cv2.COLORMAP_PLASMA,
+    'turbo': cv2.COLORMAP_TURBO,
+}
+
+# Calibrações já construídas (a tabela de consulta é reaproveitada entre relatórios)
+_CALIBRATION_CACHE = {}
+
+
+class ThermalCalibration:
+    """
+    Maps the colours of a false-colour thermal image to temperatures.
+
+    The palette is an ordered list of BGR colours, from the coldest to the
+    hottest, linearly spanning [temp_min, temp_max]. On first use a lookup table
+    indexed by the quantized BGR value is built, so converting a frame is a single
+    vectorized table lookup.
+    """
+    def __init__(self, palette, temp_min, temp_max, quantization_bits=5):
+        self.palette = np.asarray(palette, dtype=np.float32).reshape(-1, 3)
+        self.temp_min = float(temp_min)
+        self.temp_max = float(temp_max)
+        self.quantization_bits = quantization_bits
+        self._lut = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a calibration from a dict such as the one returned by
+        `get_utils.get_thermal_calibration()`.
+
+        `config['palette']` is either the name of an OpenCV colormap (see
+        `OPENCV_PALETTES`) or a list of BGR triples from cold to hot. Instances
+        are cached per configuration, so the lookup table is built only once.
+        """
+        cache_key = repr(sorted(config.items()))
+        if cache_key in _CALIBRATION_CACHE:
+            return _CALIBRATION_CACHE[cache_key]
+
+        palette = config['palette']
+        if isinstance(palette, str):
+            colormap = OPENCV_PALETTES[palette.lower()]
+            ramp = np.arange(256, dtype=np.uint8).reshape(-1, 1)
+            palette = cv2.applyColorMap(ramp, colormap).reshape(-1, 3)
+        calibration = cls(palette, config['temp_min'], config['temp_max'],
+                          quantization_bits=config.get('quantization_bits', 5))
+        _CALIBRATION_CACHE[cache_key] = calibration
+        return calibration
+
+    @property
+    def lut(self):
+        """3D lookup table (levels x levels x levels) of temperatures, built once."""
+        if self._lut is None:
+            levels = 1 << self.quantization_bits
+            step = 256 // levels
+            # Cor central de cada célula quantizada
+            centers = np.arange(levels, dtype=np.float32) * step + (step - 1) / 2.0
+            b, g, r = np.meshgrid(centers, centers, centers, indexing='ij')
+            colors = np.stack([b, g, r], axis=-1).reshape(-1, 3)
+
+            # Entrada mais próxima da paleta para cada célula (distância euclidiana ao quadrado)
+            distances = (
+                (colors ** 2).sum(axis=1)[:, None]
+                - 2.0 * colors @ self.palette.T
+                + (self.palette ** 2).sum(axis=1)[None, :]
+            )
+            nearest = distances.argmin(axis=1)
+            temperatures = np.linspace(self.temp_min, self.temp_max, len(self.palette), dtype=np.float32)
+            self._lut = temperatures[nearest].reshape(levels, levels, levels)
+        return self._lut
+
+    def to_temperature(self, thermal_img):
+        """
+        Converts a BGR thermal image to a float32 temperature map (°C).
+        """
+        shift = 8 - self.quantization_bits
+        quantized = thermal_img >> shift
+        return self.lut[quantized[..., 0], quantized[..., 1], quantized[..., 2]]
+
+
+def component_temperature_stats(temperature_map, detections, percentiles=(95,), chunk_size=64, valid_mask=None):
+    """
+    Computes max/min/mean and percentile temperatures of every detected component.
+
+    Statistics are taken in image space, at the full resolution of the
+    temperature map: each mask is upsampled only over its box
+    (`Detections.mask_roi`, the same mapping used for the crops), so hot spots
+    smaller than a mask cell are not lost. The sorted values of `chunk_size`
+    components at a time are reduced together with grouped operations, so
+    memory depends on the boxes of one group, not on the frame.
+
+    Each mask is upsampled and its values sorted in a per-component step:
+    sorting each component's values separately is faster than one labelled
+    sort of every masked pixel of the frame (which no longer fits in cache),
+    and the interpreter overhead per component is small next to the
+    upsampling. The cost is tracked by the 'temperatures' stage of
+    benchmark.py (cases with 500 masks).
+
+    Args:
+        temperature_map (np.ndarray): Temperature map (H, W) of the frame, in
+            the pixel coordinates the boxes are scaled to.
+        detections (Detections): Detections with masks.
+        percentiles (tuple): Percentiles (0-100) to compute.
+        chunk_size (int): Number of components reduced at a time.
+        valid_mask (np.ndarray): Optional boolean mask (H, W) of the pixels
+            with a real reading (e.g. `RigRegistration.coverage`); the others
+            are left out of every statistic.
+
+    Returns:
+        dict: Arrays of length n: 'temp_max', 'temp_min', 'temp_mean' and one
+        'temp_p<q>' per percentile. Components without mask pixels get NaN.
+    """
+    n = len(detections)
+    stats = {key: np.full(n, np.nan, dtype=np.float32) for key in ('temp_max', 'temp_min', 'temp_mean')}
+    for q in percentiles:
+        stats[f'temp_p{q:g}'] = np.full(n, np.nan, dtype=np.float32)
+    if n == 0 or not detections.has_masks:
+        return stats
+
+    map_h, map_w = temperature_map.shape[:2]
+    boxes = detections.scaled_boxes(temperature_map.shape)
+    for start in range(0, n, chunk_size):
+        # Temperaturas (ordenadas) dos pixels cobertos pela máscara de cada componente, dentro da caixa
+        present, values = [], []
+        for i in range(start, min(start + chunk_size, n)):
+            bx1, by1, bx2, by2 = boxes[i]
+            x1, y1 = max(int(np.floor(bx1)), 0), max(int(np.floor(by1)), 0)
+            x2, y2 = min(int(np.ceil(bx2)), map_w), min(int(np.ceil(by2)), map_h)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            roi = detections.mask_roi(i, x1, y1, x2, y2, (x2 - x1, y2 - y1), image_shape=temperature_map.shape) > 0
+            if valid_mask is not None:
+                roi &= valid_mask[y1:y2, x1:x2]
+            component_values = temperature_map[y1:y2, x1:x2][roi]
+            if component_values.size:
+                present.append(i)
+                values.append(np.sort(component_values.astype(np.float32, copy=False)))
+        if present:
+            _reduce_grouped(np.array(present), values, stats, percentiles)
+    return stats
+
+
+def _reduce_grouped(present, groups, stats, percentiles):
+    """Fills `stats` for the components `present`, each with its sorted values in `groups`."""
+    counts = np.array([len(group) for group in groups])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+    values = np.concatenate(groups)
+
+    stats['temp_min'][present] = values[starts]
+    stats['temp_max'][present] = values[ends]
+    stats['temp_mean'][present] = np.add.reduceat(values, starts, dtype=np.float64) / counts
+    for q in percentiles:
+        # Interpolação linear entre as posições vizinhas (como np.percentile)
+        position = starts + (counts - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, ends)
+        fraction = position - lower
+        stats[f'temp_p{q:g}'][present] = values[lower] * (1 - fraction) + values[upper] * fraction